@@ -6,12 +6,13 @@ from tkinter import ttk
 import tkinter.font as font
 from PIL import Image, ImageTk
     
-import numpy as np
-import pandas as pd    
-import sqlite3 as sql
 import requests    
+import threading
+import queue
+import io
 
-from os import chdir, remove
+from concurrent.futures import ThreadPoolExecutor
+from os import chdir
 from os.path import dirname, abspath, isfile
 
 # Set working directory to folder which contains this script
@@ -20,11 +21,21 @@ chdir(dirname(abspath(__file__)))
 # Append folder with training and architecture scripts to working directory
 import sys
 sys.path.append("architecture and training")
-# Import NeuMF architecture and relevant functions for training
-from NeuMF_architecture import NeuMF
-from training_and_evaluation import train
-from sklearn.preprocessing import LabelEncoder
-from tensorflow.keras.models import load_model
+# The NeuMF architecture and training functions import TensorFlow, so the service imports them when training starts
+# A warm-up thread imports them, and the other slow modules, in the background once the first page is shown
+# Every page's behaviour is carried out by the recommender service, which the HTTP server in recommender_server.py
+# offers to other clients too
+from recommender_service import (RecommenderService, ServiceError, FullRetrainNeeded, open_interactions,
+                                 SAMPLE_NEGATIVES_ON_THE_FLY, MIN_HISTORY_SIZE)
+
+from model_cache import ModelCache
+from schema import migrate
+from bootstrap import bootstrap_database
+from data_access import Database
+from search_index import TitleIndex
+from imdb_cache import IMDbCache, IMDbClient, DetailsPrefetcher
+from virtual_treeview import VirtualTreeview, TableSource, RecordsSource
+from warm_up import WarmUp
 
 from config import RAPID_API_KEY
 
@@ -35,9 +46,47 @@ WINDOW_HEIGHT = 700
 # Set constant value for border width of buttons
 BTN_BORD_WIDTH = 3    
 
-# Define this before running program to avoid long runtime when creating a user for first time
-# This value will change depending on the train_set used for the database
-TRAIN_SET_MAX_USER_ID = 162541
+# Number of milliseconds between checks of the training progress queue
+PROGRESS_POLL_MS = 100
+
+# Columns of the virtual lists of users and movies, and the (heading, width, anchor) each is shown with
+USER_COLUMNS = ["username", "user_ID"]
+USER_HEADINGS = [("Username", 300, "w"), ("User ID", 120, tk.CENTER)]
+MOVIE_COLUMNS = ["title", "genre", "year", "movie_ID"]
+MOVIE_HEADINGS = [("Title", 450, "w"), ("Genre", 350, "w"), ("Year", 100, tk.CENTER), ("Movie ID", 100, tk.CENTER)]
+
+# Number of milliseconds the movie title box must be left unchanged before it is searched
+# Every keystroke restarts the wait, so fast typing only searches once for the final text
+SEARCH_DEBOUNCE_MS = 150
+
+# Number of milliseconds between checks for a full-text search running in the background
+SEARCH_POLL_MS = 20
+
+# Number of milliseconds after the first page is shown before the warm-up thread starts
+WARM_UP_DELAY_MS = 200
+
+# Number of milliseconds between checks for movie details fetched in the background
+PREFETCH_POLL_MS = 50
+
+# Options for how the recommend page selects movies to rank
+# "Full Catalog" scores every movie in movie_info, "100 Random Movies" ranks a random sample of unseen movies
+RANKING_OPTIONS = ("Full Catalog", "100 Random Movies")
+
+# Create function which inserts a (title, genre, year, movie_ID) record into a Treeview sorted by title
+# The movie ID is used as the row's iid so that the row can be found again when it changes
+def insert_by_title(tree, record):
+    index = 0
+    for iid in tree.get_children():
+        if tree.set(iid, "Title") > str(record[0]):
+            break
+        index += 1
+    
+    tree.insert(parent = "", index = index, iid = record[3], text = "",
+                values = (record[0], record[1], record[2], record[3]))
+
+# Create function which shows the title and message of a request the recommender service could not carry out
+def show_service_error(error):
+    messagebox.showerror(title = error.title, message = error.message)
 
 class App(tk.Tk):
     def __init__(self):
@@ -49,8 +98,8 @@ class App(tk.Tk):
         # Create a default font for buttons
         self.button_font = font.Font(family='Helvetica', size=9, weight='bold')
         
-        self._frame = None
-        self.change_frame(LoginPage)
+        # Create a cache which keeps the trained NeuMF network and ID encodings loaded between pages
+        self.model_cache = ModelCache()
         
         # Create master class attributes which can store key user information after login
         # Values can be accessed and modified in other classes
@@ -58,78 +107,107 @@ class App(tk.Tk):
         self.user_ID = None
         self.trained = None
         
-        # Check if database already exists and create it if not
+        # Check if database already exists and create it if not, then upgrade it to the current schema
         if not isfile("application data/database.db"):
-            self.create_database()    
-            
-    # Create a function for creating the database from scratch
-    def create_database(self):
-        # Create a database or connect to one
-        conn = sql.connect("application data/database.db")
-    
-        # Create cursor
-        c = conn.cursor()
-            
-        # Create tables
-        c.executescript("""CREATE TABLE user_info(
-                           username VARCHAR(20) PRIMARY KEY,
-                           user_ID INT,
-                           trained INT
-                           );
-                     
-                           CREATE TABLE user_history(
-                           username VARCHAR(20),
-                           user_ID INT,
-                           movie_ID INT
-                           );
-                           
-                           CREATE TABLE user_bucket_list(
-                           username VARCHAR(20),
-                           user_ID INT,
-                           movie_ID INT
-                           );""")
-            
-        # Read train_set csv file in as chunks
-        train_set_chunks = pd.read_csv("data/data preparation/dataset frac=0.33, ratio=4, min_samples=100/train_set.csv",
-                                       chunksize = 50000, iterator=True)
-            
-        # Read chunks of csv into a new SQL table
-        batch_num = 1
-        for chunk in train_set_chunks:
-            chunk.to_sql(name = "train_set", con = conn, index = False, if_exists='append')
-            batch_num += 1
-            print("Index number: {}".format(batch_num))
-            
-        c.execute("ALTER TABLE train_set DROP COLUMN 'Unnamed: 0'")
-        c.execute("ALTER TABLE train_set ADD PRIMARY KEY (user_ID, movie_ID)")    
+            self.create_database()
+        migrate()
+        
+        # Create the data-access layer which every page uses for the database
+        # It is created on the GUI thread, so the pages' queries, including those made through the service, use its
+        # own session and only the background threads share the pool
+        self.database = Database()
+        
+        # Create the recommender service which carries out every page's requests
+        # The interaction store of the dataset's users is opened by the warm-up thread, since a database built before
+        # the store existed has to export it first, and until then the service reads seen movies from the database
+        self.service = RecommenderService(self.database, self.model_cache)
+        
+        # Create the cache of IMDb details and posters, which shares one HTTP connection pool between lookups
+        self.imdb_cache = IMDbCache(IMDbClient(RAPID_API_KEY))
+        self.prefetcher = DetailsPrefetcher(self.imdb_cache)
+        
+        # The in-memory title index which answers search-as-you-type on the history page is built by the warm-up
+        # thread, and until it is ready searches use the full-text index
+        self.title_index = None
+        
+        # Full-text searches, which correct typos and can take a few hundred milliseconds, run on their own thread
+        # One thread is enough since only the latest search's result is shown
+        self.search_executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "search")
+        
+        # Pages are built the first time they are shown and then kept, hidden, for the rest of the user's session
+        # Changes made on one page are added to the change log, and every other page applies the changes it has not
+        # seen yet when it is next shown
+        self.pages = {}
+        self.changes = []
+        
+        self._frame = None
+        self.change_frame(LoginPage)
+        
+        # Build the title index, open the interaction store and then import the modules which are only needed to
+        # train, recommend or build the database, once the window has been drawn
+        self.warm_up = WarmUp([("title index", self.build_title_index),
+                               ("interaction store", self.open_interaction_store)] + WarmUp.import_steps())
+        self.after(WARM_UP_DELAY_MS, self.warm_up.start)
             
-        # Read movie_info csv file in as chunks
-        movie_info_chunks = pd.read_csv("data/data preparation/dataset frac=0.33, ratio=4, min_samples=100/movie_info.csv",
-                                       chunksize = 1000, iterator=True)
+    # Create function which builds the title index on a background thread
+    def build_title_index(self):
+        with self.database.worker() as db:
+            self.title_index = TitleIndex.from_database(db)
             
-        # Read chunks of csv into a new SQL table
-        batch_num = 1
-        for chunk in movie_info_chunks:
-            chunk.to_sql(name = "movie_info", con = conn, index = False, if_exists='append')
-            batch_num += 1
-            print("Index number: {}".format(batch_num))    
+    # Create function which opens the interaction store on a background thread and hands it to the service
+    def open_interaction_store(self):
+        self.service.interactions = open_interactions("application data/database.db")
             
-        # Commit changes
-        conn.commit()
-        
-        # Close connection
-        conn.close()
+    # Create a function for creating the database from scratch
+    # The whole dataset is bulk loaded in one go, from a snapshot if one has been saved with bootstrap.py
+    # The keys and indexes are built after the rows are loaded, and any later migrations are run by migrate()
+    def create_database(self):
+        # Negatives are drawn during training instead of being stored
+        bootstrap_database(positives_only = SAMPLE_NEGATIVES_ON_THE_FLY)
         
     # Create a function for changing between various frames packed into App class
+    # A page which has been shown before is brought back as it was left, after applying any changes made since
+    # Going to the page which is already shown builds it again, which is how its menu button refreshes it
+    # The login page starts a new session, so every page built for the last user is destroyed
     def change_frame(self, frame_class):
-        new_frame = frame_class(self)
+        old_pages = []
+        if frame_class is LoginPage:
+            old_pages = list(self.pages.values())
+            self.pages = {}
+            self.changes = []
+        elif self._frame is not None and type(self._frame) is frame_class:
+            old_pages = [self.pages.pop(frame_class)]
+        
+        new_frame = self.pages.get(frame_class)
+        if new_frame is None:
+            new_frame = frame_class(self)
+            new_frame.changes_seen = len(self.changes)
+            self.pages[frame_class] = new_frame
+        else:
+            self.refresh_frame(new_frame)
         
         if self._frame is not None: 
-            self._frame.destroy()
+            self._frame.pack_forget()
+        for page in old_pages:
+            page.destroy()
             
         self._frame = new_frame
         self._frame.pack()
-    
+        
+    # Create function which records a change to the user's data in the change log
+    # The page shown applies it straight away, and every other page when it is next shown
+    # table is the table that changed, action is "insert" or "delete" and key is the movie ID of the changed row
+    def record_change(self, table, action, key):
+        self.changes.append((table, action, key))
+        self.refresh_frame(self._frame)
+        
+    # Create function which gives a page the changes from the change log it has not applied yet
+    def refresh_frame(self, frame):
+        changes = self.changes[frame.changes_seen:]
+        frame.changes_seen = len(self.changes)
+        if len(changes) > 0 and hasattr(frame, "apply_changes"):
+            frame.apply_changes(self, changes)
+            
     # Create a function for logging a user out and returning to the login page
     def logout(self):
         # Reset username and user_ID to None
@@ -138,7 +216,15 @@ class App(tk.Tk):
         
         # Take user back to login page
         self.change_frame(LoginPage)
-        
+
+    # Create a function which closes every database connection when the window is closed
+    def destroy(self):
+        self.prefetcher.close()
+        self.search_executor.shutdown(wait = False, cancel_futures = True)
+        self.database.close()
+        self.imdb_cache.close()
+        tk.Tk.destroy(self)
+
         
 class LoginPage(tk.Frame):
     def __init__(self, master):
@@ -190,44 +276,9 @@ class SelectUserPage(tk.Frame):
         self.username_entry = tk.Entry(self, width = 30)
         self.username_entry.grid(row = 1, column = 1, pady = 10)
         
-        # Store user records in a variable
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("SELECT username, user_ID FROM user_info")
-        records = c.fetchall()
-        
-        conn.close()
-        
-        # Create a frame to pack a Treeview widget into
-        tree_frame = tk.Frame(self, width = 300, height = round(WINDOW_HEIGHT/2))
-        tree_frame.grid(row = 2, column = 0, columnspan = 2, pady = 15)
-        
-        # Create a scrollbar for the frame
-        tree_scroll = tk.Scrollbar(tree_frame)
-        tree_scroll.pack(side = tk.RIGHT, fill = tk.Y)
-        
-        # Create a Treeview widget for displaying user records
-        
-        users_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
-        users_tree.pack()
-        
-        tree_scroll.config(command = users_tree.yview)
-        
-        users_tree["columns"] = ("Username", "User ID")
-        
-        users_tree.column("#0", width = 0, minwidth = 0)
-        users_tree.column("Username", anchor = "w", width = 300)
-        users_tree.column("User ID", anchor = tk.CENTER, width = 120)
-        
-        users_tree.heading("#0", text = "")
-        users_tree.heading("Username", text = "Username", anchor = tk.CENTER)
-        users_tree.heading("User ID", text = "User ID", anchor = tk.CENTER)
-        
-        count = 0
-        for record in records:
-            users_tree.insert(parent = "", index = "end", iid = count, text = "", values = (record[0], record[1]))
-            count += 1
+        # Create a virtual Treeview for displaying user records, which reads them a page at a time as it scrolls
+        users_tree = VirtualTreeview(self, TableSource(master.database, "user_info", USER_COLUMNS), USER_HEADINGS)
+        users_tree.grid(row = 2, column = 0, columnspan = 2, pady = 15)
         
         # Create a button which can be used to select a user once username has been entered
         select_button = tk.Button(self, text = "Select User", width = 30, borderwidth = BTN_BORD_WIDTH,
@@ -249,31 +300,17 @@ class SelectUserPage(tk.Frame):
     # Create function which can select a user if they exist in the records
     def select_user(self, master):
         username = self.username_entry.get()
-        if username == "":
-            messagebox.showerror(title = "Invalid Username",
-                                 message = "You did not enter a username!")
-            return
-            
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-            
-        c.execute("SELECT username, user_ID, trained FROM user_info WHERE username = ?", (username,))
-        records = c.fetchall()
-        
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Username", message = "That username does not exist!")   
-        
-            conn.close()
+        try:
+            user_ID, trained = master.service.login(username)
+        except ServiceError as error:
+            show_service_error(error)
             return
         
-        else:
-            master.username = username
-            master.user_ID = records[0][1]
-            master.trained = records[0][2]
-                    
-            conn.close()
-                    
-            master.change_frame(HomePage)
+        master.username = username
+        master.user_ID = user_ID
+        master.trained = trained
+                
+        master.change_frame(HomePage)
             
                 
 class CreateUserPage(tk.Frame):
@@ -308,59 +345,16 @@ class CreateUserPage(tk.Frame):
         
     def create_user(self, master):
         username = self.username_entry.get()
-            
-        if username == "":
-            messagebox.showerror(title = "Invalid Username", 
-                                 message = "You cannot enter an empty username!")
+        try:
+            user_ID = master.service.create_user(username)
+        except ServiceError as error:
+            show_service_error(error)
             self.username_entry.delete(0, tk.END)
             return
             
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-            
-        c.execute("SELECT username FROM user_info")
-        records = c.fetchall()
-        
-        conn.close()
-            
-        for record in records:
-            if record[0] == username:
-                messagebox.showerror(title = "Invalid Username",
-                                     message = "That username is already taken!")
-                    
-                self.username_entry.delete(0, tk.END)
-                return
-            
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        if len(records) == 0:
-            c.execute("INSERT INTO user_info VALUES (:username, :user_ID, :trained)",
-                     {
-                     "username": username,
-                     "user_ID": TRAIN_SET_MAX_USER_ID + 1,
-                     "trained": 0
-                     })
-            
-            master.username = username
-            master.user_ID = TRAIN_SET_MAX_USER_ID + 1
-            
-        else:
-            c.execute("SELECT MAX(user_ID) FROM user_info")
-            max_user_ID = c.fetchall()[0][0]
-            
-            c.execute("INSERT INTO user_info VALUES (:username, :user_ID, :trained)",
-                     {
-                     "username": username,
-                     "user_ID": max_user_ID + 1,
-                     "trained": 0
-                     })
-            
-            master.username = username
-            master.user_ID = max_user_ID + 1
-        
-        conn.commit()
-        conn.close()
+        master.username = username
+        master.user_ID = user_ID
+        master.trained = 0
                     
         
         self.username_entry.delete(0, tk.END)
@@ -390,44 +384,9 @@ class EditUserPage(tk.Frame):
         self.new_username_entry = tk.Entry(self, width = 30)
         self.new_username_entry.grid(row = 2, column = 1, pady = (5, 15))
         
-        # Store user records in a variable
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM user_info")
-        records = c.fetchall()
-        
-        conn.close()
-        
-        # Create a frame to pack a Treeview widget into
-        tree_frame = tk.Frame(self, width = 300, height = round(WINDOW_HEIGHT/2))
-        tree_frame.grid(row = 3, column = 0, columnspan = 2, pady = 15)
-        
-        # Create a scrollbar for the frame
-        tree_scroll = tk.Scrollbar(tree_frame)
-        tree_scroll.pack(side = tk.RIGHT, fill = tk.Y)
-        
-        # Create a Treeview widget for displaying user records
-        
-        users_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
-        users_tree.pack()
-        
-        tree_scroll.config(command = users_tree.yview)
-        
-        users_tree["columns"] = ("Username", "User ID")
-        
-        users_tree.column("#0", width = 0, minwidth = 0)
-        users_tree.column("Username", anchor = "w", width = 300)
-        users_tree.column("User ID", anchor = tk.CENTER, width = 120)
-        
-        users_tree.heading("#0", text = "")
-        users_tree.heading("Username", text = "Username", anchor = tk.CENTER)
-        users_tree.heading("User ID", text = "User ID", anchor = tk.CENTER)
-        
-        count = 0
-        for record in records:
-            users_tree.insert(parent = "", index = "end", iid = count, text = "", values = (record[0], record[1]))
-            count += 1
+        # Create a virtual Treeview for displaying user records, which reads them a page at a time as it scrolls
+        users_tree = VirtualTreeview(self, TableSource(master.database, "user_info", USER_COLUMNS), USER_HEADINGS)
+        users_tree.grid(row = 3, column = 0, columnspan = 2, pady = 15)
         
         # Create a button which can be used to change username once original and new have been entered
         change_username_button = tk.Button(self, text = "Change Username", width = 30, borderwidth = BTN_BORD_WIDTH,
@@ -458,44 +417,12 @@ class EditUserPage(tk.Frame):
             messagebox.showerror(title = "Invalid Username",
                                  message = "You must enter a username in both text boxes if you want to edit your username!")
             return
-            
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-            
-        c.execute("SELECT * FROM user_info WHERE username = ?", (username,))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Username", 
-                                 message = "That username does not exist!")
-            
-            conn.close()
-            return
-            
-        c.execute("SELECT * FROM user_info WHERE username = ?", (new_username,))
-        records = c.fetchall()
-        if len(records) != 0:
-            messagebox.showerror(title = "Invalid New Username", 
-                                 message = "The new username already exists!")  
-            
-            conn.close()
-            return
-                    
-        conn.close()
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("""UPDATE user_info SET username = ?
-                     WHERE username = ?""", (new_username, username))
-                     
-        c.execute("""UPDATE user_history SET username = ?
-                     WHERE username = ?""", (new_username, username)) 
-                     
-        c.execute("""UPDATE user_bucket_list SET username = ?
-                     WHERE username = ?""", (new_username, username))               
-        
-        conn.commit()
-        conn.close()
+        try:
+            master.service.rename_user(username, new_username)
+        except ServiceError as error:
+            show_service_error(error)
+            return
         
         messagebox.showinfo(title = "Username Updated",
                             message = "You have successfully updated your username!")
@@ -504,39 +431,12 @@ class EditUserPage(tk.Frame):
         
     def delete_user(self, master):
         username = self.username_entry.get()
-        
-        if username == "":
-            messagebox.showerror(title = "Invalid Username",
-                                 message = "You must enter a username!")
+        try:
+            master.service.delete_user(username)
+        except ServiceError as error:
+            show_service_error(error)
             return
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-            
-        c.execute("SELECT username, user_ID FROM user_info WHERE username = ?", (username,))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Username", 
-                                 message = "That username does not exist!")
-            
-            conn.close()
-            return
-        
-        conn.close()
-        
-        user_ID = records[0][1]
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("DELETE FROM user_info WHERE username = ?", (username,))
-        c.execute("DELETE FROM user_history WHERE username = ?", (username,))
-        c.execute("DELETE FROM user_bucket_list WHERE username = ?", (username,))
-        c.execute("DELETE FROM train_set WHERE user_ID = ?", (user_ID,))
-        
-        conn.commit()
-        conn.close()
-        
         messagebox.showinfo(title = "User Deleted",
                             message = "You have successfully deleted the profile with username: " + str(username))
         
@@ -680,18 +580,7 @@ class BucketListPage(tk.Frame):
                                        command = lambda: self.add_to_history(master))
         add_history_button.grid(row = 3, column = 3, columnspan = 2, pady = 10)
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
-                  INNER JOIN user_bucket_list
-                  ON movie_info.movie_ID = user_bucket_list.movie_ID
-                  WHERE user_bucket_list.username = ?
-                  ORDER BY title""", (master.username,))
-                  
-        records = c.fetchall()
-        
-        conn.close()
+        records = master.service.bucket_list(master.username)
         
         # Create a frame to pack a Treeview widget into
         tree_frame = tk.Frame(self, width = 1000, height = round(WINDOW_HEIGHT/2))
@@ -703,113 +592,72 @@ class BucketListPage(tk.Frame):
         
         # Create a Treeview widget for displaying user records
         
-        bucket_list_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
-        bucket_list_tree.pack()
+        self.bucket_list_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
+        self.bucket_list_tree.pack()
         
-        tree_scroll.config(command = bucket_list_tree.yview)
+        tree_scroll.config(command = self.bucket_list_tree.yview)
         
-        bucket_list_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
+        self.bucket_list_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
         
-        bucket_list_tree.column("#0", width = 0, minwidth = 0)
-        bucket_list_tree.column("Title", anchor = "w", width = 450)
-        bucket_list_tree.column("Genre", anchor = "w", width = 350)
-        bucket_list_tree.column("Year", anchor = tk.CENTER, width = 100)
-        bucket_list_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
+        self.bucket_list_tree.column("#0", width = 0, minwidth = 0)
+        self.bucket_list_tree.column("Title", anchor = "w", width = 450)
+        self.bucket_list_tree.column("Genre", anchor = "w", width = 350)
+        self.bucket_list_tree.column("Year", anchor = tk.CENTER, width = 100)
+        self.bucket_list_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
         
-        bucket_list_tree.heading("#0", text = "")
-        bucket_list_tree.heading("Title", text = "Title", anchor = tk.CENTER)
-        bucket_list_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
-        bucket_list_tree.heading("Year", text = "Year", anchor = tk.CENTER)
-        bucket_list_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
+        self.bucket_list_tree.heading("#0", text = "")
+        self.bucket_list_tree.heading("Title", text = "Title", anchor = tk.CENTER)
+        self.bucket_list_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
+        self.bucket_list_tree.heading("Year", text = "Year", anchor = tk.CENTER)
+        self.bucket_list_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
         
-        count = 0
+        # Each row's iid is its movie ID so that changes can be applied to single rows
         for record in records:
-            bucket_list_tree.insert(parent = "", index = "end", iid = count, text = "",
-                                    values = (record[0], record[1], record[2], record[3]))
-            count += 1
-        
-        
-    def check_ID(self, master):
-        movie_ID = self.movie_ID_text_entry.get()
-        
-        if movie_ID == "":
-            messagebox.showerror(title = "Invalid Movie ID", message = "You did not enter a movie ID!")
-            return False
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-            
-        c.execute("SELECT username, movie_ID FROM user_bucket_list WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Movie ID", 
-                                 message = "That movie ID is not in your bucket list!")
-            
-            conn.close()
-            return False
-        
-        return True
+            self.bucket_list_tree.insert(parent = "", index = "end", iid = record[3], text = "",
+                                         values = (record[0], record[1], record[2], record[3]))
+        
+    # Create function which applies changes to the bucket list to the rows of its Treeview
+    def apply_changes(self, master, changes):
+        for table, action, movie_ID in changes:
+            if table != "user_bucket_list":
+                continue
+            
+            if action == "delete" and self.bucket_list_tree.exists(movie_ID):
+                self.bucket_list_tree.delete(movie_ID)
+            elif action == "insert" and not self.bucket_list_tree.exists(movie_ID):
+                record = master.database.fetchone("""SELECT title, genre, year, movie_ID FROM movie_info
+                                                  WHERE movie_ID = ?""", (movie_ID,))
+                insert_by_title(self.bucket_list_tree, record)
         
     def delete_movie(self, master):
-        ID_valid = self.check_ID(master)
-        
-        if not ID_valid:
-            return
-        
         movie_ID = self.movie_ID_text_entry.get()
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("SELECT title FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        movie_title = c.fetchall()[0][0]
-        
-        c.execute("DELETE FROM user_bucket_list WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        
-        conn.commit()
-        conn.close()
+        try:
+            movie_title = master.service.remove_from_bucket_list(master.username, movie_ID)
+        except ServiceError as error:
+            show_service_error(error)
+            return
         
         messagebox.showinfo(title = "Movie Removed",
                             message = "You have removed " + "'" + movie_title + "'")
         
-        master.change_frame(BucketListPage)
+        master.record_change("user_bucket_list", "delete", int(movie_ID))
+        self.movie_ID_text_entry.delete(0, tk.END)
     
     def add_to_history(self, master):
-        ID_valid = self.check_ID(master)
-        
-        if not ID_valid:
-            return
-        
         movie_ID = self.movie_ID_text_entry.get()
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("SELECT title FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        movie_title = c.fetchall()[0][0]
-        
-        c.execute("DELETE FROM user_bucket_list WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        
-        c.execute("INSERT INTO user_history VALUES (:username, :user_ID, :movie_ID)",
-                  {
-                     "username": master.username,
-                     "user_ID": master.user_ID,
-                     "movie_ID": int(movie_ID)
-                  })
-        
-        c.execute("UPDATE user_info SET trained = 0 WHERE username = ?",
-                  (master.username,))
-        
-        conn.commit()
-        conn.close()
+        try:
+            movie_title = master.service.move_to_history(master.username, movie_ID)
+        except ServiceError as error:
+            show_service_error(error)
+            return
+        master.trained = 0
         
         messagebox.showinfo(title = "Movie Added",
                             message = "You have added " + "'" + movie_title + "' " + "to your history")
         
-        master.change_frame(BucketListPage)
+        master.record_change("user_bucket_list", "delete", int(movie_ID))
+        master.record_change("user_history", "insert", int(movie_ID))
+        self.movie_ID_text_entry.delete(0, tk.END)
         
 class HistoryPage(tk.Frame):
     def __init__(self, master):
@@ -847,13 +695,8 @@ class HistoryPage(tk.Frame):
         logout_button.grid(row = 0, column = 5, padx = MENU_BTN_PADX, pady = MENU_BTN_PADY)
 
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Check how many existing records are in this user's history
-        c.execute("SELECT * FROM user_history WHERE username = ?", (master.username,))
-        records = c.fetchall()
-        conn.close()
+        # Read this user's history, sorted by title
+        records = master.service.history(master.username)
         
         # Create label and text entry box for movie IDs
         self.movie_ID_entry_label = tk.Label(self, text = "Movie ID")
@@ -879,20 +722,47 @@ class HistoryPage(tk.Frame):
                                        command = lambda: self.train_NeuMF(master))
         self.train_NeuMF_button.grid(row = 3, column = 4, padx = (10, 0), pady = 15)
         
+        # Create button for retraining NeuMF from scratch on the whole training set
+        self.full_retrain_button = tk.Button(self, text = "Full Retrain", borderwidth = BTN_BORD_WIDTH, width = 20,
+                                       bg = "grey", font = master.button_font,
+                                       command = lambda: self.train_NeuMF(master, full_retrain = True))
+        self.full_retrain_button.grid(row = 3, column = 5, padx = (10, 0), pady = 15)
+        
+        # Create label for training progress and button for cancelling training
+        # These are only placed on the grid while training is running
+        self.progress_label = tk.Label(self, text = "", wraplength = round(WINDOW_WIDTH/2))
+        self.cancel_button = tk.Button(self, text = "Cancel Training", borderwidth = BTN_BORD_WIDTH, width = 20,
+                                       bg = "grey", font = master.button_font,
+                                       command = self.cancel_training)
+        self.training_thread = None
+        self.progress_queue = None
+        self.cancel_event = None
+        
+        # Pending search of the movie title box, and the text last searched
+        self.search_job = None
+        self.searched_text = ""
+        
+        # Full-text search running in the background, and the pending check for its result
+        self.fallback_search = None
+        self.fallback_job = None
+        
+        # The history list is only shown once the history is complete, and the movie counter only while editing it
+        self.history_tree = None
+        self.movie_count_label = None
+        
         # Create a frame to pack a Treeview widget into
         self.tree_frame = tk.Frame(self, width = 1000, height = round(WINDOW_HEIGHT/2))
         self.tree_frame.grid(row = 4, column = 0, columnspan = 7, pady = 15)
         
         # Create widgets for creation of user history if number of movies is less than 20
-        if len(records) < 20:
+        if len(records) < MIN_HISTORY_SIZE:
             info_label = tk.Label(self,
                                   text = "It appears that you have not added enough movies to your history yet. Scroll " +
                                   "through the films below until you see a movie you have watched. Type the movie ID " +
                                   "into the text box and click 'Add Movie'. Repeat this process until you have added " +
                                   "at least 20 movies. The counter below keeps track of how many you have added so far. " +
-                                  "Make sure that you click 'Finish' once you have selected at least 20 movies. As a " +
-                                  "final note, if you reach the bottom of the movies list and have not added at least " +
-                                  "20, you can simply click the 'History' button at the top and refresh the list.",
+                                  "Make sure that you click 'Finish' once you have selected at least 20 movies. Click a " +
+                                  "column heading to sort the movies list by that column.",
                                   wraplength = round(WINDOW_WIDTH/2))
             
             info_label.grid(row = 1, column = 2, columnspan = 3, pady = 20)
@@ -905,53 +775,58 @@ class HistoryPage(tk.Frame):
                                       "and want to add more, you can click 'Edit History'. Additionally, you can delete a " +
                                       "movie from your history via its ID and 'Delete Movie'. Once you have added your " +
                                       "history to the training set with the 'Finish' button, you can click 'Train' and " +
-                                      "wait until you see 'Training finished!' appear.",
+                                      "wait until you see 'Training finished!' appear. 'Train' quickly fits the network " +
+                                      "to your history alone, while 'Full Retrain' trains it again on everyone's data.",
                                       wraplength = round(WINDOW_WIDTH/2))
             info_label.grid(row = 1, column = 2, columnspan = 3, pady = 20)
             
-            conn = sql.connect("application data/database.db")
-            c = conn.cursor()
-            
-            c.execute("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
-                      INNER JOIN user_history
-                      ON movie_info.movie_ID = user_history.movie_ID
-                      WHERE user_history.username = ?
-                      ORDER BY title""", (master.username,))
-                      
-            records = c.fetchall()
-            
-            conn.close()
-            
             # Create a scrollbar for the frame
             tree_scroll = tk.Scrollbar(self.tree_frame)
             tree_scroll.pack(side = tk.RIGHT, fill = tk.Y)
             
             # Create a Treeview widget for displaying user records
             
-            history_tree = ttk.Treeview(self.tree_frame, yscrollcommand = tree_scroll.set)
-            history_tree.pack()
+            self.history_tree = ttk.Treeview(self.tree_frame, yscrollcommand = tree_scroll.set)
+            self.history_tree.pack()
             
-            tree_scroll.config(command = history_tree.yview)
+            tree_scroll.config(command = self.history_tree.yview)
             
-            history_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
+            self.history_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
             
-            history_tree.column("#0", width = 0, minwidth = 0)
-            history_tree.column("Title", anchor = "w", width = 450)
-            history_tree.column("Genre", anchor = "w", width = 350)
-            history_tree.column("Year", anchor = tk.CENTER, width = 100)
-            history_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
+            self.history_tree.column("#0", width = 0, minwidth = 0)
+            self.history_tree.column("Title", anchor = "w", width = 450)
+            self.history_tree.column("Genre", anchor = "w", width = 350)
+            self.history_tree.column("Year", anchor = tk.CENTER, width = 100)
+            self.history_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
             
-            history_tree.heading("#0", text = "")
-            history_tree.heading("Title", text = "Title", anchor = tk.CENTER)
-            history_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
-            history_tree.heading("Year", text = "Year", anchor = tk.CENTER)
-            history_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
+            self.history_tree.heading("#0", text = "")
+            self.history_tree.heading("Title", text = "Title", anchor = tk.CENTER)
+            self.history_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
+            self.history_tree.heading("Year", text = "Year", anchor = tk.CENTER)
+            self.history_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
             
-            count = 0
+            # Each row's iid is its movie ID so that changes can be applied to single rows
             for record in records:
-                history_tree.insert(parent = "", index = "end", iid = count, text = "",
-                                        values = (record[0], record[1], record[2], record[3]))
-                count += 1
+                self.history_tree.insert(parent = "", index = "end", iid = record[3], text = "",
+                                         values = (record[0], record[1], record[2], record[3]))
+    
+    # Create function which applies changes to the user's history to the page
+    # The history list gains or loses single rows, and the movie counter is updated while the history is edited
+    def apply_changes(self, master, changes):
+        for table, action, movie_ID in changes:
+            if table != "user_history" or self.history_tree is None:
+                continue
+            
+            if action == "delete" and self.history_tree.exists(movie_ID):
+                self.history_tree.delete(movie_ID)
+            elif action == "insert" and not self.history_tree.exists(movie_ID):
+                record = master.database.fetchone("""SELECT title, genre, year, movie_ID FROM movie_info
+                                                  WHERE movie_ID = ?""", (movie_ID,))
+                insert_by_title(self.history_tree, record)
+        
+        if self.movie_count_label is not None and any(table == "user_history" for table, _, _ in changes):
+            self.movie_count_label.config(text = "Movies added: {}/{}".format(master.service.history_size(master.username),
+                                                                             MIN_HISTORY_SIZE))
     
     # Create function which creates the widgets for creation and editing of user history
     def create_edit_history(self, master, history_creation = False):
@@ -962,16 +837,16 @@ class HistoryPage(tk.Frame):
         self.edit_history_button.grid_forget()
         self.delete_movie_button.grid_forget()
         self.train_NeuMF_button.grid_forget()
+        self.full_retrain_button.grid_forget()
         self.tree_frame.grid_forget()
         
         if not history_creation:   
             info_label = tk.Label(self,
                                       text = "Scroll through the films below until you see a movie you have watched. Type the ID " +
                                       "into the text box and click 'Add Movie'. You can search for general or specific titles with " +
-                                      "the 'Search Movie' button and movie title text box. The counter below keeps track of how many you have added so far. " +
-                                      "Make sure that you click 'Finish' once you have selected at least 20 movies. As a " +
-                                      "final note, if you reach the bottom of the movies list and have not added at least " +
-                                      "20, you can simply click the 'History' button at the top to refresh the list.",
+                                      "the movie title text box, where results appear as you type. The counter below keeps track of how many you have added so far. " +
+                                      "Make sure that you click 'Finish' once you have selected at least 20 movies. Click a " +
+                                      "column heading to sort the movies list by that column.",
                                       wraplength = round(WINDOW_WIDTH/2))
                 
             info_label.grid(row = 1, column = 2, columnspan = 3, pady = 20)
@@ -987,12 +862,13 @@ class HistoryPage(tk.Frame):
         movie_title_entry_label.grid(row = 3, column = 2, columnspan = 2, pady = (5, 15))
         self.movie_title_text_entry = tk.Entry(self, width = 20)
         self.movie_title_text_entry.grid(row = 3, column = 3, columnspan = 2, pady = (5, 15))
+        self.movie_title_text_entry.bind("<KeyRelease>", lambda event: self.schedule_search(master))
         
-        # Create button for searching a movie title and opening new window with treeview of search results
-        search_movie_button = tk.Button(self, text = "Search Movie", width = 20, borderwidth = BTN_BORD_WIDTH,
+        # Create button for clearing the movie title box and showing the movies list again
+        clear_search_button = tk.Button(self, text = "Clear Search", width = 20, borderwidth = BTN_BORD_WIDTH,
                                      bg = "grey", font = master.button_font,
-                                     command = lambda: self.search_title(master))
-        search_movie_button.grid(row = 4, column = 2, pady = 10)
+                                     command = lambda: self.clear_search(master))
+        clear_search_button.grid(row = 4, column = 2, pady = 10)
         
         # Create button for adding a movie to history based on the entered movie ID
         add_movie_button = tk.Button(self, text = "Add Movie", width = 20, borderwidth = BTN_BORD_WIDTH,
@@ -1006,357 +882,267 @@ class HistoryPage(tk.Frame):
                                   command = lambda: self.finish(master))
         finish_button.grid(row = 4, column = 4, pady = 10)
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-    
-        c.execute("""SELECT title, genre, year, movie_ID FROM movie_info
-                     WHERE movie_ID IN (SELECT movie_ID FROM movie_info ORDER BY RANDOM() LIMIT 1000)""")
-                  
-        records = c.fetchall()
-        conn.close()
-        
-        # Create a frame to pack a Treeview widget into
-        tree_frame = tk.Frame(self, width = 1000, height = round(WINDOW_HEIGHT/2))
-        tree_frame.grid(row = 5, column = 0, columnspan = 6, pady = 15)
-        
-        # Create a scrollbar for the frame
-        tree_scroll = tk.Scrollbar(tree_frame)
-        tree_scroll.pack(side = tk.RIGHT, fill = tk.Y)
-        
-        # Create a Treeview widget for displaying user records
-        
-        movies_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
-        movies_tree.pack()
-        
-        tree_scroll.config(command = movies_tree.yview)
-        
-        movies_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
-        
-        movies_tree.column("#0", width = 0, minwidth = 0)
-        movies_tree.column("Title", anchor = "w", width = 450)
-        movies_tree.column("Genre", anchor = "w", width = 350)
-        movies_tree.column("Year", anchor = tk.CENTER, width = 100)
-        movies_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
-        
-        movies_tree.heading("#0", text = "")
-        movies_tree.heading("Title", text = "Title", anchor = tk.CENTER)
-        movies_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
-        movies_tree.heading("Year", text = "Year", anchor = tk.CENTER)
-        movies_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
-        
-        count = 0
-        for record in records:
-            movies_tree.insert(parent = "", index = "end", iid = count, text = "",
-                                    values = (record[0], record[1], record[2], record[3]))
-            count += 1
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-    
-        c.execute("SELECT * FROM user_history WHERE username = ?", (master.username,))
-        records = c.fetchall()
-        conn.close()
+        # Create a virtual Treeview which lists the whole catalog by title, reading it a page at a time as it scrolls
+        # The catalog is kept so it can be shown again when the movie title box is cleared
+        self.catalog = TableSource(master.database, "movie_info", MOVIE_COLUMNS)
+        self.movies_tree = VirtualTreeview(self, self.catalog, MOVIE_HEADINGS)
+        self.movies_tree.grid(row = 5, column = 0, columnspan = 6, pady = 15)
         
         # Create label below treeview box which tells user how many movies they have added so far
-        self.movie_count_label = tk.Label(self, text = "Movies added: {}/20".format(len(records)))
+        self.movie_count_label = tk.Label(self, text = "Movies added: {}/{}".format(
+                                          master.service.history_size(master.username), MIN_HISTORY_SIZE))
         self.movie_count_label.grid(row = 6, column = 4, columnspan = 2, padx = (70, 0)) 
         
     # Create function for deleting a movie from user history    
     def delete_movie(self, master):
         movie_ID = self.movie_ID_text_entry.get()
         
-        if movie_ID == "":
-            messagebox.showerror(title = "Invalid Movie ID", message = "You did not enter a movie ID!")
+        # Display selected movie in messagebox and ask user if they are sure they want to delete it
+        confirm = lambda movie_title: messagebox.askquestion(title = "Movie Selected",
+                                                             message = "You have decided to delete '" + movie_title +
+                                                             "' from your history. Is this correct?") == "yes"
+        try:
+            deleted = master.service.remove_from_history(master.username, movie_ID, confirm)
+        except ServiceError as error:
+            show_service_error(error)
             return
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Check if movie is in history
-        c.execute("SELECT * FROM user_history WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Movie ID", 
-                                 message = "That movie is not in your history!")
-            
-            conn.close()
-            return
-        
-        # Check if entered movie ID exists in records
-        c.execute("SELECT * FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Movie ID",
-                                 message = "That movie ID does not exist in our records!")
-            
-            conn.close()
-            return
+        if deleted:
+            master.record_change("user_history", "delete", int(movie_ID))
+            self.movie_ID_text_entry.delete(0, tk.END)
+    
+    # Create function which searches the movie title box once typing pauses
+    # The pending search is cancelled on every keystroke, so only the latest text is ever searched
+    def schedule_search(self, master):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
         
-        c.execute("SELECT title FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        movie_title = c.fetchall()[0][0]
+        self.search_job = self.after(SEARCH_DEBOUNCE_MS, lambda: self.search_title(master))
         
-        # Display selected movie in messagebox and ask user if they are sure they want to add it
-        decision = messagebox.askquestion(title = "Movie Selected",
-                                          message = "You have decided to delete '" + movie_title + "' from your history. " +
-                                          "Is this correct?")
-        if decision == "yes":
-            c.execute("DELETE FROM user_history WHERE user_ID = ? AND movie_ID = ?", (master.user_ID, int(movie_ID)))
-            c.execute("DELETE FROM train_set WHERE user_ID = ? AND movie_ID = ?", (master.user_ID, int(movie_ID)))
-            conn.commit()
-            conn.close()
-            
-            master.change_frame(HistoryPage)
-            
-        else:
-            return
-    
-    # Create function for searching movie_info table for titles equal or similar to entered title
-    # New window created with search results in treeview widget
+    # Create function for searching movie titles for the text in the movie title box
+    # Results replace the movies list, and the catalog is shown again when the box is empty
     def search_title(self, master):
+        self.search_job = None
         movie_title = self.movie_title_text_entry.get()
         
-        if movie_title == "":
-            messagebox.showerror(title = "Invalid Movie Title", message = "You did not enter a movie title!")
+        # Keys such as the arrows do not change the text, so there is nothing new to search
+        if movie_title == self.searched_text:
             return
+        self.searched_text = movie_title
         
-        results_window = tk.Toplevel(master)
-        results_window.title("Search Results")
-        results_window.geometry(str(WINDOW_WIDTH) + "x" + str(round(WINDOW_HEIGHT/2)))
-        
-        info_label = tk.Label(results_window, text = "Here are the results we found for '" + movie_title + "'.")
-        info_label.grid(row = 0, column = 0, columnspan = 2, padx = 60, pady = 15)
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Use 'LIKE' operator to find movie titles equal or similar to entered title
-        c.execute("""SELECT title, genre, year, movie_ID FROM movie_info
-                     WHERE title LIKE ?""", ("%" + movie_title + "%",))
-                     
-        records = c.fetchall()
-        conn.close()
-        
-        # Create a frame to pack a Treeview widget into
-        tree_frame = tk.Frame(results_window, width = 1000, height = round(WINDOW_HEIGHT/2))
-        tree_frame.grid(row = 1, column = 0, columnspan = 2, padx = 60, pady = 15)
-        
-        # Create a scrollbar for the frame
-        tree_scroll = tk.Scrollbar(tree_frame)
-        tree_scroll.pack(side = tk.RIGHT, fill = tk.Y)
+        # The result of a full-text search for earlier text is no longer wanted
+        if self.fallback_search is not None:
+            self.fallback_search.cancel()
+            self.fallback_search = None
         
-        # Create a Treeview widget for displaying movie search results
-        
-        movies_tree = ttk.Treeview(tree_frame, yscrollcommand = tree_scroll.set)
-        movies_tree.pack()
+        if movie_title.strip() == "":
+            self.movies_tree.set_source(self.catalog)
+            return
         
-        tree_scroll.config(command = movies_tree.yview)
+        # Use the in-memory title index, which matches the start of title words in any order
+        # If nothing matches, or the index is still being built, the full-text index is searched instead since it
+        # forgives small typos, which is too slow for the GUI thread so it runs in the background
+        records = master.title_index.search(movie_title) if master.title_index is not None else []
+        if len(records) == 0:
+            self.fallback_search = master.search_executor.submit(master.service.search, movie_title)
+            if self.fallback_job is None:
+                self.fallback_job = self.after(SEARCH_POLL_MS, self.poll_fallback_search)
+            return
         
-        movies_tree["columns"] = ("Title", "Genre", "Year", "Movie ID")
+        self.movies_tree.set_source(RecordsSource(records, MOVIE_COLUMNS))
         
-        movies_tree.column("#0", width = 0, minwidth = 0)
-        movies_tree.column("Title", anchor = "w", width = 450)
-        movies_tree.column("Genre", anchor = "w", width = 350)
-        movies_tree.column("Year", anchor = tk.CENTER, width = 100)
-        movies_tree.column("Movie ID", anchor = tk.CENTER, width = 100)
+    # Create function which shows the results of the background full-text search once it has finished
+    def poll_fallback_search(self):
+        self.fallback_job = None
+        if self.fallback_search is None:
+            return
         
-        movies_tree.heading("#0", text = "")
-        movies_tree.heading("Title", text = "Title", anchor = tk.CENTER)
-        movies_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
-        movies_tree.heading("Year", text = "Year", anchor = tk.CENTER)
-        movies_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
+        if not self.fallback_search.done():
+            self.fallback_job = self.after(SEARCH_POLL_MS, self.poll_fallback_search)
+            return
         
-        count = 0
-        for record in records:
-            movies_tree.insert(parent = "", index = "end", iid = count, text = "",
-                                    values = (record[0], record[1], record[2], record[3]))
-            count += 1
-            
-        return    
-             
+        records = self.fallback_search.result()
+        self.fallback_search = None
+        self.movies_tree.set_source(RecordsSource(records, MOVIE_COLUMNS))
+        
+    # Create function which empties the movie title box and shows the catalog again
+    def clear_search(self, master):
+        self.movie_title_text_entry.delete(0, tk.END)
+        self.search_title(master)
+        
+    # Create function which cancels a pending search before the page is destroyed
+    def destroy(self):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+            self.search_job = None
+        if self.fallback_job is not None:
+            self.after_cancel(self.fallback_job)
+            self.fallback_job = None
+        if self.fallback_search is not None:
+            self.fallback_search.cancel()
+            self.fallback_search = None
+        
+        tk.Frame.destroy(self)
         
     # Create function for adding a movie to user history after movie ID has been entered and add button has been clicked    
     def add_movie(self, master):
         movie_ID = self.movie_ID_text_entry.get()
         
-        if movie_ID == "":
-            messagebox.showerror(title = "Invalid Movie ID", message = "You did not enter a movie ID!")
-            return
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Check if movie is already in history
-        c.execute("SELECT * FROM user_history WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        records = c.fetchall()
-        if len(records) != 0:
-            messagebox.showerror(title = "Invalid Movie ID", 
-                                 message = "That movie is already in your history!")
-            
-            conn.close()
-            return
-        
-        # Check if entered movie ID exists in records
-        c.execute("SELECT * FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Movie ID",
-                                 message = "That movie ID does not exist in our records!")
-            
-            conn.close()
+        # Display selected movie in messagebox and ask user if they are sure they want to add it
+        confirm = lambda movie_title: messagebox.askquestion(title = "Movie Selected",
+                                                             message = "You have decided to add '" + movie_title +
+                                                             "' to your history. Is this correct?") == "yes"
+        try:
+            added = master.service.add_to_history(master.username, movie_ID, confirm)
+        except ServiceError as error:
+            show_service_error(error)
             return
         
-        c.execute("SELECT title FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        movie_title = c.fetchall()[0][0]
-        
-        # Display selected movie in messagebox and ask user if they are sure they want to add it
-        decision = messagebox.askquestion(title = "Movie Selected",
-                                          message = "You have decided to add '" + movie_title + "' to your history. " +
-                                          "Is this correct?")
-        if decision == "yes":
-            c.execute("INSERT INTO user_history VALUES (:username, :user_ID, :movie_ID)",
-                  {
-                     "username": master.username,
-                     "user_ID": master.user_ID,
-                     "movie_ID": int(movie_ID)
-                  })
-            
-            c.execute("SELECT * FROM user_history WHERE username = ?", (master.username,))
-            records = c.fetchall()
-            conn.commit()
-            conn.close()
-            
+        if added:
             # Update the movie count
-            self.movie_count_label = tk.Label(self, text = "Movies added: {}/20".format(len(records)))
-            self.movie_count_label.grid(row = 6, column = 4, columnspan = 2, padx = (70, 0))
+            master.record_change("user_history", "insert", int(movie_ID))
             
             # Delete text from ID entry box
             self.movie_ID_text_entry.delete(0, tk.END)
-            
-        else:
-            return
      
     # Create function for finishing the process of user history creation once amount of movies has reached or exceeded 20    
     def finish(self, master):
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Check if the user has an existing history and enough movies
-        c.execute("SELECT * FROM user_history WHERE username = ?", (master.username,))
-        records = c.fetchall()
-        
-        if len(records) < 20:
-            messagebox.showerror(title = "Invalid History Size",
-                                 message = "You must add at least 20 movies to your history!")
-            conn.close()
-        
-        # Select movie IDs from user_history
-        # Check which movie IDs already exist in train_set for this given user's ID
-        # Append new positive samples to train_set
-         
-        c.execute("SELECT movie_ID FROM user_history WHERE username = ?", (master.username,))    
-        all_movie_IDs = set([movie[0] for movie in c.fetchall()])
-        c.execute("SELECT movie_ID FROM train_set WHERE user_ID = ?", (master.user_ID,))
-        train_set_movie_IDs = set([movie[0] for movie in c.fetchall()])
-        movie_IDs = list(all_movie_IDs - train_set_movie_IDs)
-        
-        for ID in movie_IDs:
-            c.execute("INSERT INTO train_set VALUES (:user_ID, :movie_ID, :interaction)",
-                         {
-                         "user_ID": master.user_ID,
-                         "movie_ID": ID,
-                         "interaction": 1
-                         })    
-        
-        conn.commit()
-        conn.close()
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Append negative samples
-        for sample in range(1, len(movie_IDs) * 4):
-            c.execute("SELECT movie_ID FROM movie_info ORDER BY RANDOM() LIMIT 1")
-            rand_movie_ID = c.fetchall()[0][0]
-            while rand_movie_ID in movie_IDs:
-                c.execute("SELECT movie_ID FROM movie_info ORDER BY RANDOM() LIMIT 1")
-                rand_movie_ID = c.fetchall()[0][0]
-            
-            c.execute("INSERT INTO train_set VALUES (:user_ID, :movie_ID, :interaction)",
-                     {
-                     "user_ID": master.user_ID,
-                     "movie_ID": rand_movie_ID,
-                     "interaction": 0
-                     })
-            
-        c.execute("UPDATE user_info SET trained = 0 WHERE username = ?",
-                  (master.username,))
+        # Add the history's new movies to the training set, which needs at least MIN_HISTORY_SIZE movies
+        try:
+            master.service.finish_history(master.username)
+        except ServiceError as error:
+            show_service_error(error)
+            return
+        
         master.trained = 0
         
-        conn.commit()
-        conn.close()    
+        # Build the page again, which now shows the completed history
         master.change_frame(HistoryPage)
         
-    def train_NeuMF(self, master):
-        if master.trained == 1:
-            messagebox.showerror(title = "Training Error",
-                                 message = "The NeuMF network has already been trained with your current history. " +
-                                 "To enable training, add more movies to your history and then click 'Finish'.")
+    # Create function for training NeuMF on the user's history
+    # By default the user is folded into the existing network, which only fits that user's embedding vectors
+    # A full retrain fits every weight again on the whole training set
+    # Training runs on a background thread and reports progress through a queue polled by the GUI
+    def train_NeuMF(self, master, full_retrain = False):
+        if self.training_thread is not None and self.training_thread.is_alive():
+            messagebox.showerror(title = "Training Error", message = "The NeuMF network is already training!")
             return
-            
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM train_set WHERE user_ID = ?", (master.user_ID,))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Training Error",
-                                 message = "Your history has not been added to the training set. Return to 'Edit " +
-                                 "History' and click 'Finish'.")
+        
+        try:
+            master.service.check_training(master.username)
+        except ServiceError as error:
+            show_service_error(error)
+            return
+        
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.training_thread = threading.Thread(target = self.run_training,
+                                                args = (master, master.username, full_retrain, self.progress_queue,
+                                                        self.cancel_event),
+                                                daemon = True)
+        
+        # Disable the training buttons and show the progress label and cancel button while training
+        self.train_NeuMF_button.config(state = tk.DISABLED)
+        self.full_retrain_button.config(state = tk.DISABLED)
+        self.progress_label.config(text = "Preparing training data...")
+        self.progress_label.grid(row = 5, column = 2, columnspan = 3, pady = 5)
+        self.cancel_button.config(state = tk.NORMAL)
+        self.cancel_button.grid(row = 6, column = 3, pady = 5)
+        
+        self.training_thread.start()
+        master.after(PROGRESS_POLL_MS, lambda: self.poll_training(master))
+        
+    # Create function which runs on the background thread and performs the training
+    # It must not touch any tkinter widgets, so every result is sent back through the queue
+    def run_training(self, master, username, full_retrain, progress_queue, cancel_event):
+        try:
+            saved = master.service.train(username, full_retrain, progress_queue, cancel_event)
+            progress_queue.put(("finished", username) if saved else ("cancelled", None))
+            
+        except FullRetrainNeeded as error:
+            progress_queue.put(("full retrain needed", error.message))
+            
+        except Exception as error:
+            progress_queue.put(("error", str(error)))
+            
+    # Create function which checks the progress queue from the GUI thread
+    def poll_training(self, master):
+        finished = False
+        while not self.progress_queue.empty():
+            kind, info = self.progress_queue.get()
+            
+            if kind in ("batch", "epoch"):
+                self.show_progress(info)
+                continue
+            
+            finished = True
+            if kind == "finished":
+                self.training_finished(master, info)
+            elif kind == "cancelled":
+                self.show_training_stopped("Training was cancelled. Your previous model has been kept.")
+            elif kind == "full retrain needed":
+                self.offer_full_retrain(master, info)
+            else:
+                self.show_training_stopped("Training failed: " + info)
+        
+        if not finished:
+            master.after(PROGRESS_POLL_MS, lambda: self.poll_training(master))
+            
+    # Create function which displays throughput and estimated time remaining in the progress label
+    def show_progress(self, info):
+        if not self.winfo_exists():
+            return
+        
+        text = "Epoch {}/{}, batch {}/{}".format(info["epoch"], info["epochs"], info["batch"],
+                                                 info["steps"] if info["steps"] is not None else "?")
+        text += " - {:,.0f} samples/sec".format(info["samples_per_sec"])
+        if info["eta"] is not None:
+            text += " - about {:.0f}m {:02.0f}s remaining".format(*divmod(info["eta"], 60))
+        
+        self.progress_label.config(text = text)
+        
+    # Create function which restores the training buttons after training has stopped without a new model
+    def show_training_stopped(self, message):
+        if not self.winfo_exists():
+            return
+        
+        self.train_NeuMF_button.config(state = tk.NORMAL)
+        self.full_retrain_button.config(state = tk.NORMAL)
+        self.cancel_button.grid_forget()
+        self.progress_label.config(text = message)
+        
+    # Create function which asks the user whether to retrain the whole network when they cannot be folded in
+    def offer_full_retrain(self, master, message):
+        self.show_training_stopped("")
+        if not self.winfo_exists():
             return
-            
-        if isfile("application data/encodings and saved model/user_ID_encoding.npy"):
-            remove("application data/encodings and saved model/user_ID_encoding.npy")
-            
-        if isfile("application data/encodings and saved model/movie_ID_encoding.npy"):  
-            remove("application data/encodings and saved model/movie_ID_encoding.npy")
-            
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()   
-        
-        # Select train_set from database and save as numpy array
-        c.execute("SELECT user_ID, movie_ID, interaction FROM train_set")
-        train_set = np.array(c.fetchall())
-        conn.close()
-        
-        # Encode the user and movie IDs in train_set
-        # Save encoding for a given type of ID in a .npy file
-        
-        user_ID_enc = LabelEncoder()
-        user_ID_enc.fit(train_set[:, 0])
-        np.save("application data/encodings and saved model/user_ID_encoding.npy", user_ID_enc.classes_)
-        train_set[:, 0] = user_ID_enc.transform(train_set[:, 0])
-        
-        movie_ID_enc = LabelEncoder()
-        movie_ID_enc.fit(train_set[:, 1])
-        np.save("application data/encodings and saved model/movie_ID_encoding.npy", movie_ID_enc.classes_)
-        train_set[:, 1] = movie_ID_enc.transform(train_set[:, 1])
-        
-        train(model = NeuMF(num_users = np.unique(train_set[:, 0]).shape[0],
-                            num_items = np.unique(train_set[:, 1]).shape[0],
-                            gmf_embedding_dim = 16, mlp_embedding_dim = 16),
-             x_train = [train_set[:, 0], train_set[:, 1]], y_train = train_set[:, 2],
-             batch_size = 8192, epochs = 5, lr = 0.0001, save_name = "trained_NeuMF",
-             save_model_path = "application data/encodings and saved model")
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Update 'trained' value in user_info and master.trained value
-        c.execute("UPDATE user_info SET trained = 1 WHERE username = ?",
-                  (master.username,))
-        master.trained = 1
-        conn.commit()
-        conn.close()
+        
+        # The training thread has reported its last message and is only returning
+        self.training_thread.join()
+        if messagebox.askyesno(title = "Full Retrain Needed",
+                               message = message + " This takes several minutes. Retrain the whole network now?"):
+            self.train_NeuMF(master, full_retrain = True)
+        
+    # Create function which asks the training thread to stop at the end of the current batch
+    def cancel_training(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state = tk.DISABLED)
+            self.progress_label.config(text = "Cancelling...")
+            
+    # Create function which records that training has finished for the user it was started for
+    # This runs on the GUI thread once the training thread reports that it has finished
+    # The service has already reloaded the network and marked the user as trained
+    def training_finished(self, master, username):
+        if master.username == username:
+            master.trained = 1
+        
+        # The user may have moved to another page while training
+        if not self.winfo_exists():
+            return
+        
+        self.show_training_stopped("")
+        self.progress_label.grid_forget()
         
         # Create label widget to inform user that training has finished
         finished_label = tk.Label(self, text = "Training has finished! You can now head to 'Recommend' and see what " +
@@ -1401,8 +1187,9 @@ class RecommendPage(tk.Frame):
         logout_button.grid(row = 0, column = 5, padx = MENU_BTN_PADX, pady = MENU_BTN_PADY)
         
         # Create info for user
-        info_label = tk.Label(self, text = "The 'Recommend Movies' button creates a random selection of 100 movies " +
-                              "from our database. The trained NeuMF network then ranks these movies, for your user ID, " +
+        info_label = tk.Label(self, text = "The 'Recommend Movies' button scores every movie in our database that you " +
+                              "have not seen, or a random selection of 100 of them if you change the ranking option. " +
+                              "The trained NeuMF network ranks these movies, for your user ID, " +
                               "based on its confidence that you'll watch a given movie. The 10 movies it thinks you are " +
                               "most likely to watch will be displayed below. More detailed information can be displayed " +
                               "for a given movie by entering its ID and clicking 'Movie Info'. You can choose whether or " +
@@ -1422,35 +1209,44 @@ class RecommendPage(tk.Frame):
         genre_dropdown.config(width = 14)
         genre_dropdown.grid(row = 2, column = 3, columnspan = 2, pady = (15, 5))
         
+        # Create dropdown menu for choosing whether to rank the full catalog or a random sample
+        ranking_label = tk.Label(self, text = "Ranking")
+        ranking_label.grid(row = 3, column = 2, columnspan = 2, pady = 5)
+        self.ranking = tk.StringVar()
+        self.ranking.set(RANKING_OPTIONS[0])
+        ranking_dropdown = tk.OptionMenu(self, self.ranking, *RANKING_OPTIONS)
+        ranking_dropdown.config(width = 14)
+        ranking_dropdown.grid(row = 3, column = 3, columnspan = 2, pady = 5)
+        
         # Create label and text entry box for movie IDs
         movie_ID_entry_label = tk.Label(self, text = "Movie ID")
-        movie_ID_entry_label.grid(row = 3, column = 2, columnspan = 2, pady = (5, 15))
+        movie_ID_entry_label.grid(row = 4, column = 2, columnspan = 2, pady = (5, 15))
         self.movie_ID_text_entry = tk.Entry(self, width = 20)
-        self.movie_ID_text_entry.grid(row = 3, column = 3, columnspan = 2, pady = (5, 15))
+        self.movie_ID_text_entry.grid(row = 4, column = 3, columnspan = 2, pady = (5, 15))
         
         
         # Create button for movie recommendations
         recommend_movies_button = tk.Button(self, text = "Recommend Movies", borderwidth = BTN_BORD_WIDTH, width = 20,
                                        bg = "grey", font = master.button_font,
                                        command = lambda: self.recommend(master))
-        recommend_movies_button.grid(row = 4, column = 2, pady = 15)
+        recommend_movies_button.grid(row = 5, column = 2, pady = 15)
         
         # Create button for viewing more detailed information for a given movie ID
         recommend_movies_button = tk.Button(self, text = "Movie Info", borderwidth = BTN_BORD_WIDTH, width = 20,
                                        bg = "grey", font = master.button_font,
                                        command = lambda: self.movie_info(master))
-        recommend_movies_button.grid(row = 4, column = 3, pady = 15)
+        recommend_movies_button.grid(row = 5, column = 3, pady = 15)
         
         # Create button for adding a movie recommendation to the bucket list
         save_recommendation_button = tk.Button(self, text = "Save Recommendation",
                                                borderwidth = BTN_BORD_WIDTH, width = 20,
                                                bg = "grey", font = master.button_font,
                                                command = lambda: self.save_recommendation(master))
-        save_recommendation_button.grid(row = 4, column = 4, pady = 15)
+        save_recommendation_button.grid(row = 5, column = 4, pady = 15)
         
         # Create a frame to pack a Treeview widget into
         tree_frame = tk.Frame(self, width = 1000, height = round(WINDOW_HEIGHT/2))
-        tree_frame.grid(row = 5, column = 0, columnspan = 6, pady = 15)
+        tree_frame.grid(row = 6, column = 0, columnspan = 6, pady = 15)
         
         # Create a scrollbar for the frame
         tree_scroll = tk.Scrollbar(tree_frame)
@@ -1476,67 +1272,51 @@ class RecommendPage(tk.Frame):
         self.recommended_movies_tree.heading("Genre", text = "Genre", anchor = tk.CENTER)
         self.recommended_movies_tree.heading("Year", text = "Year", anchor = tk.CENTER)
         self.recommended_movies_tree.heading("Movie ID", text = "Movie ID", anchor = tk.CENTER)
+        
+        # Overviews and poster images of the recommended movies fetched in the background, keyed by movie ID
+        self.details = {}
     
-    # Create function for generating random movies and choosing 10 with highest interaction confidence
+    # Create function for ranking movies and choosing the 10 with highest interaction confidence
     def recommend(self, master):
-        if master.trained == 0:
-            messagebox.showerror(title = "Training Error",
-                                 message = "You have not trained the NeuMF network on your history yet!")
+        # The full catalog is scored in one batched pass, with the movies the user has seen masked out
+        try:
+            top10_movies = master.service.recommend(master.username,
+                                                    genre = None if self.genre.get() == "Any Genre" else self.genre.get(),
+                                                    full_catalog = self.ranking.get() == "Full Catalog")
+        except ServiceError as error:
+            show_service_error(error)
             return
         
         # Delete any current rows in treeview widget
         self.recommended_movies_tree.delete(*self.recommended_movies_tree.get_children())
         
-        # Store the train_set movie IDs for the current user in a list
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        if self.genre.get() == "Any Genre":
-            c.execute("""SELECT movie_ID FROM movie_info
-                      WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
-                      ORDER BY RANDOM() LIMIT 100""", (master.user_ID,))
-        else:
-            c.execute("""SELECT movie_ID FROM movie_info
-                      WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
-                      AND genre LIKE ?
-                      ORDER BY RANDOM() LIMIT 100""", (master.user_ID, "%" + self.genre.get() + "%"))
-                     
-        movie_IDs_100 = [record[0] for record in c.fetchall()]  
-        conn.close()
-           
-        # Encode user_ID and movie_IDs with the scheme used for training
-        user_ID_enc = LabelEncoder()
-        user_ID_enc.classes_ = np.load('application data/encodings and saved model/user_ID_encoding.npy')
-        user_ID_100 = user_ID_enc.transform(np.array([master.user_ID] * 100))
-        movie_ID_enc = LabelEncoder()
-        movie_ID_enc.classes_ = np.load('application data/encodings and saved model/movie_ID_encoding.npy')
-        movie_IDs_100 = movie_ID_enc.transform(np.array(movie_IDs_100))
-           
-        # Load trained NeuMF network and make predictions for interactions with movies
-        trained_NeuMF = load_model("application data/encodings and saved model/trained_NeuMF.h5")
-        preds = np.squeeze(trained_NeuMF.predict([user_ID_100, movie_IDs_100]),
-                               axis = 1)  
-        
-        # Sort movies by confidence of interaction and then inverse transform to get original movie IDs
-        top10_movie_IDs = [movie_IDs_100[i] for i in np.argsort(preds)[::-1][0:10].tolist()]
-        top10_movie_IDs = movie_ID_enc.inverse_transform(np.array(top10_movie_IDs))
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Use movie_info table to find information about the top 10 movies
         # Insert rows into treeview widget
         count = 0
-        for ID in top10_movie_IDs:
-            c.execute("SELECT title, genre, year, movie_ID FROM movie_info WHERE movie_ID = ?", (int(ID),))
-            movie = c.fetchall()[0]
+        movies = []
+        for movie in top10_movies:
             self.recommended_movies_tree.insert(parent = "", index = "end", iid = count, text = "",
                                     values = (movie[0], movie[1], movie[2], movie[3]))
+            movies.append((movie[3], movie[4]))
             count += 1
         
-        conn.close()
+        # Start fetching the details of every recommended movie so that 'Movie Info' can show them straight away
+        self.details = {}
+        master.prefetcher.prefetch(movies)
+        master.after(PREFETCH_POLL_MS, lambda: self.poll_prefetch(master))
+        
         return
     
+    # Create function which collects the movie details fetched in the background from the GUI thread
+    def poll_prefetch(self, master):
+        if not self.winfo_exists():
+            return
+        
+        for movie_ID, overview, poster in master.prefetcher.finished():
+            self.details[movie_ID] = (overview, poster)
+        
+        if master.prefetcher.pending():
+            master.after(PREFETCH_POLL_MS, lambda: self.poll_prefetch(master))
+    
     def movie_info(self, master):
         movie_ID = self.movie_ID_text_entry.get()
         
@@ -1544,40 +1324,28 @@ class RecommendPage(tk.Frame):
             messagebox.showerror(title = "Invalid Movie ID", message = "You did not enter a movie ID!")
             return
         
+        record = master.database.fetchone("SELECT IMDb_ID, genre, movie_ID FROM movie_info WHERE movie_ID = ?",
+                                          (movie_ID,))
+        genres_string = str(record[1])
+        
+        # Recommended movies have usually been fetched in the background already
+        # Other movies come from the on-disk cache, so only movies not seen recently are downloaded
+        if record[2] in self.details:
+            movie_info, poster = self.details[record[2]]
+        else:
+            try:
+                movie_info = master.imdb_cache.overview(record[0])
+                poster = Image.open(io.BytesIO(master.imdb_cache.poster(record[0], movie_info)))
+            except requests.RequestException as error:
+                messagebox.showerror(title = "Connection Error",
+                                     message = "The movie details could not be downloaded: " + str(error))
+                return
+        
         movie_info_window = tk.Toplevel(master)
         movie_info_window.title("Movie Info")
         movie_info_window.geometry(str(round(WINDOW_WIDTH * 7/12)) + "x" + str(round(WINDOW_HEIGHT * 4/3)))
         
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        c.execute("SELECT IMDb_ID, genre FROM movie_info WHERE movie_ID = ?", (movie_ID,))
-        record = c.fetchall()
-        IMDb_ID = str(record[0][0])
-        genres_string = str(record[0][1])
-        
-        while len(IMDb_ID) < 7:
-            IMDb_ID = "0" + IMDb_ID
-        
-        IMDb_ID = "tt" + IMDb_ID    
-        
-        url = "https://imdb8.p.rapidapi.com/title/get-overview-details"
-
-        querystring = {"tconst":IMDb_ID,"currentCountry":"GB"}
-        
-        headers = {
-            'x-rapidapi-key': RAPID_API_KEY,
-            'x-rapidapi-host': "imdb8.p.rapidapi.com"
-            }
-        
-        response = requests.get(url, headers=headers, params=querystring)
-        
-        movie_info = response.json()
-        
-        image_url = movie_info["title"]["image"]["url"]
-        
-        self.movie_poster = Image.open(requests.get(image_url, stream=True).raw).resize((340, 503))
-        self.movie_poster = ImageTk.PhotoImage(self.movie_poster)
+        self.movie_poster = ImageTk.PhotoImage(poster)
         
         image_label = tk.Label(movie_info_window, image = self.movie_poster)
         image_label.grid(row = 0, column = 0, columnspan = 2, pady = (10, 15))
@@ -1626,64 +1394,23 @@ class RecommendPage(tk.Frame):
         
     
     def save_recommendation(self, master):
-        if master.trained == 0:
-            messagebox.showerror(title = "Training Error",
-                                 message = "You have not trained the NeuMF network on your history yet!")
-            return
-        
         movie_ID = self.movie_ID_text_entry.get()
         
-        if movie_ID == "":
-            messagebox.showerror(title = "Invalid Movie ID", message = "You did not enter a movie ID!")
-            return
-        
-        conn = sql.connect("application data/database.db")
-        c = conn.cursor()
-        
-        # Check if movie is already in user_bucket_list for this user
-        c.execute("SELECT * FROM user_bucket_list WHERE username = ? AND movie_ID = ?",
-                  (master.username, int(movie_ID)))
-        records = c.fetchall()
-        if len(records) != 0:
-            messagebox.showerror(title = "Invalid Movie ID", 
-                                 message = "That movie is already in your bucket list!")
-            
-            conn.close()
-            return
-        
-        # Check if entered movie ID exists in records
-        c.execute("SELECT * FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        records = c.fetchall()
-        if len(records) == 0:
-            messagebox.showerror(title = "Invalid Movie ID",
-                                 message = "That movie ID does not exist in our records!")
-            
-            conn.close()
+        # Display selected movie in messagebox and ask user if they are sure they want to add it
+        confirm = lambda movie_title: messagebox.askquestion(title = "Movie Selected",
+                                                             message = "You have decided to add '" + movie_title +
+                                                             "' to your bucket list. Is this correct?") == "yes"
+        try:
+            added = master.service.add_to_bucket_list(master.username, movie_ID, confirm)
+        except ServiceError as error:
+            show_service_error(error)
             return
         
-        c.execute("SELECT title FROM movie_info WHERE movie_ID = ?", (int(movie_ID),))
-        movie_title = c.fetchall()[0][0]
-        
-        # Display selected movie in messagebox and ask user if they are sure they want to add it
-        decision = messagebox.askquestion(title = "Movie Selected",
-                                          message = "You have decided to add '" + movie_title + "' to your bucket " +
-                                          "list. Is this correct?")
-        if decision == "yes":
-            c.execute("INSERT INTO user_bucket_list VALUES (:username, :user_ID, :movie_ID)",
-                  {
-                     "username": master.username,
-                     "user_ID": master.user_ID,
-                     "movie_ID": int(movie_ID)
-                  })
-            
-            conn.commit()
-            conn.close()
+        if added:
+            master.record_change("user_bucket_list", "insert", int(movie_ID))
             
             # Delete text from ID entry box
             self.movie_ID_text_entry.delete(0, tk.END)
-            
-        else:
-            return
         
         
            
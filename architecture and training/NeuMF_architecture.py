@@ -4,7 +4,7 @@ from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Input, Embedding, Flatten, Dot, Dense, BatchNormalization, Dropout, Concatenate
 from tensorflow.keras.optimizers import Adam
 
-def NeuMF(num_users, num_items, gmf_embedding_dim, mlp_embedding_dim):
+def NeuMF(num_users, num_items, gmf_embedding_dim, mlp_embedding_dim, mlp_units = (16, 8)):
     # Define input vectors for embedding
     u_input = Input(shape = [1,])
     i_input = Input(shape = [1,])
@@ -29,13 +29,12 @@ def NeuMF(num_users, num_items, gmf_embedding_dim, mlp_embedding_dim):
     # MLP path
     mlp_input_concat = Concatenate()([u_vec_mlp, i_vec_mlp])
     
-    mlp_dense_1 = Dense(units = 16, activation = "relu")(mlp_input_concat)
-    mlp_bn_1 = BatchNormalization()(mlp_dense_1)
-    #mlp_drop_2 = Dropout(0.2)(mlp_bn_1)
-    
-    mlp_dense_2 = Dense(units = 8, activation = "relu")(mlp_bn_1)
-    mlp_output = BatchNormalization()(mlp_dense_2)
-    #mlp_output = Dropout(0.2)(mlp_bn_2)
+    # One dense layer, followed by batch normalisation, for each entry of mlp_units
+    mlp_output = mlp_input_concat
+    for units in mlp_units:
+        mlp_dense = Dense(units = units, activation = "relu")(mlp_output)
+        mlp_output = BatchNormalization()(mlp_dense)
+        #mlp_output = Dropout(0.2)(mlp_output)
 
     # Concatenate GMF and MLP pathways
     paths_concat = Concatenate()([gmf_output, mlp_output])
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for making predictions with a NeuMF network saved
+by training_and_evaluation.train without importing TensorFlow. The weights are
+read straight from the .h5 file and the forward pass is computed with NumPy.
+h5py is imported by the functions which open .h5 files, so that importing this
+script at application startup stays quick."""
+
+import json
+
+import numpy as np
+
+from os import chdir, replace, walk
+from shutil import copyfile
+from os.path import dirname, abspath, join
+
+# Number of rows scored at once, which bounds the size of the intermediate arrays
+SCORE_CHUNK_SIZE = 65536
+
+# Constants for the Adam optimiser used when folding in a single user
+ADAM_BETA_1 = 0.9
+ADAM_BETA_2 = 0.999
+ADAM_EPSILON = 1e-7
+
+# Largest difference allowed between NumPy and keras predictions for a saved model
+PARITY_TOLERANCE = 1e-5
+
+class NeuMFInference:
+    def __init__(self, user_gmf, item_gmf, user_mlp, item_mlp, mlp_layers, gmf_weight, mlp_weights, output_bias):
+        self.user_gmf = user_gmf
+        self.item_gmf = item_gmf
+        self.user_mlp = user_mlp
+        self.item_mlp = item_mlp
+
+        # List of (kernel, bias) pairs for the MLP path
+        # Each BatchNormalization layer has already been folded into the layer which follows it
+        self.mlp_layers = mlp_layers
+
+        self.gmf_weight = gmf_weight
+        self.mlp_weights = mlp_weights
+        self.output_bias = output_bias
+
+        # The first MLP layer acts on the concatenation [user vector, item vector]
+        # Split its kernel and project every item once so scoring only needs a gather and an add
+        mlp_dim = user_mlp.shape[1]
+        first_kernel, first_bias = mlp_layers[0]
+        self.first_user_kernel = first_kernel[0:mlp_dim]
+        self.item_mlp_projection = item_mlp @ first_kernel[mlp_dim:] + first_bias
+
+    @property
+    def num_users(self):
+        return self.user_gmf.shape[0]
+
+    @property
+    def num_items(self):
+        return self.item_gmf.shape[0]
+
+    @classmethod
+    def from_h5(cls, model_path):
+        import h5py
+
+        with h5py.File(model_path, "r") as f:
+            layers = _read_h5_config(f)
+            weights = _read_h5_weights(f, layers)
+
+        return cls(**_assemble_NeuMF(layers, weights))
+
+    # Create function which returns the interaction confidence for each (user, item) pair
+    # users and items are encoded IDs of equal length
+    def score(self, users, items):
+        users = np.asarray(users).reshape(-1)
+        items = np.asarray(items).reshape(-1)
+
+        scores = np.empty(users.shape[0], dtype = np.float32)
+        for start in range(0, users.shape[0], SCORE_CHUNK_SIZE):
+            stop = start + SCORE_CHUNK_SIZE
+            scores[start:stop] = self._score_chunk(users[start:stop], items[start:stop])
+
+        return scores
+
+    # Create function with the same call signature and output shape as keras Model.predict()
+    # This lets evaluation code use either a keras model or this class
+    def predict(self, x, batch_size = None, verbose = 0):
+        users, items = x
+
+        return self.score(users, items)[:, np.newaxis]
+
+    # Create function which fits the GMF and MLP embedding vectors of one user while every other weight stays frozen
+    # user_index can equal num_users, in which case the fit starts from the average user for a new row
+    # items and labels are the encoded movie IDs and interactions for that user only
+    # The network itself is left unchanged, since it may be serving recommendations, and the fitted vectors are
+    # returned for write_user_embeddings to save
+    def fold_in_user(self, user_index, items, labels, epochs = 100, lr = 0.05, l2 = 1e-4):
+        if user_index > self.num_users:
+            raise ValueError("user_index must be an existing user or the next unused index")
+
+        items = np.asarray(items).reshape(-1)
+        labels = np.asarray(labels, dtype = np.float32).reshape(-1)
+
+        if user_index < self.num_users:
+            gmf_vector = self.user_gmf[user_index].copy()
+            mlp_vector = self.user_mlp[user_index].copy()
+        else:
+            # Start a new user from the average user, which is much closer to a good solution than random values
+            gmf_vector = self.user_gmf.mean(axis = 0)
+            mlp_vector = self.user_mlp.mean(axis = 0)
+
+        # Only the rows for this user's movies are needed, so gather them once
+        item_gmf = self.item_gmf[items]
+        item_mlp_projection = self.item_mlp_projection[items]
+
+        params = [gmf_vector, mlp_vector]
+        first_moments = [np.zeros_like(param) for param in params]
+        second_moments = [np.zeros_like(param) for param in params]
+
+        for step in range(1, epochs + 1):
+            # Forward pass, keeping the pre-activations of each MLP layer for backpropagation
+            gmf_output = item_gmf @ gmf_vector
+            pre_activations = [mlp_vector @ self.first_user_kernel + item_mlp_projection]
+            hidden = np.maximum(pre_activations[0], 0)
+            for kernel, bias in self.mlp_layers[1:]:
+                pre_activations.append(hidden @ kernel + bias)
+                hidden = np.maximum(pre_activations[-1], 0)
+
+            logits = gmf_output * self.gmf_weight + hidden @ self.mlp_weights + self.output_bias
+            probs = 1 / (1 + np.exp(-logits))
+
+            # Gradient of the mean binary cross-entropy with respect to the logits
+            d_logits = (probs - labels) / labels.shape[0]
+
+            grad_gmf = self.gmf_weight * (d_logits @ item_gmf) + l2 * gmf_vector
+
+            d_hidden = np.outer(d_logits, self.mlp_weights)
+            for (kernel, _), pre_activation in zip(self.mlp_layers[:0:-1], pre_activations[:0:-1]):
+                d_hidden = (d_hidden * (pre_activation > 0)) @ kernel.T
+            d_first = d_hidden * (pre_activations[0] > 0)
+            grad_mlp = d_first.sum(axis = 0) @ self.first_user_kernel.T + l2 * mlp_vector
+
+            # Adam update applied in place to both vectors
+            for param, grad, m, v in zip(params, (grad_gmf, grad_mlp), first_moments, second_moments):
+                m *= ADAM_BETA_1
+                m += (1 - ADAM_BETA_1) * grad
+                v *= ADAM_BETA_2
+                v += (1 - ADAM_BETA_2) * grad ** 2
+                m_hat = m / (1 - ADAM_BETA_1 ** step)
+                v_hat = v / (1 - ADAM_BETA_2 ** step)
+                param -= lr * m_hat / (np.sqrt(v_hat) + ADAM_EPSILON)
+
+        return gmf_vector, mlp_vector
+
+    def _score_chunk(self, users, items):
+        # GMF path
+        gmf_output = np.einsum("ij,ij->i", self.user_gmf[users], self.item_gmf[items])
+
+        # MLP path, where the item half of the first layer has been precomputed
+        hidden = self.user_mlp[users] @ self.first_user_kernel + self.item_mlp_projection[items]
+        hidden = np.maximum(hidden, 0)
+        for kernel, bias in self.mlp_layers[1:]:
+            hidden = np.maximum(hidden @ kernel + bias, 0)
+
+        logits = gmf_output * self.gmf_weight + hidden @ self.mlp_weights + self.output_bias
+
+        return 1 / (1 + np.exp(-logits))
+
+# Create function which reads the layer configs of a keras model saved in .h5 format
+def _read_h5_config(f):
+    model_config = f.attrs["model_config"]
+    if isinstance(model_config, bytes):
+        model_config = model_config.decode("utf-8")
+
+    return parse_model_config(json.loads(model_config)["config"])
+
+# Create function which turns a functional keras model config into a dictionary of layers keyed by name
+# This accepts the config saved in a .h5 file or the output of Model.get_config()
+def parse_model_config(model_config):
+    layers = {}
+    for layer in model_config["layers"]:
+        if len(layer["inbound_nodes"]) > 0:
+            inbound = [node[0] for node in layer["inbound_nodes"][0]]
+        else:
+            inbound = []
+
+        layers[layer["name"]] = {"class_name": layer["class_name"],
+                                 "config": layer["config"],
+                                 "inbound": inbound}
+
+    # Mark which input layer carries user IDs and which carries item IDs
+    input_names = [node[0] for node in model_config["input_layers"]]
+    layers["__inputs__"] = input_names
+    layers["__output__"] = model_config["output_layers"][0][0]
+
+    return layers
+
+# Create function which reads the layer names and unfolded weights of a model built by NeuMF_architecture.NeuMF
+def read_NeuMF_weights(model_path):
+    import h5py
+
+    with h5py.File(model_path, "r") as f:
+        layers = _read_h5_config(f)
+        weights = _read_h5_weights(f, layers)
+
+    return NeuMF_layer_names(layers), weights
+
+# Create function which returns the h5py group holding the weights of each layer
+def _weights_group(f):
+    return f["model_weights"] if "model_weights" in f else f
+
+# Create function which returns the full dataset path of every weight belonging to a layer
+def _weight_names(group):
+    return [name.decode("utf-8") if isinstance(name, bytes) else name for name in group.attrs["weight_names"]]
+
+# Create function which reads the weights of every layer in a keras model saved in .h5 format
+def _read_h5_weights(f, layers):
+    weights = {}
+    weights_group = _weights_group(f)
+    for name in layers:
+        if name.startswith("__") or name not in weights_group:
+            continue
+        group = weights_group[name]
+        layer_weights = {}
+        for weight_name in _weight_names(group):
+            key = weight_name.split("/")[-1].split(":")[0]
+            layer_weights[key] = np.array(group[weight_name], dtype = np.float32)
+        weights[name] = layer_weights
+
+    return weights
+
+# Create function which returns the affine scale and shift equivalent to a BatchNormalization layer at inference time
+def _batch_norm_affine(layer_config, layer_weights):
+    mean = layer_weights["moving_mean"]
+    variance = layer_weights["moving_variance"]
+    gamma = layer_weights.get("gamma", np.ones_like(mean))
+    beta = layer_weights.get("beta", np.zeros_like(mean))
+
+    scale = gamma / np.sqrt(variance + layer_config.get("epsilon", 0.001))
+
+    return scale, beta - scale * mean
+
+# Create function which walks back from a Flatten layer to the Embedding layer feeding it
+def _embedding_for(layers, name):
+    while layers[name]["class_name"] != "Embedding":
+        name = layers[name]["inbound"][0]
+
+    return name
+
+# Create function which orders two embedding layer names as (user, item) using the model inputs
+def _user_item_pair(layers, names):
+    user_input = layers["__inputs__"][0]
+    embeddings = [_embedding_for(layers, name) for name in names]
+
+    if layers[embeddings[0]]["inbound"][0] == user_input:
+        return embeddings[0], embeddings[1]
+
+    return embeddings[1], embeddings[0]
+
+# Create function which finds the names of the layers in a model built by NeuMF_architecture.NeuMF
+def NeuMF_layer_names(layers):
+    output_name = layers["__output__"]
+    output_layer = layers[output_name]
+    if output_layer["class_name"] != "Dense" or output_layer["config"]["activation"] != "sigmoid":
+        raise ValueError("Expected the model output to be a Dense layer with sigmoid activation")
+
+    paths_concat = layers[output_layer["inbound"][0]]
+    gmf_position = [layers[name]["class_name"] for name in paths_concat["inbound"]].index("Dot")
+    gmf_name = paths_concat["inbound"][gmf_position]
+    mlp_name = paths_concat["inbound"][1 - gmf_position]
+
+    user_gmf_name, item_gmf_name = _user_item_pair(layers, layers[gmf_name]["inbound"])
+
+    # Walk back along the MLP path collecting Dense and BatchNormalization layers until the input concatenation
+    mlp_path = []
+    name = mlp_name
+    while layers[name]["class_name"] != "Concatenate":
+        if layers[name]["class_name"] in ("Dense", "BatchNormalization"):
+            mlp_path.append(name)
+        elif layers[name]["class_name"] != "Dropout":
+            raise ValueError("Unexpected layer '{}' in the MLP path".format(name))
+        name = layers[name]["inbound"][0]
+    mlp_path.reverse()
+
+    user_mlp_name, item_mlp_name = _user_item_pair(layers, layers[name]["inbound"])
+    if _embedding_for(layers, layers[name]["inbound"][0]) != user_mlp_name:
+        raise ValueError("Expected the MLP input concatenation to have the user embedding first")
+
+    return {"user_gmf": user_gmf_name, "item_gmf": item_gmf_name,
+            "user_mlp": user_mlp_name, "item_mlp": item_mlp_name,
+            "mlp_path": mlp_path, "output": output_name, "gmf_position": gmf_position}
+
+# Create function which turns the layers of a model built by NeuMF_architecture.NeuMF into NeuMFInference arguments
+def _assemble_NeuMF(layers, weights):
+    names = NeuMF_layer_names(layers)
+    output_name = names["output"]
+    gmf_position = names["gmf_position"]
+
+    # Fold each BatchNormalization layer into the weights of the layer after it
+    # Dense(relu) -> BN -> Dense becomes Dense(relu) -> Dense with rescaled kernel and shifted bias
+    mlp_layers = []
+    scale, shift = None, None
+    for name in names["mlp_path"]:
+        layer = layers[name]
+        if layer["class_name"] == "BatchNormalization":
+            scale, shift = _batch_norm_affine(layer["config"], weights[name])
+            continue
+
+        if layer["config"]["activation"] != "relu":
+            raise ValueError("Expected the MLP Dense layers to use relu activation")
+        kernel = weights[name]["kernel"]
+        bias = weights[name].get("bias", np.zeros(kernel.shape[1], dtype = np.float32))
+        if scale is not None:
+            bias = bias + shift @ kernel
+            kernel = scale[:, np.newaxis] * kernel
+            scale, shift = None, None
+        mlp_layers.append((kernel, bias))
+
+    # Split the output kernel into its GMF and MLP rows and fold in any trailing BatchNormalization layer
+    output_kernel = weights[output_name]["kernel"][:, 0]
+    output_bias = weights[output_name].get("bias", np.zeros(1, dtype = np.float32))[0]
+    gmf_weight = output_kernel[0] if gmf_position == 0 else output_kernel[-1]
+    mlp_weights = output_kernel[1:] if gmf_position == 0 else output_kernel[0:-1]
+    if scale is not None:
+        output_bias = output_bias + shift @ mlp_weights
+        mlp_weights = scale * mlp_weights
+
+    return {"user_gmf": weights[names["user_gmf"]]["embeddings"],
+            "item_gmf": weights[names["item_gmf"]]["embeddings"],
+            "user_mlp": weights[names["user_mlp"]]["embeddings"],
+            "item_mlp": weights[names["item_mlp"]]["embeddings"],
+            "mlp_layers": mlp_layers,
+            "gmf_weight": np.float32(gmf_weight),
+            "mlp_weights": mlp_weights.astype(np.float32),
+            "output_bias": np.float32(output_bias)}
+
+# Create function which writes the embedding vectors of one user back into a saved .h5 model
+# A user_index equal to the current number of users resizes both user embedding matrices by one row
+# The file is edited as a copy and then swapped in, so the previous model survives a failed write
+def write_user_embeddings(model_path, user_index, gmf_vector, mlp_vector):
+    import h5py
+
+    temp_path = model_path + ".tmp"
+    copyfile(model_path, temp_path)
+
+    with h5py.File(temp_path, "r+") as f:
+        names = NeuMF_layer_names(_read_h5_config(f))
+        weights_group = _weights_group(f)
+
+        num_users = None
+        for name, vector in ((names["user_gmf"], gmf_vector), (names["user_mlp"], mlp_vector)):
+            group = weights_group[name]
+            weight_name = _weight_names(group)[0]
+            embeddings = group[weight_name]
+
+            if user_index < embeddings.shape[0]:
+                embeddings[user_index] = vector
+                continue
+            if user_index > embeddings.shape[0]:
+                raise ValueError("user_index must be an existing user or the next unused index")
+
+            resized = np.vstack([embeddings[()], np.asarray(vector, dtype = embeddings.dtype)[np.newaxis]])
+            del group[weight_name]
+            group.create_dataset(weight_name, data = resized)
+            num_users = resized.shape[0]
+
+        # Keep the saved architecture consistent with the resized weights so keras can still load the model
+        if num_users is not None:
+            model_config = f.attrs["model_config"]
+            is_bytes = isinstance(model_config, bytes)
+            model_config = json.loads(model_config.decode("utf-8") if is_bytes else model_config)
+            for layer in model_config["config"]["layers"]:
+                if layer["name"] in (names["user_gmf"], names["user_mlp"]):
+                    layer["config"]["input_dim"] = num_users
+            model_config = json.dumps(model_config)
+            f.attrs["model_config"] = model_config.encode("utf-8") if is_bytes else model_config
+
+    replace(temp_path, model_path)
+
+# Create function which compares NeuMFInference predictions with keras predictions for a saved model
+# Returns the maximum absolute difference over randomly drawn (user, item) pairs
+def parity_check(model_path, num_samples = 10000, seed = 0):
+    from tensorflow.keras.models import load_model
+
+    engine = NeuMFInference.from_h5(model_path)
+    keras_model = load_model(model_path)
+
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, engine.num_users, size = num_samples)
+    items = rng.integers(0, engine.num_items, size = num_samples)
+
+    keras_preds = np.squeeze(keras_model.predict([users, items], batch_size = 8192), axis = 1)
+    numpy_preds = engine.score(users, items)
+
+    return float(np.max(np.abs(keras_preds - numpy_preds)))
+
+if __name__ == "__main__":
+    # Set working directory to folder which contains this script
+    chdir(dirname(abspath(__file__)))
+    
+    # Check every saved model against keras and fail loudly if any prediction differs
+    failures = []
+    for folder, _, files in walk("../model data/saved models"):
+        for file in sorted(files):
+            if not file.endswith(".h5"):
+                continue
+            max_diff = parity_check(join(folder, file))
+            print("{}: max abs difference {:.2e}".format(join(folder, file), max_diff))
+            if max_diff > PARITY_TOLERANCE:
+                failures.append(join(folder, file))
+
+    if len(failures) > 0:
+        raise SystemExit("NumPy predictions differ from keras for: " + ", ".join(failures))
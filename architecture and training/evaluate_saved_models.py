@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for evaluating every saved NeuMF model in one pass.
+The 99-negative candidate sets are drawn once per dataset with a fixed seed and
+cached as a compressed .npz, so every model is ranked against exactly the same
+candidates. Models are scored in a process pool with the NumPy implementation
+of NeuMF and the metrics are written to one results table, which
+plot_function.py reads to draw the HitRate@10 graphs.
+
+The negatives must exclude the pairs of the dataset's train_set as well as its
+test_set for the results to be comparable with those recorded in model data.
+A dataset without its train_set is refused unless --allow-missing-train-set is
+given, and the rows evaluated that way are marked in the train_set_excluded
+column, which the graphs leave out."""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from os import chdir, makedirs, walk
+from os.path import abspath, dirname, isfile, join, relpath
+from timeit import default_timer
+
+from NeuMF_inference import NeuMFInference
+from ranking_evaluation import sample_candidates, pair_keys, candidate_ranks, ranking_metrics
+from interaction_store import STORE_FOLDER, open_dataset
+
+# Folders are relative to the folder which contains this script
+SAVED_MODELS_FOLDER = "../model data/saved models"
+DATASETS_FOLDER = "../data/data preparation"
+CANDIDATES_FOLDER = "../model data/evaluation candidates"
+RESULTS_PATH = "../model data/evaluation results.csv"
+
+# movie_info.csv used for datasets whose folder does not have its own copy
+DEFAULT_MOVIE_INFO_PATH = join(DATASETS_FOLDER, "dataset frac=0.33, ratio=4, min_samples=100", "movie_info.csv")
+
+SEED = 0
+NUM_NEGATIVES = 99
+
+# Create function which returns the hyperparameters encoded in a saved model's path
+def model_hyperparameters(model_path):
+    dataset, mlp_folder, file = relpath(model_path, SAVED_MODELS_FOLDER).replace("\\", "/").split("/")[-3:]
+
+    hyperparameters = {"dataset": dataset}
+    for name, value in re.findall(r"(frac|ratio|min_samples)=([\d.]+)", dataset):
+        hyperparameters[name] = float(value) if name == "frac" else int(value)
+
+    hyperparameters["mlp_units"] = re.search(r"\(([\d, ]+)\)", mlp_folder).group(1)
+
+    embed_dims, lr, batch_size = re.search(r"embed_dims?=(\d+), lr=([\d.e-]+), bs=(\d+)", file).groups()
+    hyperparameters["embed_dims"] = int(embed_dims)
+    hyperparameters["lr"] = float(lr)
+    hyperparameters["batch_size"] = int(batch_size)
+
+    return hyperparameters
+
+# Create function which returns the path of every saved model below folder, grouped by dataset
+def find_saved_models(folder = SAVED_MODELS_FOLDER):
+    models = {}
+    for path, _, files in walk(folder):
+        for file in sorted(files):
+            if file.endswith(".h5"):
+                model_path = join(path, file)
+                models.setdefault(model_hyperparameters(model_path)["dataset"], []).append(model_path)
+
+    return models
+
+# Create function which checks whether a dataset's train_set is available, as a csv or an interaction store
+def has_train_set(dataset):
+    dataset_folder = join(DATASETS_FOLDER, dataset)
+
+    return (isfile(join(dataset_folder, "train_set.csv")) or
+            isfile(join(dataset_folder, STORE_FOLDER, "train_set", "indptr.npy")))
+
+# Create function which draws the candidate sets for one dataset and saves them as a compressed .npz
+# IDs are encoded the way the models were trained, with the sorted user IDs and movie IDs as classes
+# When the dataset's train_set is available its pairs are excluded from the negatives as well as the test pairs,
+# and whether they were is saved with the candidates
+# The interactions are memory-mapped from the dataset's interaction stores
+def build_candidates(dataset, candidates_path, num_negatives = NUM_NEGATIVES, seed = SEED):
+    dataset_folder = join(DATASETS_FOLDER, dataset)
+    test_set = open_dataset(dataset_folder, "test_set")
+    train_set_excluded = has_train_set(dataset)
+
+    movie_info_path = join(dataset_folder, "movie_info.csv")
+    if not isfile(movie_info_path):
+        movie_info_path = DEFAULT_MOVIE_INFO_PATH
+    movie_IDs = pd.read_csv(movie_info_path, usecols = ["movie_ID"])["movie_ID"].to_numpy()
+
+    seen_users, seen_movies = test_set.users, test_set.movies
+    if train_set_excluded:
+        train_set = open_dataset(dataset_folder, "train_set")
+        seen_users = np.concatenate([train_set.users, test_set.users])
+        seen_movies = np.concatenate([train_set.movies, test_set.movies])
+
+    user_classes = np.unique(seen_users)
+    movie_classes = np.union1d(movie_IDs, seen_movies)
+
+    seen_keys = pair_keys(np.searchsorted(user_classes, seen_users), np.searchsorted(movie_classes, seen_movies),
+                          movie_classes.shape[0])
+
+    test_users = np.searchsorted(user_classes, test_set.users).astype(np.int32)
+    test_movies = np.searchsorted(movie_classes, test_set.movies)
+    candidates = sample_candidates(test_users, test_movies, seen_keys, movie_classes.shape[0],
+                                   num_negatives, seed)
+
+    makedirs(dirname(candidates_path), exist_ok = True)
+    np.savez_compressed(candidates_path, test_users = test_users, candidates = candidates,
+                        user_classes = user_classes, movie_classes = movie_classes,
+                        num_negatives = num_negatives, seed = seed, train_set_excluded = train_set_excluded)
+
+# Create function which returns the path of a dataset's cached candidates, drawing them first if needed
+# Candidates cached with a different seed or number of negatives are drawn again, as are candidates drawn before
+# the dataset's train_set was available
+def dataset_candidates(dataset, num_negatives = NUM_NEGATIVES, seed = SEED, refresh = False):
+    candidates_path = join(CANDIDATES_FOLDER, dataset + ".npz")
+
+    if isfile(candidates_path) and not refresh:
+        with np.load(candidates_path) as cached:
+            if (int(cached["num_negatives"]) == num_negatives and int(cached["seed"]) == seed and
+                    "train_set_excluded" in cached and bool(cached["train_set_excluded"]) == has_train_set(dataset)):
+                return candidates_path
+
+    build_candidates(dataset, candidates_path, num_negatives, seed)
+    return candidates_path
+
+# Create function which evaluates one saved model against a dataset's cached candidates
+# This runs in a worker process, so it only takes paths and returns plain values
+def evaluate_model(model_path, candidates_path, batch_size = 65536):
+    start = default_timer()
+
+    model = NeuMFInference.from_h5(model_path)
+    with np.load(candidates_path) as cached:
+        test_users = cached["test_users"]
+        candidates = cached["candidates"]
+        num_users = cached["user_classes"].shape[0]
+        num_items = cached["movie_classes"].shape[0]
+        train_set_excluded = bool(cached["train_set_excluded"])
+
+    if model.num_users < num_users or model.num_items < num_items:
+        raise ValueError("{} has {} users and {} movies but its dataset encodes {} users and {} movies"
+                         .format(model_path, model.num_users, model.num_items, num_users, num_items))
+
+    results = model_hyperparameters(model_path)
+    results.update(ranking_metrics(candidate_ranks(model, test_users, candidates, batch_size)))
+    results["train_set_excluded"] = train_set_excluded
+    results["num_test_samples"] = int(test_users.shape[0])
+    results["seconds"] = default_timer() - start
+    results["model_path"] = model_path
+
+    return results
+
+# Create function which evaluates every saved model and writes the metrics to one results table
+# Datasets without their train_set raise an error unless allow_missing_train_set is True, since their training
+# positives can be drawn as negatives, which inflates every metric
+def evaluate_saved_models(results_path = RESULTS_PATH, num_negatives = NUM_NEGATIVES, seed = SEED,
+                          workers = None, refresh = False, allow_missing_train_set = False):
+    models = find_saved_models()
+
+    missing = [dataset for dataset in sorted(models) if not has_train_set(dataset)]
+    if len(missing) > 0 and not allow_missing_train_set:
+        raise FileNotFoundError("These datasets have no train_set.csv, so their training positives cannot be kept "
+                                "out of the negatives and the results would not be comparable: " +
+                                "; ".join(missing))
+
+    jobs = []
+    for dataset, model_paths in sorted(models.items()):
+        candidates_path = dataset_candidates(dataset, num_negatives, seed, refresh)
+        jobs += [(model_path, candidates_path) for model_path in model_paths]
+
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(evaluate_model, model_path, candidates_path)
+                   for model_path, candidates_path in jobs]
+        results = [future.result() for future in futures]
+
+    results = pd.DataFrame(results).sort_values(by = ["min_samples", "mlp_units", "embed_dims", "lr", "batch_size"])
+    results.to_csv(results_path, index = False)
+
+    return results
+
+if __name__ == "__main__":
+    # Set working directory to folder which contains this script
+    chdir(dirname(abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description = "Evaluate every saved NeuMF model against shared candidate sets")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--seed", type = int, default = SEED)
+    parser.add_argument("--num-negatives", type = int, default = NUM_NEGATIVES)
+    parser.add_argument("--refresh", action = "store_true", help = "draw the candidate sets again")
+    parser.add_argument("--allow-missing-train-set", action = "store_true",
+                        help = "evaluate datasets without their train_set.csv, marking their results as not "
+                               "comparable in the train_set_excluded column")
+    args = parser.parse_args()
+
+    start = default_timer()
+    try:
+        results = evaluate_saved_models(num_negatives = args.num_negatives, seed = args.seed,
+                                        workers = args.workers, refresh = args.refresh,
+                                        allow_missing_train_set = args.allow_missing_train_set)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+
+    print(results[["dataset", "mlp_units", "embed_dims", "lr", "batch_size", "train_set_excluded",
+                   "hitrate_at_10", "ndcg_at_10", "mrr"]].to_string(index = False))
+    if not results["train_set_excluded"].all():
+        print("Rows with train_set_excluded False were ranked against negatives which may include training "
+              "positives, so they are not comparable with HitRate_top_10_scores.txt")
+    print("Evaluated {} models in {:.1f} seconds".format(results.shape[0], default_timer() - start))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for running a grid sweep of NeuMF hyperparameters.
+Every combination of embedding dims, MLP units, learning rate, batch size,
+negative ratio and min_samples is trained with train() in a pool of worker
+processes, each limited to a fixed number of TensorFlow threads. A config whose
+training history already exists is skipped, so an interrupted sweep can simply
+be started again, and the wall time and throughput of every run are appended
+to a log."""
+
+import argparse
+import csv
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from multiprocessing import get_context
+from os import chdir, makedirs
+from os.path import abspath, dirname, isfile, join
+from timeit import default_timer
+
+import tensorflow as tf
+
+from NeuMF_architecture import NeuMF
+from training_and_evaluation import train
+from interaction_store import open_dataset
+from evaluate_saved_models import SAVED_MODELS_FOLDER, DATASETS_FOLDER, DEFAULT_MOVIE_INFO_PATH
+
+# Folders are relative to the folder which contains this script
+HISTORY_FOLDER = "../model data/training history"
+SWEEP_LOG_PATH = "../model data/sweep runs.csv"
+
+# Fraction of MovieLens users the prepared datasets were drawn from
+DATASET_FRAC = 0.33
+
+# Grid used when no values are given on the command line, matching the sweep already in model data
+DEFAULT_GRID = {"embed_dims": [8, 16],
+                "mlp_units": [(16, 8), (32, 16)],
+                "lr": [0.001, 0.0001],
+                "batch_size": [1024, 4096, 8192, 16384],
+                "ratio": [4],
+                "min_samples": [100]}
+
+DEFAULT_EPOCHS = 5
+
+# Model names the earlier runs in model data were saved under, besides the NeuMF embed_dims= used now
+# The MLP units = (32, 16) runs are named embed_dim= and the min_samples=250 and 500 runs are named NCF
+SAVE_NAME_FORMATS = ["NeuMF embed_dims={}, lr={}, bs={}",
+                     "NeuMF embed_dim={}, lr={}, bs={}",
+                     "NCF embed_dims={}, lr={}, bs={}",
+                     "NCF embed_dim={}, lr={}, bs={}"]
+
+# Threads given to TensorFlow in each worker, so that concurrent runs do not fight over every core
+DEFAULT_INTRA_OP_THREADS = 2
+INTER_OP_THREADS = 2
+
+LOG_COLUMNS = ["dataset", "mlp_units", "embed_dims", "lr", "batch_size", "ratio", "min_samples", "epochs",
+               "status", "num_samples", "wall_time", "samples_per_sec"]
+
+# Create function which returns every combination of the grid as a list of config dicts
+def grid_configs(grid, epochs = DEFAULT_EPOCHS):
+    keys = list(DEFAULT_GRID)
+
+    configs = []
+    for values in itertools.product(*[grid[key] for key in keys]):
+        config = dict(zip(keys, values))
+        config["mlp_units"] = tuple(config["mlp_units"])
+        config["epochs"] = epochs
+        config["dataset"] = "dataset frac={}, ratio={}, min_samples={}".format(DATASET_FRAC, config["ratio"],
+                                                                              config["min_samples"])
+        configs.append(config)
+
+    return configs
+
+# Create function which returns the history folder, model folder and save name train() is given for a config
+def config_paths(config):
+    mlp_folder = "MLP units = {}".format(config["mlp_units"])
+    save_name = SAVE_NAME_FORMATS[0].format(config["embed_dims"], config["lr"], config["batch_size"])
+
+    return (join(HISTORY_FOLDER, config["dataset"], mlp_folder),
+            join(SAVED_MODELS_FOLDER, config["dataset"], mlp_folder),
+            save_name)
+
+# Create function which checks whether a config has already been trained, the same way train() does
+# The history may be saved under any of the names the sweep has used
+def is_done(config):
+    history_path, _, _ = config_paths(config)
+
+    return any(isfile(join(history_path, save_name.format(config["embed_dims"], config["lr"], config["batch_size"])))
+               for save_name in SAVE_NAME_FORMATS)
+
+# Create function which limits the threads TensorFlow uses in a worker process
+# This runs once when each worker starts, before any TensorFlow op has been created
+def _limit_threads(intra_op_threads):
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+
+# Create function which loads and encodes a dataset's training set
+# The interactions are memory-mapped from the dataset's interaction store rather than parsed from csv
+# Configs are run grouped by dataset, so a worker keeps the last dataset it loaded
+@lru_cache(maxsize = 1)
+def load_training_set(dataset):
+    dataset_folder = join(DATASETS_FOLDER, dataset)
+    train_set = open_dataset(dataset_folder, "train_set")
+
+    movie_info_path = join(dataset_folder, "movie_info.csv")
+    if not isfile(movie_info_path):
+        movie_info_path = DEFAULT_MOVIE_INFO_PATH
+    movie_IDs = pd.read_csv(movie_info_path, usecols = ["movie_ID"])["movie_ID"].to_numpy()
+
+    # Encode IDs with the sorted classes evaluate_saved_models.py uses
+    # The store is sorted by user, so the user classes are the users with at least one row
+    user_classes = np.flatnonzero(train_set.counts() > 0)
+    movie_classes = np.union1d(movie_IDs, train_set.movies)
+
+    users = np.searchsorted(user_classes, train_set.users).astype(np.int32)
+    movies = np.searchsorted(movie_classes, train_set.movies).astype(np.int32)
+    labels = train_set.labels.astype(np.float32)
+
+    return users, movies, labels, user_classes.shape[0], movie_classes.shape[0]
+
+# Create function which trains one config and returns its log row
+# This runs in a worker process, so it only takes and returns plain values
+def run_config(config):
+    history_path, save_model_path, save_name = config_paths(config)
+    makedirs(history_path, exist_ok = True)
+    makedirs(save_model_path, exist_ok = True)
+
+    users, movies, labels, num_users, num_items = load_training_set(config["dataset"])
+
+    model = NeuMF(num_users = num_users, num_items = num_items, gmf_embedding_dim = config["embed_dims"],
+                  mlp_embedding_dim = config["embed_dims"], mlp_units = config["mlp_units"])
+
+    start = default_timer()
+    trained = train(model = model, x_train = [users, movies], y_train = labels,
+                    batch_size = config["batch_size"], epochs = config["epochs"], lr = config["lr"],
+                    save_name = save_name, save_model_path = save_model_path, history_path = history_path)
+    wall_time = default_timer() - start
+
+    result = dict(config, num_samples = labels.shape[0], wall_time = wall_time)
+    if trained:
+        result["status"] = "trained"
+        result["samples_per_sec"] = labels.shape[0] * config["epochs"] / wall_time
+    else:
+        # Another run finished the same config first
+        result["status"] = "skipped"
+
+    return result
+
+# Create function which appends a run to the sweep log, writing the header when the log is new
+def log_run(result, log_path = SWEEP_LOG_PATH):
+    new_log = not isfile(log_path)
+
+    with open(log_path, "a", newline = "") as log_file:
+        writer = csv.DictWriter(log_file, fieldnames = LOG_COLUMNS, extrasaction = "ignore")
+        if new_log:
+            writer.writeheader()
+        writer.writerow(result)
+
+# Create function which trains every config of the grid which has not been trained yet
+# Returns the log rows of the runs made by this call
+def run_sweep(grid = DEFAULT_GRID, epochs = DEFAULT_EPOCHS, workers = 1,
+              intra_op_threads = DEFAULT_INTRA_OP_THREADS, log_path = SWEEP_LOG_PATH):
+    configs = grid_configs(grid, epochs)
+    pending = [config for config in configs if not is_done(config)]
+    print("{} of {} configs already trained, {} to run".format(len(configs) - len(pending), len(configs),
+                                                               len(pending)))
+
+    # Configs for the same dataset are submitted together so workers can reuse the loaded training set
+    pending.sort(key = lambda config: config["dataset"])
+
+    results = []
+    with ProcessPoolExecutor(max_workers = workers, mp_context = get_context("spawn"),
+                             initializer = _limit_threads, initargs = (intra_op_threads,)) as executor:
+        futures = {executor.submit(run_config, config): config for config in pending}
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = dict(futures[future], status = "failed: {}".format(error))
+
+            log_run(result, log_path)
+            results.append(result)
+            print("{} {}: {}".format(result["dataset"], config_paths(result)[2], result["status"]))
+
+    return results
+
+if __name__ == "__main__":
+    # Set working directory to folder which contains this script
+    chdir(dirname(abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description = "Run a resumable grid sweep of NeuMF hyperparameters")
+    parser.add_argument("--embed-dims", type = int, nargs = "+", default = DEFAULT_GRID["embed_dims"])
+    parser.add_argument("--mlp-units", nargs = "+", default = DEFAULT_GRID["mlp_units"],
+                        type = lambda units: tuple(int(unit) for unit in units.split(",")),
+                        help = "units of each dense layer, e.g. 16,8 32,16")
+    parser.add_argument("--lr", type = float, nargs = "+", default = DEFAULT_GRID["lr"])
+    parser.add_argument("--batch-size", type = int, nargs = "+", default = DEFAULT_GRID["batch_size"])
+    parser.add_argument("--ratio", type = int, nargs = "+", default = DEFAULT_GRID["ratio"])
+    parser.add_argument("--min-samples", type = int, nargs = "+", default = DEFAULT_GRID["min_samples"])
+    parser.add_argument("--epochs", type = int, default = DEFAULT_EPOCHS)
+    parser.add_argument("--workers", type = int, default = 1, help = "number of configs trained at once")
+    parser.add_argument("--intra-op-threads", type = int, default = DEFAULT_INTRA_OP_THREADS,
+                        help = "TensorFlow intra-op threads per worker")
+    args = parser.parse_args()
+
+    grid = {"embed_dims": args.embed_dims, "mlp_units": args.mlp_units, "lr": args.lr,
+            "batch_size": args.batch_size, "ratio": args.ratio, "min_samples": args.min_samples}
+
+    run_sweep(grid, epochs = args.epochs, workers = args.workers, intra_op_threads = args.intra_op_threads)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds the columnar interaction store. A set of interactions is
+kept as three .npy columns, int32 user IDs, int32 movie IDs and uint8 labels,
+sorted by user, along with a CSR index from each raw user ID to that user's
+rows. The columns are opened with mmap_mode so every consumer reads the same
+pages without parsing or copying them, and a user's movies are a slice of the
+movie column. Running this script converts the train_set.csv and test_set.csv
+of every prepared dataset into stores."""
+
+import sqlite3 as sql
+
+import numpy as np
+
+from os import chdir, listdir, makedirs, replace
+from os.path import abspath, dirname, getmtime, isdir, isfile, join
+
+COLUMN_DTYPES = {"users": np.int32, "movies": np.int32, "labels": np.uint8}
+
+# Name of the folder inside a dataset folder which holds its stores
+STORE_FOLDER = "interactions"
+
+# Interaction store over columns sorted by user
+# indptr[user_ID] to indptr[user_ID + 1] are the rows of a raw user ID, so indptr has max user ID + 2 entries
+class InteractionStore:
+    def __init__(self, users, movies, labels, indptr):
+        self.users = users
+        self.movies = movies
+        self.labels = labels
+        self.indptr = indptr
+
+    # Create function which opens a saved store, memory-mapping its columns
+    @classmethod
+    def open(cls, folder, mmap_mode = "r"):
+        columns = {name: np.load(join(folder, name + ".npy"), mmap_mode = mmap_mode)
+                   for name in list(COLUMN_DTYPES) + ["indptr"]}
+
+        return cls(**columns)
+
+    # Create function which builds a store in memory from unsorted columns
+    # Rows keep their original order within each user
+    @classmethod
+    def from_arrays(cls, users, movies, labels = None):
+        users = np.asarray(users, dtype = COLUMN_DTYPES["users"])
+        movies = np.asarray(movies, dtype = COLUMN_DTYPES["movies"])
+        labels = (np.ones(users.shape[0], dtype = COLUMN_DTYPES["labels"]) if labels is None
+                  else np.asarray(labels, dtype = COLUMN_DTYPES["labels"]))
+
+        order = np.argsort(users, kind = "stable")
+        users, movies, labels = users[order], movies[order], labels[order]
+
+        num_users = int(users[-1]) + 1 if users.shape[0] > 0 else 0
+        indptr = np.zeros(num_users + 1, dtype = np.int64)
+        np.cumsum(np.bincount(users, minlength = num_users), out = indptr[1:])
+
+        return cls(users, movies, labels, indptr)
+
+    # Create function which saves the store as .npy files in folder
+    # Each file is written under a temporary name first, so a reader never opens a half-written column
+    def save(self, folder):
+        makedirs(folder, exist_ok = True)
+        for name in list(COLUMN_DTYPES) + ["indptr"]:
+            path = join(folder, name + ".npy")
+            np.save(path + ".tmp.npy", getattr(self, name))
+            replace(path + ".tmp.npy", path)
+
+    def __len__(self):
+        return self.users.shape[0]
+
+    # Create function which returns the number of rows of every raw user ID
+    def counts(self):
+        return np.diff(self.indptr)
+
+    # Create function which returns the rows of one raw user ID as views of the columns
+    def user_rows(self, user_ID):
+        if user_ID < 0 or user_ID + 1 >= self.indptr.shape[0]:
+            return self.movies[0:0], self.labels[0:0]
+
+        start, end = self.indptr[user_ID], self.indptr[user_ID + 1]
+        return self.movies[start:end], self.labels[start:end]
+
+    # Create function which returns the movies a raw user ID has interacted with
+    # When label is given only the movies with that label are returned
+    def items(self, user_ID, label = None):
+        movies, labels = self.user_rows(user_ID)
+        if label is None:
+            return movies
+
+        return movies[labels == label]
+
+    # Create function which returns the rows with a given label
+    # Without a filter the columns themselves are returned, so nothing is copied
+    def where_label(self, label = None):
+        if label is None:
+            return self.users, self.movies, self.labels
+
+        rows = np.flatnonzero(self.labels == label)
+        return self.users[rows], self.movies[rows], self.labels[rows]
+
+    # Create function which returns a new in-memory store holding only the users where keep_user is True
+    # keep_user is a boolean array indexed by raw user ID, e.g. self.counts() >= min_samples
+    def select_users(self, keep_user):
+        keep = np.zeros(self.indptr.shape[0] - 1, dtype = bool)
+        keep[:min(keep.shape[0], keep_user.shape[0])] = keep_user[:keep.shape[0]]
+        keep_rows = np.repeat(keep, self.counts())
+
+        return InteractionStore.from_arrays(self.users[keep_rows], self.movies[keep_rows], self.labels[keep_rows])
+
+# Create function which converts an interaction csv with user_ID, movie_ID and interaction columns into a store
+# pandas is imported here, as the application only reads stores and should not pay for importing it at startup
+def convert_csv(csv_path, folder):
+    import pandas as pd
+
+    interactions = pd.read_csv(csv_path, usecols = ["user_ID", "movie_ID", "interaction"],
+                               dtype = {"user_ID": np.int32, "movie_ID": np.int32, "interaction": np.uint8})
+
+    store = InteractionStore.from_arrays(interactions["user_ID"].to_numpy(), interactions["movie_ID"].to_numpy(),
+                                         interactions["interaction"].to_numpy())
+    store.save(folder)
+
+    return store
+
+# Create function which builds a store from the train_set table of a database
+# Only rows of users up to max_user_ID are read when it is given, e.g. to leave out users added by the application
+def export_database(database_path, folder, max_user_ID = None, fetch_size = 65536):
+    conn = sql.connect(database_path)
+    c = conn.cursor()
+
+    if max_user_ID is None:
+        c.execute("SELECT user_ID, movie_ID, interaction FROM train_set")
+    else:
+        c.execute("SELECT user_ID, movie_ID, interaction FROM train_set WHERE user_ID <= ?", (max_user_ID,))
+
+    chunks = [np.zeros((0, 3), dtype = np.int64)]
+    records = c.fetchmany(fetch_size)
+    while len(records) > 0:
+        chunks.append(np.array(records, dtype = np.int64))
+        records = c.fetchmany(fetch_size)
+    conn.close()
+
+    rows = np.concatenate(chunks)
+    store = InteractionStore.from_arrays(rows[:, 0], rows[:, 1], rows[:, 2])
+    store.save(folder)
+
+    return store
+
+# Create function which opens the store of a dataset's train_set or test_set
+# The store is converted from the dataset's csv the first time it is needed, and again if the csv changes
+def open_dataset(dataset_folder, name):
+    folder = join(dataset_folder, STORE_FOLDER, name)
+    csv_path = join(dataset_folder, name + ".csv")
+
+    if not isfile(join(folder, "indptr.npy")) or (isfile(csv_path) and
+                                                  getmtime(csv_path) > getmtime(join(folder, "indptr.npy"))):
+        convert_csv(csv_path, folder)
+
+    return InteractionStore.open(folder)
+
+# Create function which converts every csv of every dataset folder below datasets_folder
+def convert_datasets(datasets_folder):
+    for dataset in sorted(listdir(datasets_folder)):
+        dataset_folder = join(datasets_folder, dataset)
+        if not isdir(dataset_folder):
+            continue
+
+        for name in ("train_set", "test_set"):
+            if isfile(join(dataset_folder, name + ".csv")):
+                store = convert_csv(join(dataset_folder, name + ".csv"), join(dataset_folder, STORE_FOLDER, name))
+                print("{}/{}: {} rows, {} users".format(dataset, name, len(store), int((store.counts() > 0).sum())))
+
+if __name__ == "__main__":
+    # Set working directory to folder which contains this script
+    chdir(dirname(abspath(__file__)))
+
+    convert_datasets("../data/data preparation")
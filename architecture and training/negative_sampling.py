@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for drawing negative samples, i.e. movies a user
+has not interacted with, at training time rather than storing them in the
+training set. Seen movies are kept as sorted per-user lists so that a whole
+batch of samples can be checked and redrawn with vectorised NumPy."""
+
+import numpy as np
+
+# Maximum number of redraws before any remaining collisions are accepted
+# Only users who have seen almost every movie can get near this
+MAX_REDRAWS = 100
+
+# Items each user has seen, stored per encoded user ID in whichever of two forms takes less memory
+# Most users have a sorted slice of items, held like a CSR matrix where indptr[user] to indptr[user + 1] is the
+# slice of a user, at 4 bytes an item, and these are binary searched
+# Users who have seen more than 1 in 32 items have a row of bits instead, one for every item, which is smaller
+# for them and is checked in one step, so the users with the most positives are also the quickest to check
+class SeenItems:
+    def __init__(self, indptr, items, bitmap_rows, bits, num_items):
+        self.indptr = indptr
+        self.num_items = num_items
+
+        # num_items is larger than every item, so a search which runs off the end of a slice reads a value
+        # which never matches rather than needing a bounds check
+        self.items = np.append(items.astype(np.int32), np.int32(num_items))
+
+        # bitmap_rows[user] is the row of bits for a user, or -1 for a user with a slice of items
+        self.bitmap_rows = bitmap_rows
+        self.bits = bits
+
+    @property
+    def num_users(self):
+        return self.indptr.shape[0] - 1
+
+    @classmethod
+    def from_pairs(cls, users, items, num_users, num_items):
+        users = np.asarray(users, dtype = np.int64)
+        items = np.asarray(items, dtype = np.int64)
+
+        counts = np.bincount(users, minlength = num_users)
+        in_bitmap = counts * 4 > (num_items + 7) // 8
+        bitmap_rows = np.full(num_users, -1, dtype = np.int32)
+        bitmap_rows[in_bitmap] = np.arange(np.count_nonzero(in_bitmap), dtype = np.int32)
+
+        bits = np.zeros((np.count_nonzero(in_bitmap), (num_items + 7) // 8), dtype = np.uint8)
+        pairs = in_bitmap[users]
+        np.bitwise_or.at(bits, (bitmap_rows[users[pairs]], items[pairs] >> 3),
+                         (1 << (items[pairs] & 7)).astype(np.uint8))
+
+        users, items = users[~pairs], items[~pairs]
+        order = np.argsort(users * num_items + items)
+        indptr = np.zeros(num_users + 1, dtype = np.int64)
+        np.cumsum(np.bincount(users, minlength = num_users), out = indptr[1:])
+
+        return cls(indptr, items[order], bitmap_rows, bits, num_items)
+
+    # Create function which returns a boolean array saying whether each (user, item) pair has been seen
+    def contains(self, users, items):
+        users = np.asarray(users, dtype = np.int64)
+        items = np.asarray(items, dtype = np.int64)
+
+        seen = np.empty(users.shape, dtype = bool)
+        rows = self.bitmap_rows[users]
+        in_bitmap = rows >= 0
+        seen[in_bitmap] = (self.bits[rows[in_bitmap], items[in_bitmap] >> 3] >> (items[in_bitmap] & 7)) & 1
+        seen[~in_bitmap] = self._search(users[~in_bitmap], items[~in_bitmap])
+
+        return seen
+
+    # Create function which binary searches every pair within its user's slice of items at once
+    # Pairs drop out of the loop as soon as their search has narrowed to one item, so users with few items only
+    # take a few steps
+    def _search(self, users, items):
+        # first is the start of each search and ends up at the last item below the one searched for, if any
+        first = self.indptr[users]
+        end = self.indptr[users + 1]
+
+        searching = np.flatnonzero(end - first > 1)
+        lows, lengths, targets = first[searching], (end - first)[searching], items[searching]
+        while searching.shape[0] > 0:
+            half = lengths >> 1
+            lows += half * (self.items[lows + half] < targets)
+            lengths -= half
+
+            done = lengths <= 1
+            first[searching[done]] = lows[done]
+            keep = ~done
+            searching, lows, lengths, targets = searching[keep], lows[keep], lengths[keep], targets[keep]
+
+        first += self.items[first] < items
+
+        return (first < end) & (self.items[first] == items)
+
+# Create function which draws ratio negative items for every entry of users
+# Items are drawn uniformly from [0, num_items) and any seen item is redrawn until none are left
+# Returns the repeated users and the drawn items
+def sample_negatives(users, ratio, seen, rng):
+    neg_users = np.repeat(np.asarray(users, dtype = np.int64), ratio)
+    neg_items = rng.integers(0, seen.num_items, size = neg_users.shape[0])
+
+    rejected = np.flatnonzero(seen.contains(neg_users, neg_items))
+    redraws = 0
+    while rejected.shape[0] > 0 and redraws < MAX_REDRAWS:
+        neg_items[rejected] = rng.integers(0, seen.num_items, size = rejected.shape[0])
+        rejected = rejected[seen.contains(neg_users[rejected], neg_items[rejected])]
+        redraws += 1
+
+    return neg_users, neg_items
+
+# Create function which draws num_samples distinct items from candidates excluding any in positives
+# This is used for a single user, where SeenItems is unnecessary
+def sample_unseen(candidates, positives, num_samples, rng):
+    unseen = np.setdiff1d(candidates, positives)
+    if unseen.shape[0] == 0:
+        return unseen
+
+    return rng.choice(unseen, size = num_samples, replace = num_samples > unseen.shape[0])
+
+# Create function which appends a user's new positive samples to train_set, along with ratio negatives per positive
+# The candidate movies are read once, every negative is drawn in one vectorised call excluding all of
+# history_IDs, and the rows are written with a single executemany
+# Nothing is committed, so the caller can make these rows part of one transaction with its own statements
+# Returns the number of rows written
+def append_user_samples(conn, user_ID, movie_IDs, history_IDs, ratio, rng, table = "train_set"):
+    rows = [(user_ID, int(ID), 1) for ID in movie_IDs]
+
+    if ratio > 0 and len(movie_IDs) > 0:
+        candidates = np.array([record[0] for record in conn.execute("SELECT movie_ID FROM movie_info").fetchall()],
+                              dtype = np.int64)
+
+        negatives = sample_unseen(candidates, np.asarray(history_IDs, dtype = np.int64),
+                                  len(movie_IDs) * ratio, rng)
+        rows += [(user_ID, int(ID), 0) for ID in negatives]
+
+    conn.executemany("INSERT INTO {} (user_ID, movie_ID, interaction) VALUES (?, ?, ?)".format(table), rows)
+
+    return len(rows)
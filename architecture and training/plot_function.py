@@ -1,8 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import matplotlib.pyplot as plt
+import pandas as pd
 
-from os.path import isfile
+from os import chdir
+from os.path import abspath, dirname, isfile
+
+# Results table written by evaluate_saved_models.py, relative to the folder which contains this script
+RESULTS_PATH = "../model data/evaluation results.csv"
+
+# Create function which reads the results table and returns the maximum, average and minimum HitRate@10 (in %)
+# of the models for each value of x_column, as keyword arguments for plot_hitrate_maxavgmin
+# Only models ranked against negatives which exclude their training positives are used, as in the recorded results
+def hitrate_maxavgmin_from_results(x_column, results_path = RESULTS_PATH, metric = "hitrate_at_10"):
+    results = pd.read_csv(results_path)
+    results = results[results["train_set_excluded"]]
+    if results.shape[0] == 0:
+        raise ValueError("{} has no results whose negatives exclude the training positives, so it cannot be "
+                         "plotted alongside the recorded results".format(results_path))
+    
+    hitrates = results.groupby(by = x_column)[metric].agg(["max", "mean", "min"]) * 100
+    
+    return {"x_vals": hitrates.index.tolist(),
+            "hitrate_vals_max": hitrates["max"].tolist(),
+            "hitrate_vals_avg": hitrates["mean"].tolist(),
+            "hitrate_vals_min": hitrates["min"].tolist()}
         
 def plot_hitrate_maxavgmin(x_vals, hitrate_vals_max, hitrate_vals_avg, hitrate_vals_min,
                            xlabel, save_path, y_scale = (0, 100)):
@@ -51,14 +73,14 @@ def plot_hitrate_vs_hyperparams(x_vals, hitrate_vals_MLP1, hitrate_vals_MLP2,
         plt.savefig(save_path)
         
 if __name__ == "__main__":
-    plot_hitrate_maxavgmin(x_vals = [1, 2, 3, 4, 5], hitrate_vals_max = [56.6, 57.8, 59.1, 60.4, 58.9],
-                           hitrate_vals_avg = [54.2, 56.6, 57.7, 58.6, 58.0],
-                           hitrate_vals_min = [50.3, 53.0, 54.9, 55.3, 54.4], 
+    # Set working directory to folder which contains this script
+    chdir(dirname(abspath(__file__)))
+    
+    # The values come from the table written by evaluate_saved_models.py
+    plot_hitrate_maxavgmin(**hitrate_maxavgmin_from_results("ratio"),
                            xlabel = "Negative:Positive Samples Ratio", y_scale = (45, 65),
-                           save_path = "D:/Movie Recommendation System Project/model data/results graphs/hitrate_vs_ratio")
+                           save_path = "../model data/results graphs/hitrate_vs_ratio")
     
-    plot_hitrate_maxavgmin(x_vals = [100, 250, 500], hitrate_vals_max = [60.4, 52.8, 52.3],
-                           hitrate_vals_avg = [58.6, 50.7, 51.0],
-                           hitrate_vals_min = [55.3, 49.9, 49.8], 
+    plot_hitrate_maxavgmin(**hitrate_maxavgmin_from_results("min_samples"),
                            xlabel = "Minimum Samples Per User", y_scale = (45, 65),
-                           save_path = "D:/Movie Recommendation System Project/model data/results graphs/hitrate_vs_minsamples")
+                           save_path = "../model data/results graphs/hitrate_vs_minsamples")
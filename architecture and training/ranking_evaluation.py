@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for ranking evaluation of a trained NeuMF model.
+Each test movie is ranked against a group of movies the user has not seen,
+with every group drawn at once as one candidate matrix, and the ranks are
+summarised as HitRate@k, NDCG@k and MRR. Only NumPy is needed, so the same
+functions work with a keras model or with NeuMFInference."""
+
+import numpy as np
+
+# Create function which draws candidate movies for HitRate@10 style evaluation
+# Each row of the returned matrix holds the test movie in column 0 followed by num_negatives movies the user has not seen
+# seen_keys is a sorted array of user * num_items + movie for every (user, movie) pair which must not be drawn
+def sample_candidates(test_users, test_movies, seen_keys, num_items, num_negatives = 99, seed = None):
+    rng = np.random.default_rng(seed)
+    test_users = np.asarray(test_users, dtype = np.int64)
+    
+    negatives = rng.integers(0, num_items, size = (test_users.shape[0], num_negatives))
+    
+    # Redraw only the entries which landed on a seen movie until none are left
+    rejected = _is_seen(test_users[:, np.newaxis], negatives, seen_keys, num_items)
+    while rejected.any():
+        negatives[rejected] = rng.integers(0, num_items, size = int(rejected.sum()))
+        rejected = _is_seen(test_users[:, np.newaxis], negatives, seen_keys, num_items)
+    
+    candidates = np.empty((test_users.shape[0], num_negatives + 1), dtype = np.int32)
+    candidates[:, 0] = test_movies
+    candidates[:, 1:] = negatives
+    
+    return candidates
+
+def _is_seen(users, movies, seen_keys, num_items):
+    if seen_keys.shape[0] == 0:
+        return np.zeros(np.broadcast(users, movies).shape, dtype = bool)
+    
+    keys = users * num_items + movies
+    positions = np.minimum(np.searchsorted(seen_keys, keys), seen_keys.shape[0] - 1)
+    
+    return seen_keys[positions] == keys
+
+# Create function which returns the rank of the test movie within each row of candidates made by sample_candidates
+# Every (user, candidate) pair is scored with predict in batches of batch_size rows
+def candidate_ranks(model, test_users, candidates, batch_size = 65536):
+    num_candidates = candidates.shape[1]
+    users = np.repeat(np.asarray(test_users, dtype = np.int32), num_candidates)
+    
+    preds = model.predict([users, candidates.reshape(-1)], batch_size = batch_size, verbose = 0)
+    preds = preds.reshape(-1, num_candidates)
+    
+    # The rank of the test movie is the number of candidates scored above it, so 0 is the top of the list
+    return (preds[:, 1:] > preds[:, 0:1]).sum(axis = 1)
+
+# Create function which returns HitRate@k, NDCG@k and MRR from the ranks given by candidate_ranks
+def ranking_metrics(ranks, k = 10):
+    ranks = np.asarray(ranks)
+    hits = ranks < k
+    
+    return {"hitrate_at_{}".format(k): float(np.mean(hits)),
+            "ndcg_at_{}".format(k): float(np.mean(np.where(hits, 1 / np.log2(ranks + 2), 0))),
+            "mrr": float(np.mean(1 / (ranks + 1)))}
+
+# Create function which returns the sorted keys sample_candidates uses to recognise seen (user, movie) pairs
+def pair_keys(users, movies, num_items):
+    users = np.asarray(users, dtype = np.int64)
+    movies = np.asarray(movies, dtype = np.int64)
+    
+    return np.unique(users * num_items + movies)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for streaming a training set stored in an SQLite
+table into model.fit() without loading the whole table into memory. Rows are
+read in fixed-size rowid ranges, encoded chunk by chunk, shuffled within a
+bounded buffer and fed to keras through a prefetching tf.data pipeline."""
+
+import sqlite3 as sql
+
+import numpy as np
+import tensorflow as tf
+
+# Default number of rows read from SQLite per query
+CHUNK_SIZE = 65536
+
+# Default number of rows held in the shuffle buffer
+SHUFFLE_BUFFER_SIZE = 1048576
+
+# Create function which builds a dense lookup array from sorted ID classes
+# lookup[raw_ID] gives the encoded ID, or -1 for an ID which is not in classes
+def dense_lookup(classes):
+    classes = np.asarray(classes, dtype = np.int64)
+    lookup = np.full(int(classes.max()) + 1 if classes.shape[0] > 0 else 0, -1, dtype = np.int32)
+    lookup[classes] = np.arange(classes.shape[0], dtype = np.int32)
+
+    return lookup
+
+# Create function which returns the sorted distinct values of a column without reading the whole table
+def distinct_IDs(database_path, column, table = "train_set"):
+    conn = sql.connect(database_path)
+    c = conn.cursor()
+
+    c.execute("SELECT DISTINCT {} FROM {} ORDER BY {}".format(column, table, column))
+    IDs = np.array([record[0] for record in c.fetchall()], dtype = np.int64)
+
+    conn.close()
+    return IDs
+
+# Create function which yields (users, movies, interactions) arrays read from the table in rowid ranges
+# The ranges are visited in a random order so that consecutive chunks do not all come from the same users
+def iterate_chunks(database_path, chunk_size = CHUNK_SIZE, table = "train_set", rng = None, where = None):
+    conn = sql.connect(database_path)
+    c = conn.cursor()
+
+    # Each of MIN and MAX on its own reads one end of the table, while both in one query read every row
+    c.execute("SELECT MIN(rowid) FROM {}".format(table))
+    min_rowid = c.fetchall()[0][0]
+    c.execute("SELECT MAX(rowid) FROM {}".format(table))
+    max_rowid = c.fetchall()[0][0]
+    if min_rowid is None:
+        conn.close()
+        return
+
+    starts = np.arange(min_rowid, max_rowid + 1, chunk_size)
+    if rng is not None:
+        rng.shuffle(starts)
+
+    query = "SELECT user_ID, movie_ID, interaction FROM {} WHERE rowid >= ? AND rowid < ?".format(table)
+    if where is not None:
+        query += " AND " + where
+
+    try:
+        for start in starts:
+            c.execute(query, (int(start), int(start) + chunk_size))
+            chunk = np.array(c.fetchall(), dtype = np.int64).reshape(-1, 3)
+            if chunk.shape[0] > 0:
+                yield chunk[:, 0], chunk[:, 1], chunk[:, 2]
+    finally:
+        conn.close()
+
+# Create function which returns the number of rows in the table
+def count_rows(database_path, table = "train_set", where = None):
+    conn = sql.connect(database_path)
+    c = conn.cursor()
+
+    query = "SELECT COUNT(*) FROM {}".format(table)
+    if where is not None:
+        query += " WHERE " + where
+    c.execute(query)
+    count = c.fetchall()[0][0]
+
+    conn.close()
+    return count
+
+def _encode(lookup, IDs):
+    encoded = np.full(IDs.shape[0], -1, dtype = np.int32)
+    in_range = IDs < lookup.shape[0]
+    encoded[in_range] = lookup[IDs[in_range]]
+
+    return encoded
+
+# Create generator which yields encoded, shuffled batches for one pass over the table
+def _encoded_batches(database_path, user_lookup, movie_lookup, batch_size, chunk_size,
+                     shuffle_buffer_size, table, where, rng):
+    buffers = []
+    buffered_rows = 0
+
+    def drain(arrays, keep_remainder):
+        users, movies, labels = arrays
+        order = rng.permutation(users.shape[0])
+        users, movies, labels = users[order], movies[order], labels[order]
+
+        stop = users.shape[0] - users.shape[0] % batch_size if keep_remainder else users.shape[0]
+        for start in range(0, stop, batch_size):
+            end = min(start + batch_size, stop)
+            yield (users[start:end], movies[start:end]), labels[start:end]
+
+        remainder = (users[stop:], movies[stop:], labels[stop:])
+        return remainder
+
+    for users, movies, labels in iterate_chunks(database_path, chunk_size, table, rng, where):
+        users = _encode(user_lookup, users)
+        movies = _encode(movie_lookup, movies)
+
+        # Rows added after the lookups were built have no encoding yet and are skipped
+        known = (users >= 0) & (movies >= 0)
+        buffers.append((users[known], movies[known], labels[known].astype(np.float32)))
+        buffered_rows += int(known.sum())
+
+        if buffered_rows >= shuffle_buffer_size:
+            arrays = [np.concatenate([buffer[i] for buffer in buffers]) for i in range(3)]
+            # Rows which do not fill a whole batch are carried into the next buffer
+            leftover = yield from drain(arrays, keep_remainder = True)
+            buffers = [leftover]
+            buffered_rows = leftover[0].shape[0]
+
+    if buffered_rows > 0:
+        arrays = [np.concatenate([buffer[i] for buffer in buffers]) for i in range(3)]
+        yield from drain(arrays, keep_remainder = False)
+
+# Create function which builds a tf.data pipeline streaming the table in encoded, shuffled batches
+# user_lookup and movie_lookup are dense lookup arrays from dense_lookup()
+# where is an optional SQL condition, e.g. "interaction = 1"
+# The dataset repeats, so it is returned with the number of batches which make up one epoch
+# and that value should be passed to fit() as steps_per_epoch
+def sqlite_dataset(database_path, user_lookup, movie_lookup, batch_size, chunk_size = CHUNK_SIZE,
+                   shuffle_buffer_size = SHUFFLE_BUFFER_SIZE, table = "train_set", where = None, seed = None):
+    rng = np.random.default_rng(seed)
+
+    dataset = tf.data.Dataset.from_generator(
+        lambda: _encoded_batches(database_path, user_lookup, movie_lookup, batch_size, chunk_size,
+                                 shuffle_buffer_size, table, where, rng),
+        output_signature = ((tf.TensorSpec(shape = (None,), dtype = tf.int32),
+                             tf.TensorSpec(shape = (None,), dtype = tf.int32)),
+                            tf.TensorSpec(shape = (None,), dtype = tf.float32)))
+
+    # Repeating means rows added to the table while training cannot make an epoch end early
+    num_batches = -(-count_rows(database_path, table, where) // batch_size)
+
+    return dataset.repeat().prefetch(tf.data.experimental.AUTOTUNE), num_batches
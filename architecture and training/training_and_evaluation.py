@@ -1,32 +1,60 @@
 # -*- coding: utf-8 -*-
 
+from os import replace
 from os.path import isfile, join
 
 import numpy as np
+import tensorflow as tf
 
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.losses import BinaryCrossentropy
-from tensorflow.keras.callbacks import ModelCheckpoint, CSVLogger, EarlyStopping, ReduceLROnPlateau
+from tensorflow.keras.callbacks import Callback, ModelCheckpoint, CSVLogger, EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.models import load_model
 
 from timeit import default_timer
-from IPython.display import clear_output
+
+from tensorflow.keras.utils import Sequence
+
+from NeuMF_inference import NeuMF_layer_names, parse_model_config, read_NeuMF_weights
+from negative_sampling import SeenItems, sample_negatives
+from ranking_evaluation import sample_candidates, pair_keys, candidate_ranks, ranking_metrics
 
 def train(model, x_train, y_train, batch_size, epochs, save_name,
-          save_model_path, history_path = None, lr = 0.001, lr_decay = True):
+          save_model_path, history_path = None, lr = 0.001, lr_decay = True,
+          warm_start_path = None, user_classes = None, movie_classes = None,
+          previous_user_classes = None, previous_movie_classes = None,
+          evaluation_set = None, target_hitrate = None, baseline_epochs = None,
+          progress_queue = None, cancel_event = None, steps_per_epoch = None):
     
     if history_path is not None:
         if isfile(join(history_path, save_name)):
-            return
+            return False
+    
+    # Initialise from a previously saved model, so only new users and movies start from random weights
+    if warm_start_path is not None:
+        warm_start_weights(model, warm_start_path, user_classes, movie_classes,
+                           previous_user_classes, previous_movie_classes)
     
     model.compile(loss = BinaryCrossentropy(), optimizer = Adam(learning_rate = lr), metrics = ["accuracy"])
 
     callback_list = []
     
+    # HitRate@10 is tracked per epoch when an evaluation set is given
+    # This callback must run before CSVLogger so its values are written to the history csv
+    if evaluation_set is not None:
+        callback_list.append(HitRateTarget(evaluation_set[0], evaluation_set[1], target_hitrate = target_hitrate,
+                                           baseline_epochs = baseline_epochs,
+                                           warm_start = warm_start_path is not None))
+    
     if history_path is not None:
         history_csv = CSVLogger(join(history_path, save_name))
         callback_list.append(history_csv)
     
+    # Stream progress to another thread and allow training to be cancelled from it
+    if progress_queue is not None or cancel_event is not None:
+        callback_list.append(TrainingProgress(batch_size, progress_queue = progress_queue,
+                                              cancel_event = cancel_event))
+    
     if lr_decay:
         lr_decay_callback = ReduceLROnPlateau(monitor = "loss",
                                  patience = 5,
@@ -34,65 +62,229 @@ def train(model, x_train, y_train, batch_size, epochs, save_name,
                                  min_lr = 0.000001)
         callback_list.append(lr_decay_callback)
         
-    if len(callback_list) == 0:
+    # A tf.data pipeline or keras Sequence is already batched and carries its own labels
+    # e.g. streaming_data.sqlite_dataset or NegativeSamplingSequence
+    if isinstance(x_train, (tf.data.Dataset, Sequence)):
+        model.fit(x = x_train, epochs = epochs, callbacks = callback_list, steps_per_epoch = steps_per_epoch)
+    elif len(callback_list) == 0:
         model.fit(x = x_train, y = y_train, epochs = epochs, batch_size = batch_size)
     else:    
         model.fit(x = x_train, y = y_train, epochs = epochs, callbacks = callback_list, 
                   batch_size = batch_size)
     
-    model.save(filepath = join(save_model_path, save_name + ".h5"), include_optimizer = False)
-
-def hit_rate_top10(trained_model_path, test_set, total_set):
-    trained_model = load_model(trained_model_path)
+    # A cancelled run is not saved, which leaves any previous model in place
+    if cancel_event is not None and cancel_event.is_set():
+        return False
     
-    test_user_movie_set = set(zip(test_set["user_ID"], test_set["movie_ID"]))
+    # Save to a temporary file first so the previous model is only replaced by a complete file
+    save_path = join(save_model_path, save_name + ".h5")
+    model.save(filepath = save_path + ".tmp.h5", include_optimizer = False)
+    replace(save_path + ".tmp.h5", save_path)
     
-    user_seen_movies = total_set.groupby(by = "user_ID")["movie_ID"].apply(list).to_dict()
+    return True
+
+# Create keras Sequence which trains on stored positives and draws fresh negatives for every batch
+# users and items are the encoded IDs of the positive samples only
+# Each batch holds batch_size // (ratio + 1) positives followed by ratio negatives per positive
+class NegativeSamplingSequence(Sequence):
+    def __init__(self, users, items, num_users, num_items, batch_size, ratio = 4, seed = None):
+        super().__init__()
+        self.users = np.asarray(users, dtype = np.int32)
+        self.items = np.asarray(items, dtype = np.int32)
+        self.ratio = ratio
+        self.positives_per_batch = max(1, batch_size // (ratio + 1))
+        self.rng = np.random.default_rng(seed)
+        
+        self.seen = SeenItems.from_pairs(self.users, self.items, num_users, num_items)
+        self.order = self.rng.permutation(self.users.shape[0])
+        
+    def __len__(self):
+        return -(-self.users.shape[0] // self.positives_per_batch)
     
-    movie_ID_set = set(total_set["movie_ID"])
+    def __getitem__(self, index):
+        rows = self.order[index * self.positives_per_batch:(index + 1) * self.positives_per_batch]
+        pos_users = self.users[rows]
+        pos_items = self.items[rows]
+        
+        neg_users, neg_items = sample_negatives(pos_users, self.ratio, self.seen, self.rng)
+        
+        users = np.concatenate([pos_users, neg_users.astype(np.int32)])
+        items = np.concatenate([pos_items, neg_items.astype(np.int32)])
+        labels = np.zeros(users.shape[0], dtype = np.float32)
+        labels[0:pos_users.shape[0]] = 1
+        
+        return [users, items], labels
     
-    hits = []
-    count = 0
-    start = default_timer()
-    for (user, movie) in test_user_movie_set:
-        clear_output(wait = True)
-        seen_movies = user_seen_movies[user]
-        unseen_movies = movie_ID_set - set(seen_movies)
+    # Shuffle the positives so each epoch sees them in a new order with new negatives
+    def on_epoch_end(self):
+        self.order = self.rng.permutation(self.users.shape[0])
+
+# Create callback which reports training progress through a queue and stops training when cancel_event is set
+# Messages are ("batch", info) at most every report_interval seconds and ("epoch", info) after every epoch
+class TrainingProgress(Callback):
+    def __init__(self, batch_size, progress_queue = None, cancel_event = None, report_interval = 0.5):
+        super().__init__()
+        self.batch_size = batch_size
+        self.progress_queue = progress_queue
+        self.cancel_event = cancel_event
+        self.report_interval = report_interval
         
-        movies_for_preds = list(np.random.choice(a = list(unseen_movies), size = 99))
-            
-        movies_for_preds.append(movie)
+    def on_train_begin(self, logs = None):
+        self.start = default_timer()
+        self.last_report = self.start
+        self.batches_done = 0
+        self.epoch = 0
         
-        preds = np.squeeze(trained_model.predict([np.array([user] * 100), np.array(movies_for_preds)]),
-                               axis = 1)
+    def on_epoch_begin(self, epoch, logs = None):
+        self.epoch = epoch
         
+    def on_train_batch_end(self, batch, logs = None):
+        self.batches_done += 1
         
-        # Sort int_preds in ascending order in terms of indices
-        # Reverse array order and select indices corresponding to movies in top 10 confidence values from trained_model.predict()
-        # Use these indices to find movie_IDs for top 10 movie predictions
-        top_10_movies = [movies_for_preds[i] for i in np.argsort(preds)[::-1][0:10].tolist()]
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.model.stop_training = True
+            return
         
-        # If the movie in this row of (user, movie) for the test set is in top 10 predictions, append 1 to hits to indicate success
-        if movie in top_10_movies:
-            hits.append(1)
-        else:
-            hits.append(0)
-         
-            
-        count += 1 
-        # Print percentage of loop completion and current time elapsed to predict total runtime for loop
-        print("Overall Loop Progress: {:.2f}%".format((count/len(test_user_movie_set))*100))
-        stop = default_timer()
-        print("Current Overall Runtime: {:.2f} minutes".format((stop - start)/60)) 
-        print("The Current Hit Rate is {:.2f}".format(np.average(hits) * 100))
+        now = default_timer()
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            self._report("batch", batch + 1, logs)
             
-    print("The Hit Rate Success for Top 10 Predictions is: {:.2f}%".format(np.average(hits) * 100)) 
+    def on_epoch_end(self, epoch, logs = None):
+        self._report("epoch", self.params.get("steps"), logs)
+        
+    def _report(self, kind, batch, logs):
+        if self.progress_queue is None:
+            return
         
+        elapsed = default_timer() - self.start
+        steps = self.params.get("steps")
+        batches_per_sec = self.batches_done / elapsed if elapsed > 0 else 0
         
+        # The ETA is unknown when the number of steps per epoch is not known in advance
+        if steps is not None and batches_per_sec > 0:
+            eta = (steps * self.params["epochs"] - self.batches_done) / batches_per_sec
+        else:
+            eta = None
+        
+        self.progress_queue.put((kind, {"epoch": self.epoch + 1,
+                                        "epochs": self.params["epochs"],
+                                        "batch": batch,
+                                        "steps": steps,
+                                        "loss": (logs or {}).get("loss"),
+                                        "samples_per_sec": batches_per_sec * self.batch_size,
+                                        "eta": eta}))
 
+# Create function which copies the weights of a saved NeuMF model into a newly built one
+# Embedding rows are matched through the ID encodings, since refitting an encoder can move every row
+# When the previous classes are None the rows are assumed to be stable and are copied by index
+# Users and movies which are not in the previous encoding keep their random initialisation
+def warm_start_weights(model, previous_model_path, user_classes, movie_classes,
+                       previous_user_classes, previous_movie_classes):
+    previous_names, previous_weights = read_NeuMF_weights(previous_model_path)
+    names = NeuMF_layer_names(parse_model_config(model.get_config()))
     
+    if len(names["mlp_path"]) != len(previous_names["mlp_path"]):
+        raise ValueError("The previous model has a different number of MLP layers")
     
+    # Dense and BatchNormalization layers do not depend on the IDs so they are copied directly
+    for name, previous_name in zip(names["mlp_path"] + [names["output"]],
+                                   previous_names["mlp_path"] + [previous_names["output"]]):
+        model.get_layer(name).set_weights(list(previous_weights[previous_name].values()))
     
+    for key, classes, previous_classes in (("user_gmf", user_classes, previous_user_classes),
+                                           ("item_gmf", movie_classes, previous_movie_classes),
+                                           ("user_mlp", user_classes, previous_user_classes),
+                                           ("item_mlp", movie_classes, previous_movie_classes)):
+        layer = model.get_layer(names[key])
+        embeddings = layer.get_weights()[0]
+        previous_embeddings = previous_weights[previous_names[key]]["embeddings"]
+        
+        if embeddings.shape[1] != previous_embeddings.shape[1]:
+            raise ValueError("The previous model has a different embedding dimension")
+        
+        if previous_classes is None:
+            # With an append-only ID mapping every ID keeps its row, so the previous rows are copied in place
+            num_rows = min(embeddings.shape[0], previous_embeddings.shape[0])
+            embeddings[:num_rows] = previous_embeddings[:num_rows]
+        else:
+            # Find the previous row of every ID in the new encoding
+            # Both class arrays are sorted, as they come from LabelEncoder
+            rows = np.searchsorted(previous_classes, classes)
+            rows = np.minimum(rows, previous_classes.shape[0] - 1)
+            found = (previous_classes[rows] == classes) & (rows < previous_embeddings.shape[0])
+            
+            embeddings[found] = previous_embeddings[rows[found]]
+        layer.set_weights([embeddings])
 
+# Create function which returns the HitRate@10 of a model over candidate sets made by sample_candidates
+def hitrate_from_candidates(model, test_users, candidates, batch_size = 65536):
+    return ranking_metrics(candidate_ranks(model, test_users, candidates, batch_size))["hitrate_at_10"]
 
-    
\ No newline at end of file
+# Create callback which records HitRate@10 after every epoch
+# Once target_hitrate is reached the epoch is recorded, along with the number of epochs saved compared
+# with baseline_epochs (the epochs a cold start needed) when that is given
+class HitRateTarget(Callback):
+    def __init__(self, test_users, candidates, target_hitrate = None, baseline_epochs = None,
+                 warm_start = False, stop_at_target = False):
+        super().__init__()
+        self.test_users = test_users
+        self.candidates = candidates
+        self.target_hitrate = target_hitrate
+        self.baseline_epochs = baseline_epochs
+        self.warm_start = warm_start
+        self.stop_at_target = stop_at_target
+        self.epochs_to_target = None
+        
+    def on_epoch_end(self, epoch, logs = None):
+        logs = logs if logs is not None else {}
+        
+        hitrate = hitrate_from_candidates(self.model, self.test_users, self.candidates)
+        
+        if (self.epochs_to_target is None and self.target_hitrate is not None 
+            and hitrate >= self.target_hitrate):
+            self.epochs_to_target = epoch + 1
+            if self.stop_at_target:
+                self.model.stop_training = True
+        
+        # Every key is written on every epoch because CSVLogger fixes its columns on the first epoch
+        # A value of -1 means the target has not been reached yet
+        logs["hitrate_at_10"] = hitrate
+        logs["warm_start"] = int(self.warm_start)
+        logs["epochs_to_target"] = self.epochs_to_target if self.epochs_to_target is not None else -1
+        if self.epochs_to_target is not None and self.baseline_epochs is not None:
+            logs["epochs_saved"] = self.baseline_epochs - self.epochs_to_target
+        else:
+            logs["epochs_saved"] = -1
+
+# Create function which evaluates a trained model with HitRate@10, NDCG@10 and MRR over the test set
+# test_set and total_set are InteractionStores, e.g. from interaction_store.open_dataset
+# Each test movie is ranked against num_negatives movies from total_set which the user has not seen
+# All candidate groups are drawn at once as one int32 matrix and scored in large predict batches
+def hit_rate_top10(trained_model_path, test_set, total_set, num_negatives = 99, batch_size = 65536, seed = None):
+    start = default_timer()
+    trained_model = load_model(trained_model_path)
+    
+    test_users = test_set.users.astype(np.int64)
+    test_movies = test_set.movies.astype(np.int64)
+    
+    # Negatives are drawn from the movies in total_set, so work with positions in that sorted set of movie IDs
+    movie_IDs = np.union1d(total_set.movies, test_movies)
+    num_items = movie_IDs.shape[0]
+    
+    seen_users = np.concatenate([total_set.users.astype(np.int64), test_users])
+    seen_movies = np.concatenate([total_set.movies.astype(np.int64), test_movies])
+    seen_keys = pair_keys(seen_users, np.searchsorted(movie_IDs, seen_movies), num_items)
+    
+    candidates = sample_candidates(test_users, np.searchsorted(movie_IDs, test_movies), seen_keys,
+                                   num_items, num_negatives, seed)
+    candidates = movie_IDs[candidates].astype(np.int32)
+    
+    metrics = ranking_metrics(candidate_ranks(trained_model, test_users, candidates, batch_size))
+    
+    print("Evaluated {} test samples in {:.2f} seconds".format(test_users.shape[0], default_timer() - start))
+    print("The Hit Rate Success for Top 10 Predictions is: {:.2f}%".format(metrics["hitrate_at_10"] * 100))
+    print("The NDCG for Top 10 Predictions is: {:.4f}".format(metrics["ndcg_at_10"]))
+    print("The MRR is: {:.4f}".format(metrics["mrr"]))
+    
+    return metrics
@@ -0,0 +1,670 @@
+# -*- coding: utf-8 -*-
+
+""" This script can be used for timing parts of the application against the
+approaches they replaced. Each benchmark builds its own data so it can be run
+without the application database, e.g.
+
+    python benchmarks.py negative_sampling
+"""
+
+import argparse
+import io
+import json
+import shutil
+import sqlite3 as sql
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+import pandas as pd
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import isfile, join
+from timeit import default_timer
+
+sys.path.append("architecture and training")
+from negative_sampling import append_user_samples
+from bootstrap import DATASET_FOLDER, bootstrap_database, save_backup_snapshot, save_npy_snapshot, read_train_set_csv
+from schema import DATABASE_PATH, create_tables, migrate
+from data_access import QueryTimer, Session
+from movie_search import search_movies
+from search_index import TitleIndex
+from virtual_treeview import TableSource, VirtualTreeview
+from warm_up import HEAVY_MODULES
+
+# Create function which builds an in-memory database with a movie_info catalog and an empty train_set
+def _sampling_database(num_movies):
+    conn = sql.connect(":memory:")
+    c = conn.cursor()
+
+    c.execute("CREATE TABLE movie_info (movie_ID INTEGER, title TEXT)")
+    c.execute("CREATE TABLE train_set (user_ID INTEGER, movie_ID INTEGER, interaction INTEGER)")
+    c.executemany("INSERT INTO movie_info VALUES (?, ?)",
+                  [(ID, "Movie {}".format(ID)) for ID in range(1, num_movies + 1)])
+    conn.commit()
+
+    return conn
+
+# Create function which appends samples the way HistoryPage.finish used to
+# Every negative is its own ORDER BY RANDOM() query, redrawn on collisions, and every row its own INSERT
+def _per_row_sampling(conn, user_ID, movie_IDs, ratio):
+    c = conn.cursor()
+
+    for ID in movie_IDs:
+        c.execute("INSERT INTO train_set VALUES (:user_ID, :movie_ID, :interaction)",
+                  {"user_ID": user_ID, "movie_ID": int(ID), "interaction": 1})
+    conn.commit()
+
+    for sample in range(len(movie_IDs) * ratio):
+        c.execute("SELECT movie_ID FROM movie_info ORDER BY RANDOM() LIMIT 1")
+        rand_movie_ID = c.fetchall()[0][0]
+        while rand_movie_ID in movie_IDs:
+            c.execute("SELECT movie_ID FROM movie_info ORDER BY RANDOM() LIMIT 1")
+            rand_movie_ID = c.fetchall()[0][0]
+
+        c.execute("INSERT INTO train_set VALUES (:user_ID, :movie_ID, :interaction)",
+                  {"user_ID": user_ID, "movie_ID": rand_movie_ID, "interaction": 0})
+    conn.commit()
+
+# Create function which times the per-row sampler against append_user_samples for one history
+def benchmark_negative_sampling(num_movies = 43232, history_size = 200, ratio = 4, repeats = 3, seed = 0):
+    rng = np.random.default_rng(seed)
+    movie_IDs = rng.choice(np.arange(1, num_movies + 1), size = history_size, replace = False)
+
+    times = {"per-row ORDER BY RANDOM()": [], "batched executemany": []}
+    for repeat in range(repeats):
+        conn = _sampling_database(num_movies)
+        start = default_timer()
+        _per_row_sampling(conn, 1, list(movie_IDs), ratio)
+        times["per-row ORDER BY RANDOM()"].append(default_timer() - start)
+        conn.close()
+
+        conn = _sampling_database(num_movies)
+        start = default_timer()
+        append_user_samples(conn, 1, movie_IDs, movie_IDs, ratio, rng)
+        conn.commit()
+        times["batched executemany"].append(default_timer() - start)
+
+        # Check the batched sampler wrote the expected rows and no seen movie was drawn as a negative
+        c = conn.cursor()
+        c.execute("SELECT movie_ID FROM train_set WHERE interaction = 0")
+        negatives = np.array([record[0] for record in c.fetchall()])
+        assert negatives.shape[0] == history_size * ratio
+        assert not np.isin(negatives, movie_IDs).any()
+        conn.close()
+
+    print("Negative sampling: {} movies, history of {}, ratio {}".format(num_movies, history_size, ratio))
+    for name, values in times.items():
+        print("  {:<28} best {:.4f} s".format(name, min(values)))
+    print("  speed-up: {:.0f}x".format(min(times["per-row ORDER BY RANDOM()"]) / min(times["batched executemany"])))
+
+    return times
+
+# Create function which writes a dataset folder with a synthetic train_set.csv and the real movie_info.csv
+# Every user has positives_per_user positives and ratio negatives per positive, like the prepared datasets
+def _bootstrap_dataset(folder, num_users, positives_per_user, ratio, seed):
+    rng = np.random.default_rng(seed)
+    movie_IDs = pd.read_csv(join(DATASET_FOLDER, "movie_info.csv"), usecols = ["movie_ID"])["movie_ID"].to_numpy()
+
+    samples_per_user = positives_per_user * (ratio + 1)
+    users = np.repeat(np.arange(1, num_users + 1), samples_per_user)
+    movies = np.concatenate([rng.choice(movie_IDs, size = samples_per_user, replace = False)
+                             for user in range(num_users)])
+    interactions = np.tile(np.repeat([1, 0], [positives_per_user, positives_per_user * ratio]), num_users)
+
+    pd.DataFrame({"user_ID": users, "movie_ID": movies, "interaction": interactions}).to_csv(
+        join(folder, "train_set.csv"))
+    shutil.copy(join(DATASET_FOLDER, "movie_info.csv"), join(folder, "movie_info.csv"))
+
+    return users.shape[0]
+
+# Create function which builds the database the way App.create_database used to
+# train_set.csv is read in chunks of 50000 rows and movie_info.csv in chunks of 1000, each written with to_sql
+def _chunked_to_sql(database_path, dataset_folder):
+    conn = sql.connect(database_path)
+
+    for chunk in pd.read_csv(join(dataset_folder, "train_set.csv"), usecols = ["user_ID", "movie_ID", "interaction"],
+                             chunksize = 50000, iterator = True):
+        chunk.to_sql(name = "train_set", con = conn, index = False, if_exists = "append")
+
+    for chunk in pd.read_csv(join(dataset_folder, "movie_info.csv"), index_col = 0, chunksize = 1000, iterator = True):
+        chunk.to_sql(name = "movie_info", con = conn, index = False, if_exists = "append")
+
+    conn.commit()
+    conn.close()
+
+# Create function which times building the database with chunked to_sql against the bulk loader
+# Each build is followed by migrate(), so every timing includes the keys and indexes
+def benchmark_bootstrap(num_users = 2000, positives_per_user = 200, ratio = 4, seed = 0):
+    folder = tempfile.mkdtemp()
+    snapshot_folder = join(folder, "snapshot")
+    try:
+        num_rows = _bootstrap_dataset(folder, num_users, positives_per_user, ratio, seed)
+
+        times = {}
+        database_path = join(folder, "chunked.db")
+        start = default_timer()
+        _chunked_to_sql(database_path, folder)
+        migrate(database_path)
+        times["chunked to_sql"] = default_timer() - start
+
+        save_npy_snapshot(read_train_set_csv(folder), snapshot_folder)
+        for source in ["csv", "npy", "backup"]:
+            database_path = join(folder, "{}.db".format(source))
+            start = default_timer()
+            bootstrap_database(database_path, source = source, dataset_folder = folder,
+                               snapshot_folder = snapshot_folder, store_folder = None)
+            migrate(database_path)
+            times["bulk load from " + source] = default_timer() - start
+
+            if source == "npy":
+                save_backup_snapshot(database_path, join(snapshot_folder, "database.db"))
+
+        # Check the bulk loader wrote the same rows as the old approach
+        conn = sql.connect(join(folder, "csv.db"))
+        conn.execute("ATTACH DATABASE ? AS chunked", (join(folder, "chunked.db"),))
+        difference = conn.execute("""SELECT COUNT(*) FROM (SELECT user_ID, movie_ID, interaction FROM train_set
+                                     EXCEPT SELECT user_ID, movie_ID, interaction FROM chunked.train_set)""")
+        assert difference.fetchone()[0] == 0
+        conn.close()
+    finally:
+        shutil.rmtree(folder)
+
+    print("Bootstrap: {} train_set rows".format(num_rows))
+    for name, seconds in times.items():
+        print("  {:<28} {:.2f} s ({:,.0f} rows/s)".format(name, seconds, num_rows / seconds))
+    print("  speed-up from csv: {:.1f}x".format(times["chunked to_sql"] / times["bulk load from csv"]))
+
+    return times
+
+# Create function which builds a migrated database whose movie_info holds num_titles titles
+# The real catalog is extended with sequels and remakes of its titles until it reaches num_titles
+def _search_database(database_path, num_titles, seed):
+    rng = np.random.default_rng(seed)
+    movie_info = pd.read_csv(join(DATASET_FOLDER, "movie_info.csv"), usecols = ["movie_ID", "IMDb_ID", "title",
+                                                                               "genre", "year"]).dropna()
+
+    extra = movie_info.sample(n = max(0, num_titles - movie_info.shape[0]), replace = True, random_state = seed)
+    suffixes = np.array(["2", "3", "Part II", "Returns", "Reloaded", "The Sequel", "Remake", "Revisited"])
+    extra = extra.assign(movie_ID = np.arange(extra.shape[0]) + int(movie_info["movie_ID"].max()) + 1,
+                         title = extra["title"] + " " + rng.choice(suffixes, size = extra.shape[0]))
+    catalog = pd.concat([movie_info, extra]).head(num_titles)
+
+    conn = sql.connect(database_path)
+    create_tables(conn)
+    conn.executemany("INSERT INTO movie_info (movie_ID, IMDb_ID, title, genre, year) VALUES (?, ?, ?, ?, ?)",
+                     catalog.astype(object).itertuples(index = False, name = None))
+    conn.commit()
+    conn.close()
+
+    # The migrations build the keys and fill the full-text index from the rows just inserted
+    migrate(database_path)
+
+    return catalog.shape[0]
+
+# Create function which times title search with a LIKE scan against the FTS5 index
+# The LIKE query is the one HistoryPage.search_title used to run, which matches the text as one substring
+def benchmark_movie_search(num_titles = 100000, repeats = 20, seed = 0):
+    folder = tempfile.mkdtemp()
+    try:
+        database_path = join(folder, "database.db")
+        start = default_timer()
+        num_titles = _search_database(database_path, num_titles, seed)
+        build_time = default_timer() - start
+
+        session = Session(database_path, QueryTimer(slow_query_seconds = float("inf")))
+        searches = ["star wars", "lord of the rings", "godfather", "toy story", "matrix", "love", "night",
+                    "wars star", "godfathr", "harry poter"]
+
+        print("Movie search: {} titles, index built in {:.2f} s".format(num_titles, build_time))
+        print("  {:<20} {:>10} {:>8} {:>10} {:>8}".format("search", "LIKE ms", "found", "FTS5 ms", "found"))
+        like_total = 0
+        fts_total = 0
+        for text in searches:
+            start = default_timer()
+            for repeat in range(repeats):
+                like_records = session.fetchall("""SELECT title, genre, year, movie_ID FROM movie_info
+                                                WHERE title LIKE ?""", ("%" + text + "%",))
+            like_time = (default_timer() - start) / repeats
+
+            start = default_timer()
+            for repeat in range(repeats):
+                fts_records = search_movies(session, text)
+            fts_time = (default_timer() - start) / repeats
+
+            like_total += like_time
+            fts_total += fts_time
+            print("  {:<20} {:>10.2f} {:>8} {:>10.2f} {:>8}".format(text, like_time * 1000, len(like_records),
+                                                                     fts_time * 1000, len(fts_records)))
+        session.close()
+    finally:
+        shutil.rmtree(folder)
+
+    print("  mean: LIKE {:.2f} ms, FTS5 {:.2f} ms ({:.1f}x)".format(like_total / len(searches) * 1000,
+                                                                    fts_total / len(searches) * 1000,
+                                                                    like_total / fts_total))
+
+    return like_total, fts_total
+
+# Create function which times every keystroke of typing searches into the history page's movie title box
+# Each prefix of each search is answered by the in-memory title index and, for comparison, by the FTS5 search
+def benchmark_search_as_you_type(num_titles = 100000, repeats = 5, seed = 0):
+    folder = tempfile.mkdtemp()
+    try:
+        database_path = join(folder, "database.db")
+        num_titles = _search_database(database_path, num_titles, seed)
+        session = Session(database_path, QueryTimer(slow_query_seconds = float("inf")))
+
+        start = default_timer()
+        title_index = TitleIndex.from_database(session)
+        build_time = default_timer() - start
+
+        searches = ["star wars", "lord of the rings", "the godfather", "toy story 2", "a", "harry potter"]
+        keystrokes = [text[:length] for text in searches for length in range(1, len(text) + 1)]
+
+        times = {"title index": [], "FTS5": []}
+        for text in keystrokes:
+            for name, search in (("title index", title_index.search),
+                                 ("FTS5", lambda text: search_movies(session, text))):
+                start = default_timer()
+                for repeat in range(repeats):
+                    search(text)
+                times[name].append((default_timer() - start) / repeats)
+        session.close()
+    finally:
+        shutil.rmtree(folder)
+
+    print("Search as you type: {} titles, {} keystrokes, title index built in {:.2f} s".format(
+          num_titles, len(keystrokes), build_time))
+    for name, seconds in times.items():
+        seconds = np.array(seconds) * 1000
+        print("  {:<12} mean {:.2f} ms, p95 {:.2f} ms, max {:.2f} ms".format(name, seconds.mean(),
+                                                                            np.percentile(seconds, 95), seconds.max()))
+
+    return times
+
+# Create function which starts a local stand-in for the IMDb API on a free port and returns the server
+# Every response is delayed by latency seconds to stand for the round trip to the real API
+def _imdb_stand_in(latency):
+    from PIL import Image
+
+    poster = io.BytesIO()
+    Image.new("RGB", (680, 1006), (200, 120, 40)).save(poster, format = "JPEG")
+    poster = poster.getvalue()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.startswith("/title/get-overview-details"):
+                title_ID = self.path.split("tconst=")[1].split("&")[0]
+                body = json.dumps({"title": {"title": title_ID, "year": 2000, "runningTimeInMinutes": 100,
+                                             "image": {"url": "http://127.0.0.1:{}/poster/{}.jpg".format(
+                                                       self.server.server_port, title_ID)}},
+                                   "ratings": {"rating": 7.5, "ratingCount": 1000},
+                                   "plotOutline": {"text": "A stand-in plot."}}).encode()
+                content_type = "application/json"
+            else:
+                body = poster
+                content_type = "image/jpeg"
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
+
+# Create function which times looking up movie details through the IMDb cache against a local stand-in server
+# The first pass downloads every overview and poster, the second is served from the cache on disk
+def benchmark_imdb_cache(num_movies = 50, latency = 0.05):
+    # Imported here so that the other benchmarks run without requests and Pillow installed
+    from imdb_cache import IMDbCache, IMDbClient
+
+    server = _imdb_stand_in(latency)
+    folder = tempfile.mkdtemp()
+    try:
+        cache = IMDbCache(IMDbClient("stand-in key", base_url = "http://127.0.0.1:{}".format(server.server_port)),
+                          folder = folder)
+
+        print("IMDb cache: {} movies, {:.0f} ms stand-in latency per request".format(num_movies, latency * 1000))
+        times = []
+        for lookup in ("downloaded", "cached"):
+            start = default_timer()
+            for IMDb_ID in range(1, num_movies + 1):
+                cache.poster(IMDb_ID, cache.overview(IMDb_ID))
+            times.append((default_timer() - start) / num_movies)
+            print("  {:<10} {:.2f} ms per movie".format(lookup, times[-1] * 1000))
+
+        print("  {} hits, {} misses".format(cache.hits, cache.misses))
+        cache.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(folder)
+
+    return times
+
+# Create function which times getting the details of a list of recommendations ready, one movie after another
+# against the prefetcher's thread pool, both starting from an empty cache
+def benchmark_prefetch(num_movies = 10, latency = 0.05):
+    # Imported here so that the other benchmarks run without requests and Pillow installed
+    from imdb_cache import IMDbCache, IMDbClient, DetailsPrefetcher
+
+    server = _imdb_stand_in(latency)
+    base_url = "http://127.0.0.1:{}".format(server.server_port)
+    print("Prefetch: {} movies, {:.0f} ms stand-in latency per request".format(num_movies, latency * 1000))
+
+    times = {}
+    try:
+        for name in ("serial", "prefetcher"):
+            folder = tempfile.mkdtemp()
+            cache = IMDbCache(IMDbClient("stand-in key", base_url = base_url), folder = folder)
+
+            start = default_timer()
+            if name == "serial":
+                for IMDb_ID in range(1, num_movies + 1):
+                    cache.poster(IMDb_ID, cache.overview(IMDb_ID))
+            else:
+                prefetcher = DetailsPrefetcher(cache)
+                prefetcher.prefetch([(IMDb_ID, IMDb_ID) for IMDb_ID in range(1, num_movies + 1)])
+                while prefetcher.pending():
+                    time.sleep(0.001)
+                assert len(prefetcher.finished()) == num_movies
+                prefetcher.close()
+            times[name] = default_timer() - start
+
+            print("  {:<10} {:.0f} ms until every movie is ready".format(name, times[name] * 1000))
+            cache.close()
+            shutil.rmtree(folder)
+    finally:
+        server.shutdown()
+
+    return times
+
+# Create function which times listing a table of num_titles movies in a Treeview
+# Loading every row with fetchall and inserting each one is compared with the virtual Treeview's keyset pages,
+# and keyset pages are compared with LIMIT/OFFSET pages deep into the table
+# The Treeview itself is only timed when a display is available
+def benchmark_virtual_treeview(num_titles = 100000, repeats = 5, seed = 0):
+    columns = ["title", "genre", "year", "movie_ID"]
+    folder = tempfile.mkdtemp()
+    try:
+        database_path = join(folder, "database.db")
+        num_titles = _search_database(database_path, num_titles, seed)
+        session = Session(database_path, QueryTimer(slow_query_seconds = float("inf")))
+
+        times = {}
+        start = default_timer()
+        records = session.fetchall("SELECT title, genre, year, movie_ID FROM movie_info ORDER BY title")
+        times["fetchall every row"] = default_timer() - start
+        del records
+
+        start = default_timer()
+        for repeat in range(repeats):
+            TableSource(session, "movie_info", columns).rows(0, 10)
+        times["virtual: open and show first rows"] = (default_timer() - start) / repeats
+
+        source = TableSource(session, "movie_info", columns)
+        start = default_timer()
+        for first in range(0, num_titles, 10):
+            source.rows(first, first + 10)
+        times["virtual: scroll through every row, per 10 rows"] = (default_timer() - start) / (num_titles / 10)
+
+        start = default_timer()
+        for repeat in range(repeats):
+            TableSource(session, "movie_info", columns).rows(num_titles - 10, num_titles)
+        times["virtual: jump to the last rows"] = (default_timer() - start) / repeats
+
+        start = default_timer()
+        for repeat in range(repeats):
+            source.sort("year", descending = repeat % 2 == 0)
+            source.rows(0, 10)
+        times["virtual: sort by year and show first rows"] = (default_timer() - start) / repeats
+
+        anchor = session.fetchone("SELECT title, rowid FROM movie_info ORDER BY title, rowid LIMIT 1 OFFSET ?",
+                                  (num_titles - 101,))
+        start = default_timer()
+        for repeat in range(repeats):
+            session.fetchall("""SELECT title, genre, year, movie_ID FROM movie_info
+                             ORDER BY title, rowid LIMIT 100 OFFSET ?""", (num_titles - 100,))
+        times["last page by LIMIT/OFFSET"] = (default_timer() - start) / repeats
+
+        start = default_timer()
+        for repeat in range(repeats):
+            session.fetchall("""SELECT title, genre, year, movie_ID FROM movie_info WHERE (title, rowid) > (?, ?)
+                             ORDER BY title, rowid LIMIT 100""", anchor)
+        times["last page by keyset"] = (default_timer() - start) / repeats
+
+        try:
+            root = tk.Tk()
+        except tk.TclError:
+            root = None
+
+        if root is not None:
+            records = session.fetchall("SELECT title, genre, year, movie_ID FROM movie_info ORDER BY title")
+            start = default_timer()
+            tree = ttk.Treeview(root, columns = columns)
+            for count, record in enumerate(records):
+                tree.insert(parent = "", index = "end", iid = count, text = "", values = record)
+            root.update()
+            times["Treeview: insert every row"] = default_timer() - start
+
+            start = default_timer()
+            virtual_tree = VirtualTreeview(root, TableSource(session, "movie_info", columns),
+                                           [(column, 100, "w") for column in columns])
+            root.update()
+            times["Treeview: virtual Treeview"] = default_timer() - start
+
+            start = default_timer()
+            for first in range(0, 1000):
+                virtual_tree.scroll_to(first)
+            root.update()
+            times["Treeview: virtual Treeview, per row scrolled"] = (default_timer() - start) / 1000
+            root.destroy()
+
+        session.close()
+    finally:
+        shutil.rmtree(folder)
+
+    print("Virtual Treeview: {} titles{}".format(num_titles, "" if root is not None else
+                                                  " (no display, so the Treeview itself is not timed)"))
+    for name, seconds in times.items():
+        print("  {:<48} {:>9.2f} ms".format(name, seconds * 1000))
+
+    return times
+
+# Create function which times what a change of page does with the database, and with tkinter where there is a
+# display, for a user with histories of several sizes
+# Before pages were kept, every change rebuilt the page, reading the whole list and inserting every row into a new
+# Treeview. A kept page only applies the changes it has not seen, here one movie added to the history
+def benchmark_page_switch(num_titles = 62000, history_sizes = (20, 200, 1000), repeats = 20, seed = 0):
+    folder = tempfile.mkdtemp()
+    rng = np.random.default_rng(seed)
+    times = {}
+    try:
+        database_path = join(folder, "database.db")
+        num_titles = _search_database(database_path, num_titles, seed)
+        session = Session(database_path, QueryTimer(slow_query_seconds = float("inf")))
+        movie_IDs = np.array([record[0] for record in session.fetchall("SELECT movie_ID FROM movie_info")])
+
+        try:
+            root = tk.Tk()
+        except tk.TclError:
+            root = None
+
+        for history_size in history_sizes:
+            username = "user {}".format(history_size)
+            history = rng.choice(movie_IDs, size = history_size + 1, replace = False)
+            with session.transaction():
+                for movie_ID in history[:-1]:
+                    session.execute("INSERT INTO user_history VALUES (?, ?, ?)", (username, 0, int(movie_ID)))
+
+            start = default_timer()
+            for repeat in range(repeats):
+                records = session.fetchall("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
+                                           INNER JOIN user_history ON movie_info.movie_ID = user_history.movie_ID
+                                           WHERE user_history.username = ? ORDER BY title""", (username,))
+            times["rebuilt: read history of {}".format(history_size)] = (default_timer() - start) / repeats
+
+            start = default_timer()
+            for repeat in range(repeats):
+                record = session.fetchone("SELECT title, genre, year, movie_ID FROM movie_info WHERE movie_ID = ?",
+                                          (int(history[-1]),))
+                session.fetchone("SELECT COUNT(*) FROM user_history WHERE username = ?", (username,))
+            times["kept: read 1 change, history of {}".format(history_size)] = (default_timer() - start) / repeats
+
+            if root is not None:
+                start = default_timer()
+                for repeat in range(repeats):
+                    tree = ttk.Treeview(root, columns = ("Title", "Genre", "Year", "Movie ID"), show = "headings")
+                    tree.pack()
+                    for record in records:
+                        tree.insert(parent = "", index = "end", iid = record[3], text = "", values = record)
+                    root.update_idletasks()
+                    tree.destroy()
+                times["rebuilt: Treeview of {}".format(history_size)] = (default_timer() - start) / repeats
+
+                tree = ttk.Treeview(root, columns = ("Title", "Genre", "Year", "Movie ID"), show = "headings")
+                tree.pack()
+                for record in records:
+                    tree.insert(parent = "", index = "end", iid = record[3], text = "", values = record)
+                start = default_timer()
+                for repeat in range(repeats):
+                    index = 0
+                    for iid in tree.get_children():
+                        if tree.set(iid, "Title") > str(record[0]):
+                            break
+                        index += 1
+                    tree.insert(parent = "", index = index, iid = record[3], text = "", values = record)
+                    root.update_idletasks()
+                    tree.delete(record[3])
+                times["kept: insert 1 row, history of {}".format(history_size)] = (default_timer() - start) / repeats
+                tree.destroy()
+
+        if root is not None:
+            root.destroy()
+        session.close()
+    finally:
+        shutil.rmtree(folder)
+
+    print("Page switch: {} titles{}".format(num_titles, "" if root is not None else
+                                            " (no display, so only the database work is timed)"))
+    for name, seconds in times.items():
+        print("  {:<48} {:>9.3f} ms".format(name, seconds * 1000))
+
+    return times
+
+# Modules the application imports at startup which are not part of the standard library
+STARTUP_MODULES = ["numpy", "PIL.ImageTk", "requests", "schema", "data_access", "interaction_store", "model_cache",
+                   "bootstrap", "search_index", "imdb_cache", "virtual_treeview"]
+
+# Script run in a new interpreter which prints the seconds taken to import the modules named by its arguments
+IMPORT_SCRIPT = """import sys
+sys.path.append("architecture and training")
+from warm_up import timed_import
+print(sum(timed_import(name) for name in sys.argv[1:]))"""
+
+# Script run in a new interpreter which prints the seconds from its start until the application's first page is
+# drawn, with the warm-up thread left to run for as long as the page takes to appear
+FIRST_FRAME_SCRIPT = """from timeit import default_timer
+start = default_timer()
+import application
+app = application.App()
+app.update()
+print("first frame", default_timer() - start)
+app.destroy()"""
+
+# Create function which runs a script in a new interpreter and returns the last line it prints, or None with the
+# last line of the error if it fails
+def _run_script(script, *args):
+    result = subprocess.run([sys.executable, "-c", script] + list(args), capture_output = True, text = True)
+    if result.returncode != 0:
+        return None, (result.stderr.strip().splitlines() or ["exit code {}".format(result.returncode)])[-1]
+
+    return result.stdout.strip().splitlines()[-1], None
+
+# Create function which times the application's startup
+# Every module is imported in an interpreter of its own, so each time includes the modules it imports in turn and
+# modules shared by several, such as numpy, are counted in each of them
+# The first frame is only timed where there is a display and the application database has already been built,
+# since starting the application without one would build it
+def benchmark_startup(repeats = 3):
+    times = {}
+    print("Startup: import cost per module in a new interpreter, best of {}".format(repeats))
+    for heading, modules in (("imported at startup", STARTUP_MODULES), ("imported on first use", HEAVY_MODULES)):
+        print("  {}".format(heading))
+        for name in modules:
+            best = None
+            for repeat in range(repeats):
+                output, error = _run_script(IMPORT_SCRIPT, name)
+                if error is not None:
+                    break
+                best = float(output) if best is None else min(best, float(output))
+
+            if best is None:
+                print("    {:<28} not timed: {}".format(name, error))
+            else:
+                times[name] = best
+                print("    {:<28} {:>9.1f} ms".format(name, best * 1000))
+
+    # Before they were imported on first use, startup spent this long on them before showing anything
+    output, error = _run_script(IMPORT_SCRIPT, *HEAVY_MODULES)
+    if error is None:
+        times["imported on first use, together"] = float(output)
+        print("  {:<30} {:>9.1f} ms".format("imported on first use, together", float(output) * 1000))
+    else:
+        print("  imported on first use, together, not timed: {}".format(error))
+
+    if not isfile(DATABASE_PATH):
+        print("  first frame not timed: the application database has not been built")
+        return times
+
+    best = None
+    for repeat in range(repeats):
+        output, error = _run_script(FIRST_FRAME_SCRIPT)
+        if error is not None:
+            break
+        best = float(output.split()[-1]) if best is None else min(best, float(output.split()[-1]))
+
+    if best is None:
+        print("  first frame not timed: {}".format(error))
+    else:
+        times["first frame"] = best
+        print("  {:<30} {:>9.1f} ms".format("first frame", best * 1000))
+
+    return times
+
+BENCHMARKS = {"negative_sampling": benchmark_negative_sampling,
+              "bootstrap": benchmark_bootstrap,
+              "movie_search": benchmark_movie_search,
+              "search_as_you_type": benchmark_search_as_you_type,
+              "imdb_cache": benchmark_imdb_cache,
+              "prefetch": benchmark_prefetch,
+              "virtual_treeview": benchmark_virtual_treeview,
+              "page_switch": benchmark_page_switch,
+              "startup": benchmark_startup}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Time parts of the application")
+    parser.add_argument("names", nargs = "*", metavar = "name",
+                        help = "benchmarks to run, from {} (default: all)".format(", ".join(sorted(BENCHMARKS))))
+    args = parser.parse_args()
+
+    for name in args.names or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark {}".format(name))
+        BENCHMARKS[name]()
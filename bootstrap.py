@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+""" This script builds application data/database.db from the prepared dataset
+in one bulk load. train_set is read into typed NumPy columns, which are sorted
+by key with duplicates removed in NumPy, and the rows are inserted with
+executemany while synchronous writes and the rollback journal are switched off. The keys and
+indexes are only built once every row is in. The load writes to a temporary
+file which replaces the database when it is complete, so an interrupted load
+never leaves a half-built database behind.
+
+train_set can also be read from a snapshot of .npy columns, and the whole
+database can be restored from a SQLite backup file, e.g.
+
+    python bootstrap.py --save-snapshot
+    python bootstrap.py --source npy
+
+The negative samples stored in an existing database, which are not read when
+they are drawn during training, can be deleted with
+
+    python bootstrap.py --remove-stored-negatives
+"""
+
+import argparse
+import sqlite3 as sql
+import sys
+
+import numpy as np
+
+from os import chdir, makedirs, remove, replace
+from os.path import abspath, dirname, isfile, join
+from timeit import default_timer
+
+from schema import DATABASE_PATH, create_tables, index_loaded_tables
+
+# The training scripts are found next to this script wherever it is run from
+sys.path.append(join(dirname(abspath(__file__)), "architecture and training"))
+from interaction_store import InteractionStore, export_database
+
+DATASET_FOLDER = "data/data preparation/dataset frac=0.33, ratio=4, min_samples=100"
+SNAPSHOT_FOLDER = "application data/snapshot"
+BACKUP_SNAPSHOT_PATH = join(SNAPSHOT_FOLDER, "database.db")
+
+# Interaction store holding the same train_set rows as the freshly built database
+INTERACTIONS_FOLDER = "application data/interactions"
+
+# Define this before running program to avoid long runtime when creating a user for first time
+# This value will change depending on the train_set used for the database
+# Users above it were created in the application and are left out of the interaction store
+TRAIN_SET_MAX_USER_ID = 162541
+
+# Types of the train_set columns, which are also the types the .npy snapshot is saved with
+TRAIN_SET_DTYPES = {"user_ID": np.int32, "movie_ID": np.int32, "interaction": np.int8}
+
+MOVIE_INFO_COLUMNS = ["movie_ID", "IMDb_ID", "title", "genre", "year"]
+
+# Pragmas used only while loading, when the database is a new file that is thrown away if the load fails
+LOAD_PRAGMAS = {"synchronous": "OFF",
+                "journal_mode": "OFF",
+                "locking_mode": "EXCLUSIVE",
+                "cache_size": -262144,
+                "temp_store": "MEMORY"}
+
+# Rows per INSERT statement, keeping 3 * ROWS_PER_INSERT under SQLite's oldest limit of 999 parameters
+ROWS_PER_INSERT = 300
+
+# Create function which reads the train_set csv into a dict of typed NumPy columns
+# pandas is imported by the functions which read csv files, since the application imports this script at startup but
+# only builds the database once
+def read_train_set_csv(dataset_folder = DATASET_FOLDER):
+    import pandas as pd
+
+    train_set = pd.read_csv(join(dataset_folder, "train_set.csv"), usecols = list(TRAIN_SET_DTYPES),
+                            dtype = TRAIN_SET_DTYPES)
+
+    return {column: train_set[column].to_numpy() for column in TRAIN_SET_DTYPES}
+
+# Create function which saves train_set columns as .npy files, one per column
+def save_npy_snapshot(columns, snapshot_folder = SNAPSHOT_FOLDER):
+    makedirs(snapshot_folder, exist_ok = True)
+    for column, values in columns.items():
+        np.save(join(snapshot_folder, "train_set.{}.npy".format(column)), values)
+
+# Create function which reads train_set columns from a .npy snapshot
+# The files are memory-mapped, so only the rows being inserted are paged in
+def read_npy_snapshot(snapshot_folder = SNAPSHOT_FOLDER):
+    return {column: np.load(join(snapshot_folder, "train_set.{}.npy".format(column)), mmap_mode = "r")
+            for column in TRAIN_SET_DTYPES}
+
+# Create function which checks whether every column of a .npy snapshot exists
+def has_npy_snapshot(snapshot_folder = SNAPSHOT_FOLDER):
+    return all(isfile(join(snapshot_folder, "train_set.{}.npy".format(column))) for column in TRAIN_SET_DTYPES)
+
+# Create function which sorts train_set by (user_ID, movie_ID) and removes rows sharing a key, keeping the
+# positive sample if there is one and otherwise the first row
+# Inserting the rows in key order roughly halves the time taken to build the key's index afterwards
+def sort_train_set(columns):
+    keys = (columns["user_ID"].astype(np.int64) << 32) | columns["movie_ID"].astype(np.int64)
+    order = np.lexsort((np.arange(keys.shape[0]), -columns["interaction"].astype(np.int16), keys))
+
+    first = np.ones(order.shape[0], dtype = bool)
+    first[1:] = keys[order[1:]] != keys[order[:-1]]
+    keep = order[first]
+
+    return {column: np.asarray(values)[keep] for column, values in columns.items()}
+
+# Create function which inserts rows into a table from equal-length NumPy columns
+# Rows are sent ROWS_PER_INSERT at a time in multi-row INSERT statements, which saves most of the per-row
+# overhead of executemany while still binding every value as a parameter
+def insert_columns(conn, table, columns):
+    names = list(columns)
+    num_columns = len(names)
+    values = np.stack([np.asarray(columns[name], dtype = np.int64) for name in names], axis = 1)
+
+    row_placeholder = "(" + ", ".join(["?"] * num_columns) + ")"
+    insert = "INSERT INTO {} ({}) VALUES ".format(table, ", ".join(names))
+
+    num_full = values.shape[0] // ROWS_PER_INSERT * ROWS_PER_INSERT
+    conn.executemany(insert + ", ".join([row_placeholder] * ROWS_PER_INSERT),
+                     values[:num_full].reshape(-1, num_columns * ROWS_PER_INSERT).tolist())
+    conn.executemany(insert + row_placeholder, values[num_full:].tolist())
+
+    return values.shape[0]
+
+# Create function which inserts movie_info from its csv
+# The table is small and has text columns, so it is read with pandas and inserted row by row
+def insert_movie_info(conn, dataset_folder = DATASET_FOLDER):
+    import pandas as pd
+
+    movie_info = pd.read_csv(join(dataset_folder, "movie_info.csv"), usecols = MOVIE_INFO_COLUMNS)
+    movie_info = movie_info.drop_duplicates(subset = "movie_ID")
+    movie_info = movie_info.astype(object).where(movie_info.notna(), None)
+
+    conn.executemany("INSERT INTO movie_info ({}) VALUES (?, ?, ?, ?, ?)".format(", ".join(MOVIE_INFO_COLUMNS)),
+                     movie_info.itertuples(index = False, name = None))
+
+    return movie_info.shape[0]
+
+# Create function which builds a new database from train_set columns and the movie_info csv
+# The same rows are saved as an interaction store in store_folder when it is given
+# Returns the number of rows inserted into each table
+def bulk_load(database_path, train_columns, positives_only = False, dataset_folder = DATASET_FOLDER,
+              store_folder = None):
+    if positives_only:
+        positive = np.asarray(train_columns["interaction"]) == 1
+        train_columns = {column: np.asarray(values)[positive] for column, values in train_columns.items()}
+    train_columns = sort_train_set(train_columns)
+
+    loading_path = database_path + ".loading"
+    if isfile(loading_path):
+        remove(loading_path)
+
+    conn = sql.connect(loading_path, isolation_level = None)
+    try:
+        for pragma, value in LOAD_PRAGMAS.items():
+            conn.execute("PRAGMA {} = {}".format(pragma, value))
+
+        conn.execute("BEGIN")
+        create_tables(conn)
+        rows = {"train_set": insert_columns(conn, "train_set", train_columns),
+                "movie_info": insert_movie_info(conn, dataset_folder)}
+
+        # Building each index once after every row is in is much faster than updating it on every insert
+        index_loaded_tables(conn)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    replace(loading_path, database_path)
+
+    if store_folder is not None:
+        InteractionStore.from_arrays(train_columns["user_ID"], train_columns["movie_ID"],
+                                     train_columns["interaction"]).save(store_folder)
+
+    return rows
+
+# Create function which copies a database into a SQLite backup file
+def save_backup_snapshot(database_path = DATABASE_PATH, snapshot_path = BACKUP_SNAPSHOT_PATH):
+    makedirs(dirname(snapshot_path), exist_ok = True)
+    source = sql.connect(database_path)
+    target = sql.connect(snapshot_path)
+    source.backup(target)
+    target.close()
+    source.close()
+
+# Create function which restores a database from a SQLite backup file
+# Returns the number of rows in each table of the restored database
+def restore_backup_snapshot(database_path, snapshot_path = BACKUP_SNAPSHOT_PATH):
+    loading_path = database_path + ".loading"
+    if isfile(loading_path):
+        remove(loading_path)
+
+    source = sql.connect(snapshot_path)
+    target = sql.connect(loading_path)
+    source.backup(target)
+    rows = {table: target.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+            for table in ("train_set", "movie_info")}
+    target.close()
+    source.close()
+
+    replace(loading_path, database_path)
+    return rows
+
+# Create function which deletes the negative samples stored in train_set and shrinks the database file
+# This is only for a database used with SAMPLE_NEGATIVES_ON_THE_FLY, and cannot be undone other than by building
+# the database again without positives_only
+# The interaction store, if there is one, is exported again so that it keeps holding the same rows as the database
+# Returns the number of rows deleted
+def remove_stored_negatives(database_path = DATABASE_PATH, store_folder = INTERACTIONS_FOLDER):
+    conn = sql.connect(database_path, isolation_level = None)
+    try:
+        if conn.execute("SELECT 1 FROM train_set WHERE interaction = 0 LIMIT 1").fetchone() is None:
+            return 0
+
+        num_deleted = conn.execute("DELETE FROM train_set WHERE interaction = 0").rowcount
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    if store_folder is not None and isfile(join(store_folder, "indptr.npy")):
+        export_database(database_path, store_folder, max_user_ID = TRAIN_SET_MAX_USER_ID)
+
+    return num_deleted
+
+# Create function which builds the database from the fastest source available, or from source if given
+# Sources are "backup" (a SQLite backup file), "npy" (train_set columns saved as .npy) and "csv"
+# train_set is also saved as an interaction store in store_folder, unless it is None
+# Returns a dict with the source used, the rows loaded, the time taken and the rows per second
+def bootstrap_database(database_path = DATABASE_PATH, source = None, positives_only = False,
+                       dataset_folder = DATASET_FOLDER, snapshot_folder = SNAPSHOT_FOLDER,
+                       store_folder = INTERACTIONS_FOLDER):
+    backup_path = join(snapshot_folder, "database.db")
+    if source is None:
+        if isfile(backup_path):
+            source = "backup"
+        elif has_npy_snapshot(snapshot_folder):
+            source = "npy"
+        else:
+            source = "csv"
+
+    start = default_timer()
+    if source == "backup":
+        rows = restore_backup_snapshot(database_path, backup_path)
+        if store_folder is not None:
+            export_database(database_path, store_folder, max_user_ID = TRAIN_SET_MAX_USER_ID)
+    elif source == "npy":
+        rows = bulk_load(database_path, read_npy_snapshot(snapshot_folder), positives_only, dataset_folder,
+                         store_folder)
+    elif source == "csv":
+        rows = bulk_load(database_path, read_train_set_csv(dataset_folder), positives_only, dataset_folder,
+                         store_folder)
+    else:
+        raise ValueError("Unknown bootstrap source: {}".format(source))
+    seconds = default_timer() - start
+
+    total_rows = sum(rows.values())
+    print("Loaded {} train_set rows and {} movie_info rows from {} in {:.2f} s ({:,.0f} rows/s)".format(
+          rows["train_set"], rows["movie_info"], source, seconds, total_rows / seconds))
+
+    return {"source": source, "rows": rows, "seconds": seconds, "rows_per_sec": total_rows / seconds}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Build the application database in one bulk load")
+    parser.add_argument("--database", help = "database to build (default: {})".format(DATABASE_PATH))
+    parser.add_argument("--source", choices = ["backup", "npy", "csv"],
+                        help = "where to load from (default: the fastest snapshot available, else csv)")
+    parser.add_argument("--positives-only", action = "store_true",
+                        help = "leave out the stored negative samples, which are drawn during training instead")
+    parser.add_argument("--save-snapshot", action = "store_true",
+                        help = "save train_set from the csv as .npy columns and a backup of the built database")
+    parser.add_argument("--remove-stored-negatives", action = "store_true",
+                        help = "delete the stored negative samples from the existing database instead of building "
+                               "it, which is only for SAMPLE_NEGATIVES_ON_THE_FLY = True since they can only be "
+                               "restored by building the database again")
+    args = parser.parse_args()
+    if args.remove_stored_negatives and (args.source is not None or args.positives_only or args.save_snapshot):
+        parser.error("--remove-stored-negatives works on the existing database and cannot be combined with "
+                     "options for building it")
+    database_path = abspath(args.database) if args.database is not None else DATABASE_PATH
+
+    # Set working directory to folder which contains this script, so the data folders are found as they are by the
+    # application
+    chdir(dirname(abspath(__file__)))
+
+    if args.remove_stored_negatives:
+        start = default_timer()
+        num_deleted = remove_stored_negatives(database_path)
+        print("Deleted {} stored negative samples in {:.2f} s".format(num_deleted, default_timer() - start))
+    else:
+        if args.save_snapshot:
+            save_npy_snapshot(read_train_set_csv())
+
+        bootstrap_database(database_path, args.source, args.positives_only)
+
+        if args.save_snapshot:
+            save_backup_snapshot(database_path)
@@ -4,6 +4,8 @@
 and its associated test set based on the minimum number of samples,
 seen and unseen, each user ID can have."""
 
+import sys
+
 import pandas as pd
 
 from os import chdir
@@ -12,47 +14,51 @@ from os.path import dirname, abspath, join
 # Set working directory to folder which contains this script
 chdir(dirname(abspath(__file__)))
 
-def select_subset(train_path, test_path, min_samples, save_folder):
-    # Load training and test sets into dataframes
-    train_set = pd.read_csv(train_path)
-    test_set = pd.read_csv(test_path)
-    
-    print(train_set.shape[0])
-    print(test_set.shape[0])
-    
+sys.path.append("../../architecture and training")
+from interaction_store import STORE_FOLDER, open_dataset
+
+# Create function which saves a store as a csv in the layout of the prepared datasets
+def save_csv(store, csv_path):
+    pd.DataFrame({"user_ID": store.users, "movie_ID": store.movies, "interaction": store.labels}).to_csv(csv_path)
+
+# Create function which keeps the users of a dataset with at least min_samples rows in the training set
+# The sample counts come straight from the CSR index of the training set's interaction store
+def select_subset(dataset_folder, min_samples, save_folder):
+    # Open training and test sets as memory-mapped interaction stores
+    train_set = open_dataset(dataset_folder, "train_set")
+    test_set = open_dataset(dataset_folder, "test_set")
+
+    print(len(train_set))
+    print(len(test_set))
+
     # Create boolean index to select user ID values based on minimum sample number condition
-    bool_index = train_set.groupby("user_ID")["movie_ID"].transform("count") >= min_samples
-    train_set = train_set.loc[bool_index]
-    
-    # Save new training set in a new folder
-    train_set.to_csv(join(save_folder, "train_set.csv"))
-    
-    # Create series of unique user IDs from new training set and name it "user_ID"
-    train_set_IDs = pd.Series(train_set["user_ID"].unique()).rename("user_ID")
-                     
-    # Join training set user ID column with test set on user ID
+    keep_user = train_set.counts() >= min_samples
+    train_set = train_set.select_users(keep_user)
+
     # New test set will contain only user IDs which are in the new training set
-    test_set = pd.merge(left = test_set, right = train_set_IDs,
-                        on = "user_ID", how = "inner")
-    
-    print("Train Users " + str(train_set["user_ID"].unique().shape[0]))
-    print("Train Movies " + str(train_set["movie_ID"].unique().shape[0]))
-    print("Test Users " + str(test_set["user_ID"].unique().shape[0]))
-    print("Test Movies " + str(test_set["movie_ID"].unique().shape[0]))
-    
-    print(train_set.shape[0])
-    print(test_set.shape[0])
-    
-    test_set.to_csv(join(save_folder, "test_set.csv"))
-    
+    test_set = test_set.select_users(keep_user)
+
+    print("Train Users " + str(int((train_set.counts() > 0).sum())))
+    print("Train Movies " + str(pd.unique(train_set.movies).shape[0]))
+    print("Test Users " + str(int((test_set.counts() > 0).sum())))
+    print("Test Movies " + str(pd.unique(test_set.movies).shape[0]))
+
+    print(len(train_set))
+    print(len(test_set))
+
+    # Save new training and test sets in a new folder, as stores and as csv files
+    train_set.save(join(save_folder, STORE_FOLDER, "train_set"))
+    test_set.save(join(save_folder, STORE_FOLDER, "test_set"))
+    save_csv(train_set, join(save_folder, "train_set.csv"))
+    save_csv(test_set, join(save_folder, "test_set.csv"))
+
     return
 
 if __name__ == "__main__":
-    select_subset(train_path = "dataset frac=0.33, ratio=4, min_samples=100/train_set.csv",
-                  test_path = "dataset frac=0.33, ratio=4, min_samples=100/test_set.csv",
+    select_subset(dataset_folder = "dataset frac=0.33, ratio=4, min_samples=100",
                   min_samples = 500, save_folder = "dataset frac=0.33, ratio=4, min_samples=250")
-    
-    
-                        
-    
-    
+
+
+
+
+
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+
+from collections import defaultdict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from schema import DATABASE_PATH, connect_database
+
+# Number of prepared statements each connection keeps, which is more than the application has distinct queries
+STATEMENT_CACHE_SIZE = 256
+
+# Number of connections kept for background threads
+WORKER_POOL_SIZE = 2
+
+# Queries slower than this are reported as they happen
+SLOW_QUERY_SECONDS = 0.05
+
+# Records how long every query takes, shared by all the connections of a Database
+class QueryTimer:
+    def __init__(self, slow_query_seconds = SLOW_QUERY_SECONDS):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+
+        # For each SQL string: [number of runs, total seconds, slowest run in seconds]
+        self._stats = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def record(self, query, seconds):
+        with self._lock:
+            stats = self._stats[query]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+        if seconds >= self.slow_query_seconds:
+            print("Slow query ({:.1f} ms): {}".format(seconds * 1000, " ".join(query.split())))
+
+    # Create function which returns (query, runs, total seconds, slowest seconds) sorted by total time
+    def stats(self):
+        with self._lock:
+            rows = [(query, runs, total, slowest) for query, (runs, total, slowest) in self._stats.items()]
+
+        return sorted(rows, key = lambda row: row[2], reverse = True)
+
+# One connection, with timed helpers for running statements and grouping them into transactions
+# The connection is in autocommit mode, so each statement commits on its own unless it is run inside transaction()
+class Session:
+    def __init__(self, database_path, timer, check_same_thread = True):
+        self.conn = connect_database(database_path, isolation_level = None,
+                                     cached_statements = STATEMENT_CACHE_SIZE,
+                                     check_same_thread = check_same_thread)
+        self.timer = timer
+        self.in_transaction = False
+
+    # Create function which runs one statement and returns the cursor
+    # The SQL string is used as-is as the key of the prepared statement cache, so parameters are always bound
+    def execute(self, query, params = ()):
+        start = default_timer()
+        cursor = self.conn.execute(query, params)
+        self.timer.record(query, default_timer() - start)
+
+        return cursor
+
+    # Create function which runs one statement and returns all of its rows
+    def fetchall(self, query, params = ()):
+        start = default_timer()
+        records = self.conn.execute(query, params).fetchall()
+        self.timer.record(query, default_timer() - start)
+
+        return records
+
+    # Create function which runs one statement and returns its first row, or None
+    def fetchone(self, query, params = ()):
+        start = default_timer()
+        record = self.conn.execute(query, params).fetchone()
+        self.timer.record(query, default_timer() - start)
+
+        return record
+
+    # Create function which runs one statement for every row of params
+    def executemany(self, query, rows):
+        start = default_timer()
+        cursor = self.conn.executemany(query, rows)
+        self.timer.record(query, default_timer() - start)
+
+        return cursor
+
+    # Create context manager which runs every statement inside it as one transaction
+    # The transaction is committed at the end, or rolled back if an exception is raised
+    # Nested use joins the outer transaction
+    @contextmanager
+    def transaction(self):
+        if self.in_transaction:
+            yield self
+            return
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.in_transaction = True
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self.in_transaction = False
+
+    def close(self):
+        self.conn.close()
+
+# Data-access layer owned by the App
+# The GUI thread uses one long-lived session and background threads borrow sessions from a small pool
+class Database(Session):
+    def __init__(self, database_path = DATABASE_PATH, pool_size = WORKER_POOL_SIZE,
+                 slow_query_seconds = SLOW_QUERY_SECONDS):
+        super().__init__(database_path, QueryTimer(slow_query_seconds))
+        self.database_path = database_path
+
+        # The thread which created the database owns its session, which is the GUI thread in the application
+        self._owner = threading.get_ident()
+
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._pool_created = 0
+        self._pool_lock = threading.Lock()
+
+    # Create context manager which lends a session to a background thread
+    # Sessions are made when needed up to pool_size, after which a thread waits for one to be returned
+    # The owning thread is given its own session instead, so code shared with background threads, such as the
+    # recommender service, never makes the GUI wait for a pooled session held by training or the warm-up
+    @contextmanager
+    def worker(self):
+        if threading.get_ident() == self._owner:
+            yield self
+            return
+
+        session = None
+        with self._pool_lock:
+            if self._pool.empty() and self._pool_created < self._pool_size:
+                session = Session(self.database_path, self.timer, check_same_thread = False)
+                self._pool_created += 1
+
+        if session is None:
+            session = self._pool.get()
+
+        try:
+            yield session
+        finally:
+            self._pool.put(session)
+
+    # Create function which returns the timings of every query run through this database
+    def query_stats(self):
+        return self.timer.stats()
+
+    # Create function which closes the GUI session and every pooled session
+    def close(self):
+        super().close()
+        while not self._pool.empty():
+            self._pool.get().close()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3 as sql
+
+import numpy as np
+
+from contextlib import contextmanager
+from os.path import isfile
+
+# Tables which store the index of every user ID and movie ID the network has been given a row for
+# They are created by migration 5 in schema.py
+MAPPING_TABLES = {"user": "user_ID_mapping", "movie": "movie_ID_mapping"}
+
+# Sorted class arrays saved by LabelEncoder before the mapping tables existed
+# When a mapping table is empty it is seeded from these, so an existing trained network keeps working
+LEGACY_ENCODING_PATHS = {"user": "application data/encodings and saved model/user_ID_encoding.npy",
+                         "movie": "application data/encodings and saved model/movie_ID_encoding.npy"}
+
+# Append-only mapping between raw IDs and the rows of the network's embedding layers
+# Indices never move once given out, and a new ID takes the next index
+# Encoding goes through a dense int32 lookup array and decoding through the array of IDs, so both are O(1) per ID
+class IDMapping:
+    def __init__(self, IDs, kind = None):
+        self.kind = kind
+
+        # IDs[index] gives the raw ID, and lookup[raw_ID] gives the index or -1
+        self.IDs = np.asarray(IDs, dtype = np.int64)
+        self.lookup = np.full(int(self.IDs.max()) + 1 if self.IDs.shape[0] > 0 else 0, -1, dtype = np.int32)
+        self.lookup[self.IDs] = np.arange(self.IDs.shape[0], dtype = np.int32)
+
+    # Create function which reads the mapping for kind ("user" or "movie") from the database
+    @classmethod
+    def load(cls, database_path, kind):
+        conn = sql.connect(database_path)
+        c = conn.cursor()
+        c.execute("SELECT ID FROM {} ORDER BY idx".format(MAPPING_TABLES[kind]))
+        IDs = np.array([record[0] for record in c.fetchall()], dtype = np.int64)
+        conn.close()
+
+        mapping = cls(IDs, kind)
+        if IDs.shape[0] == 0 and isfile(LEGACY_ENCODING_PATHS[kind]):
+            mapping.extend(database_path, np.load(LEGACY_ENCODING_PATHS[kind]))
+
+        return mapping
+
+    def __len__(self):
+        return self.IDs.shape[0]
+
+    # Create function which returns a boolean array saying whether each raw ID has an index
+    def contains(self, IDs):
+        IDs = np.asarray(IDs, dtype = np.int64)
+        found = np.zeros(IDs.shape, dtype = bool)
+
+        in_range = (IDs >= 0) & (IDs < self.lookup.shape[0])
+        found[in_range] = self.lookup[IDs[in_range]] >= 0
+
+        return found
+
+    # Create function which returns the index of each raw ID, or -1 for an ID without one
+    def encode(self, IDs):
+        IDs = np.asarray(IDs, dtype = np.int64)
+        indices = np.full(IDs.shape, -1, dtype = np.int32)
+
+        in_range = (IDs >= 0) & (IDs < self.lookup.shape[0])
+        indices[in_range] = self.lookup[IDs[in_range]]
+
+        return indices
+
+    # Create function which returns the raw ID of each index
+    def decode(self, indices):
+        return self.IDs[np.asarray(indices, dtype = np.int64)]
+
+    # Create function which returns a mapping of only the first num_indices indices
+    # Used to match a network which was trained before later IDs were added
+    def prefix(self, num_indices):
+        return IDMapping(self.IDs[:num_indices], self.kind)
+
+    # Create function which gives the next indices to any raw IDs without one, in ascending order of ID
+    # Rows added by another connection since this mapping was loaded are picked up first, and the new rows
+    # are written in one transaction which holds the write lock, so two writers cannot hand out the same index
+    # Returns the number of IDs which were added
+    def extend(self, database_path, IDs):
+        with self.extending(database_path, IDs) as num_added:
+            return num_added
+
+    # Create function which adds IDs like extend, but keeps the transaction open while the with block runs
+    # The rows are only committed, and the IDs only added in memory, if the block finishes without an error, so
+    # the mapping can be saved together with the network rows it describes
+    @contextmanager
+    def extending(self, database_path, IDs):
+        IDs = np.unique(np.asarray(IDs, dtype = np.int64))
+
+        conn = sql.connect(database_path, isolation_level = None)
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("SELECT ID FROM {} WHERE idx >= ? ORDER BY idx".format(MAPPING_TABLES[self.kind]), (len(self),))
+            self._append(np.array([record[0] for record in c.fetchall()], dtype = np.int64))
+
+            new_IDs = IDs[~self.contains(IDs)]
+            c.executemany("INSERT INTO {} (ID, idx) VALUES (?, ?)".format(MAPPING_TABLES[self.kind]),
+                          zip(new_IDs.tolist(), range(len(self), len(self) + new_IDs.shape[0])))
+
+            yield new_IDs.shape[0]
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._append(new_IDs)
+
+    # Create function which gives the next indices to IDs in memory, growing the lookup array if needed
+    def _append(self, new_IDs):
+        if new_IDs.shape[0] == 0:
+            return
+
+        new_indices = np.arange(len(self), len(self) + new_IDs.shape[0], dtype = np.int32)
+        self.IDs = np.concatenate([self.IDs, new_IDs])
+
+        if int(new_IDs.max()) >= self.lookup.shape[0]:
+            growth = np.full(int(new_IDs.max()) + 1 - self.lookup.shape[0], -1, dtype = np.int32)
+            self.lookup = np.concatenate([self.lookup, growth])
+        self.lookup[new_IDs] = new_indices
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds the client and on-disk cache for IMDb movie details. The
+overview JSON of each title is kept in a SQLite database and its resized
+poster as a JPEG file, both keyed by IMDb ID, so a movie that has been looked
+up before is shown without touching the network. Entries expire after a time
+to live, and the least recently used entries are evicted once the cache holds
+more than its size limit. The client reuses one HTTP connection pool and
+retries failed requests with a backoff. The base URL can be set with the
+IMDB_API_URL environment variable, e.g. to point it at a local stand-in
+server. The prefetcher looks up a list of movies on a small thread pool, so
+their details are ready before the user asks for them."""
+
+import io
+import json
+import queue
+import threading
+import time
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from concurrent.futures import ThreadPoolExecutor
+from os import environ, makedirs, remove, replace
+from os.path import isfile, join
+from urllib.parse import urlparse
+
+from schema import connect_database
+
+IMDB_API_URL = environ.get("IMDB_API_URL", "https://imdb8.p.rapidapi.com")
+
+CACHE_FOLDER = "application data/imdb cache"
+
+# Seconds to wait for a connection and then for each read of a response
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Number of times a failed request is retried, waiting RETRY_BACKOFF * 2 ** n seconds before the nth retry
+REQUEST_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds an overview or poster is used before it is fetched again
+OVERVIEW_TTL = 30 * 24 * 60 * 60
+POSTER_TTL = 90 * 24 * 60 * 60
+
+# Most overviews and poster bytes kept before the least recently used are evicted
+MAX_OVERVIEWS = 10000
+MAX_POSTER_BYTES = 200 * 1024 * 1024
+
+# Size posters are resized to before they are cached
+POSTER_SIZE = (340, 503)
+POSTER_QUALITY = 90
+
+# Number of movies the prefetcher looks up at the same time
+PREFETCH_WORKERS = 5
+
+# Create function which formats a movie_info IMDb_ID as an IMDb title ID, e.g. 114709 as tt0114709
+def imdb_title_ID(IMDb_ID):
+    return "tt{:07d}".format(int(IMDb_ID))
+
+# HTTP client for the IMDb API on RapidAPI
+# One session is shared by every request, so connections are kept alive and reused
+class IMDbClient:
+    def __init__(self, api_key, base_url = IMDB_API_URL, timeout = REQUEST_TIMEOUT, retries = REQUEST_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(total = retries, backoff_factor = RETRY_BACKOFF, status_forcelist = RETRY_STATUSES,
+                      allowed_methods = ["GET"])
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(max_retries = retry))
+        self.session.mount("https://", HTTPAdapter(max_retries = retry))
+        self.api_headers = {"x-rapidapi-key": api_key,
+                            "x-rapidapi-host": urlparse(self.base_url).netloc}
+
+    # Create function which fetches the overview details of an IMDb title ID such as tt0114709
+    def overview(self, title_ID):
+        response = self.session.get(self.base_url + "/title/get-overview-details", headers = self.api_headers,
+                                    params = {"tconst": title_ID, "currentCountry": "GB"}, timeout = self.timeout)
+        response.raise_for_status()
+
+        return response.json()
+
+    # Create function which downloads an image and returns its bytes
+    def image(self, url):
+        response = self.session.get(url, timeout = self.timeout)
+        response.raise_for_status()
+
+        return response.content
+
+    def close(self):
+        self.session.close()
+
+# Create function which resizes image bytes to POSTER_SIZE and returns them as JPEG bytes
+# draft() lets a JPEG be decoded at a fraction of its full size when that is still at least size, which is most of
+# the work for the large posters IMDb serves
+def resize_poster(image_bytes, size = POSTER_SIZE):
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("RGB", size)
+    image = image.convert("RGB").resize(size)
+    output = io.BytesIO()
+    image.save(output, format = "JPEG", quality = POSTER_QUALITY)
+
+    return output.getvalue()
+
+# Cache of IMDb overviews and resized posters in folder
+# The cache may be used from several threads, so its connection is shared under a lock
+class IMDbCache:
+    def __init__(self, client, folder = CACHE_FOLDER, overview_ttl = OVERVIEW_TTL, poster_ttl = POSTER_TTL,
+                 max_overviews = MAX_OVERVIEWS, max_poster_bytes = MAX_POSTER_BYTES, clock = time.time):
+        self.client = client
+        self.poster_folder = join(folder, "posters")
+        self.overview_ttl = overview_ttl
+        self.poster_ttl = poster_ttl
+        self.max_overviews = max_overviews
+        self.max_poster_bytes = max_poster_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+
+        makedirs(self.poster_folder, exist_ok = True)
+        self._lock = threading.Lock()
+        self.conn = connect_database(join(folder, "cache.db"), isolation_level = None, check_same_thread = False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS overviews(
+                             title_ID TEXT PRIMARY KEY,
+                             overview TEXT NOT NULL,
+                             fetched REAL NOT NULL,
+                             accessed REAL NOT NULL
+                             )""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS posters(
+                             title_ID TEXT PRIMARY KEY,
+                             size INTEGER NOT NULL,
+                             fetched REAL NOT NULL,
+                             accessed REAL NOT NULL
+                             )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS overviews_accessed ON overviews (accessed)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS posters_accessed ON posters (accessed)")
+
+    def _poster_path(self, title_ID):
+        return join(self.poster_folder, title_ID + ".jpg")
+
+    # Create function which returns the overview of a movie_info IMDb_ID, fetching it if it is not cached
+    # An expired overview is still returned if fetching a new one fails
+    def overview(self, IMDb_ID):
+        title_ID = imdb_title_ID(IMDb_ID)
+        now = self.clock()
+        with self._lock:
+            record = self.conn.execute("SELECT overview, fetched FROM overviews WHERE title_ID = ?",
+                                       (title_ID,)).fetchone()
+            if record is not None and now - record[1] < self.overview_ttl:
+                self.conn.execute("UPDATE overviews SET accessed = ? WHERE title_ID = ?", (now, title_ID))
+                self.hits += 1
+                return json.loads(record[0])
+            self.misses += 1
+
+        try:
+            overview = self.client.overview(title_ID)
+        except requests.RequestException:
+            if record is None:
+                raise
+            return json.loads(record[0])
+
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO overviews VALUES (?, ?, ?, ?)",
+                              (title_ID, json.dumps(overview), now, now))
+            self._evict_overviews(now)
+
+        return overview
+
+    # Create function which returns the resized poster of a movie_info IMDb_ID as JPEG bytes
+    # The poster URL is read from the overview, which is fetched too if it is not cached
+    def poster(self, IMDb_ID, overview = None):
+        title_ID = imdb_title_ID(IMDb_ID)
+        path = self._poster_path(title_ID)
+        now = self.clock()
+        with self._lock:
+            record = self.conn.execute("SELECT fetched FROM posters WHERE title_ID = ?", (title_ID,)).fetchone()
+            if record is not None and now - record[0] < self.poster_ttl and isfile(path):
+                self.conn.execute("UPDATE posters SET accessed = ? WHERE title_ID = ?", (now, title_ID))
+                self.hits += 1
+                with open(path, "rb") as poster_file:
+                    return poster_file.read()
+            self.misses += 1
+
+        if overview is None:
+            overview = self.overview(IMDb_ID)
+
+        try:
+            poster = resize_poster(self.client.image(overview["title"]["image"]["url"]))
+        except requests.RequestException:
+            if record is None or not isfile(path):
+                raise
+            with open(path, "rb") as poster_file:
+                return poster_file.read()
+
+        with self._lock:
+            with open(path + ".tmp", "wb") as poster_file:
+                poster_file.write(poster)
+            # Replacing the file in one step means a reader never sees half of a poster
+            replace(path + ".tmp", path)
+            self.conn.execute("INSERT OR REPLACE INTO posters VALUES (?, ?, ?, ?)", (title_ID, len(poster), now, now))
+            self._evict_posters(now)
+
+        return poster
+
+    # Create function which deletes expired overviews and then the least recently used beyond max_overviews
+    def _evict_overviews(self, now):
+        self.conn.execute("DELETE FROM overviews WHERE fetched <= ?", (now - self.overview_ttl,))
+        self.conn.execute("""DELETE FROM overviews WHERE title_ID IN (
+                             SELECT title_ID FROM overviews ORDER BY accessed DESC LIMIT -1 OFFSET ?)""",
+                          (self.max_overviews,))
+
+    # Create function which deletes expired posters and then the least recently used until the rest fit in
+    # max_poster_bytes
+    def _evict_posters(self, now):
+        evicted = self.conn.execute("SELECT title_ID FROM posters WHERE fetched <= ?",
+                                    (now - self.poster_ttl,)).fetchall()
+
+        total_size = self.conn.execute("""SELECT COALESCE(SUM(size), 0) FROM posters
+                                       WHERE fetched > ?""", (now - self.poster_ttl,)).fetchone()[0]
+        if total_size > self.max_poster_bytes:
+            for title_ID, size in self.conn.execute("""SELECT title_ID, size FROM posters WHERE fetched > ?
+                                                    ORDER BY accessed""", (now - self.poster_ttl,)).fetchall():
+                evicted.append((title_ID,))
+                total_size -= size
+                if total_size <= self.max_poster_bytes:
+                    break
+
+        for title_ID, in evicted:
+            if isfile(self._poster_path(title_ID)):
+                remove(self._poster_path(title_ID))
+        self.conn.executemany("DELETE FROM posters WHERE title_ID = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+        self.client.close()
+
+# Looks up the overviews and posters of a list of movies through the cache on a bounded thread pool
+# Posters are decoded into PIL images on the pool too, leaving only the conversion to a Tk image for the GUI thread
+# Finished lookups are put on a queue, which the GUI reads with finished() since worker threads must not touch Tk
+class DetailsPrefetcher:
+    def __init__(self, cache, max_workers = PREFETCH_WORKERS):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "prefetch")
+        self.results = queue.Queue()
+        self.generation = 0
+        self.futures = []
+
+    # Create function which starts looking up every (key, IMDb_ID) pair, e.g. with movie_ID as the key
+    # Lookups of an earlier list that have not started yet are cancelled, and results of earlier lists are dropped
+    def prefetch(self, movies):
+        for future in self.futures:
+            future.cancel()
+
+        self.generation += 1
+        self.futures = [self.executor.submit(self._fetch, self.generation, key, IMDb_ID) for key, IMDb_ID in movies]
+
+    # Create function which runs on a worker thread and looks up one movie
+    # A failed lookup is left out, so that opening the movie later tries again and reports the error
+    def _fetch(self, generation, key, IMDb_ID):
+        if generation != self.generation:
+            return
+
+        try:
+            overview = self.cache.overview(IMDb_ID)
+            poster = Image.open(io.BytesIO(self.cache.poster(IMDb_ID, overview)))
+            poster.load()
+        except (requests.RequestException, KeyError, OSError):
+            return
+
+        self.results.put((generation, key, overview, poster))
+
+    # Create function which returns (key, overview, poster image) for the lookups of the latest list finished since
+    # the last call
+    def finished(self):
+        results = []
+        while not self.results.empty():
+            generation, key, overview, poster = self.results.get()
+            if generation == self.generation:
+                results.append((key, overview, poster))
+
+        return results
+
+    # Create function which checks whether any lookup of the latest list is still queued or running
+    def pending(self):
+        return any(not future.done() for future in self.futures)
+
+    def close(self):
+        self.executor.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from os.path import getmtime, isfile
+from timeit import default_timer
+
+# Predictions are made with the NumPy implementation of NeuMF so TensorFlow is not needed to recommend
+from NeuMF_inference import NeuMFInference
+from id_mapping import IDMapping
+
+# Default locations of the trained network and the database holding its ID mappings
+MODEL_PATH = "application data/encodings and saved model/trained_NeuMF.h5"
+DATABASE_PATH = "application data/database.db"
+
+class ModelCache:
+    def __init__(self, model_path = MODEL_PATH, database_path = DATABASE_PATH):
+        self.model_path = model_path
+        self.database_path = database_path
+
+        self._model = None
+        self._user_mapping = None
+        self._movie_mapping = None
+
+        # Modification time of the model file the cached objects were loaded from
+        self._loaded_mtime = None
+
+        # Lock so that a background thread and the GUI thread cannot load at the same time
+        self._lock = threading.Lock()
+
+        # Counters and timings which can be inspected to see how well the cache is working
+        self.hits = 0
+        self.misses = 0
+        self.load_times = []
+
+    # Create function which returns the modification time of the model file
+    # A file which does not exist yet is given a time of None
+    def _model_mtime(self):
+        return getmtime(self.model_path) if isfile(self.model_path) else None
+
+    # Create function which loads the trained network and both ID mappings
+    # The mappings are only append-only tables, so they are cut down to the rows the network has embeddings for,
+    # which leaves out IDs added by a training run that has not saved its network yet
+    def _load(self, mtime):
+        start = default_timer()
+
+        self._model = NeuMFInference.from_h5(self.model_path)
+        self._user_mapping = IDMapping.load(self.database_path, "user").prefix(self._model.num_users)
+        self._movie_mapping = IDMapping.load(self.database_path, "movie").prefix(self._model.num_items)
+
+        self._loaded_mtime = mtime
+        self.load_times.append(default_timer() - start)
+
+    # Create function which returns the trained network and ID mappings
+    # They are only loaded again if the model file has been rewritten since the last load
+    def get(self):
+        with self._lock:
+            mtime = self._model_mtime()
+
+            if self._model is None or mtime != self._loaded_mtime:
+                self.misses += 1
+                self._load(mtime)
+            else:
+                self.hits += 1
+
+            return self._model, self._user_mapping, self._movie_mapping
+
+    # Create function which drops the cached objects so that the next call to get() reloads them
+    def invalidate(self):
+        with self._lock:
+            self._model = None
+            self._user_mapping = None
+            self._movie_mapping = None
+            self._loaded_mtime = None
+
+    # Create function which summarises the cache counters and load timings
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "loads": len(self.load_times),
+                    "last_load_time": self.load_times[-1] if len(self.load_times) > 0 else None,
+                    "total_load_time": sum(self.load_times)}
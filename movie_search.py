@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+# Most results a search returns
+SEARCH_LIMIT = 100
+
+# A search word may be one edit away from a catalog word, plus one more edit for every TYPO_WORD_LENGTH characters
+TYPO_WORD_LENGTH = 6
+
+# Number of catalog words tried in place of each misspelt search word
+TYPO_CANDIDATES = 5
+
+# Each column's weight in the bm25 ranking, in the order title, genre, year
+BM25_WEIGHTS = (10.0, 2.0, 1.0)
+
+SEARCH_QUERY = """SELECT title, genre, year, rowid FROM movie_search
+                  WHERE movie_search MATCH ?
+                  ORDER BY bm25(movie_search, {}, {}, {}) LIMIT ?""".format(*BM25_WEIGHTS)
+
+# Create function which splits a search into lowercase words, the same way the unicode61 tokenizer does
+def search_tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+# Create function which builds an FTS5 query matching every token as a prefix
+# Tokens are quoted so that characters FTS5 treats as syntax are matched as text
+# Each entry of tokens is either one token or a list of alternatives for that word
+def fts_query(tokens, operator = "AND"):
+    terms = []
+    for token in tokens:
+        alternatives = token if isinstance(token, list) else [token]
+        terms.append("(" + " OR ".join('"{}"*'.format(alternative) for alternative in alternatives) + ")")
+
+    return " {} ".format(operator).join(terms)
+
+# Create function which returns the number of single-character insertions, deletions and substitutions
+# needed to turn one word into another
+def edit_distance(first, second):
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start = 1):
+        current = [i]
+        for j, second_char in enumerate(second, start = 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+
+    return previous[-1]
+
+# Create function which gives every token the closest catalog words as alternatives
+# A catalog word is close if it is within MAX_TYPOS edits per TYPO_WORD_LENGTH characters of the token, and the
+# closest and then most common words are kept
+# A token is kept as one of its own alternatives if some catalog word starts with it, and a token with no
+# alternatives is dropped so that a single bad word does not empty the results
+# Only catalog words with the same first letter and a similar length are compared, which keeps this fast
+def correct_tokens(db, tokens):
+    corrected = []
+    for token in tokens:
+        alternatives = []
+        if db.fetchone("SELECT 1 FROM movie_search_terms WHERE term >= ? AND term < ? LIMIT 1",
+                       (token, token + "\U0010ffff")) is not None:
+            alternatives.append(token)
+
+        max_distance = 1 + len(token) // TYPO_WORD_LENGTH
+        candidates = db.fetchall("""SELECT term, doc FROM movie_search_terms WHERE term >= ? AND term < ?
+                                 AND length(term) BETWEEN ? AND ?""",
+                                 (token[0], token[0] + "\U0010ffff", len(token) - max_distance,
+                                  len(token) + max_distance))
+
+        close = []
+        for term, documents in candidates:
+            distance = edit_distance(token, term)
+            if 0 < distance <= max_distance:
+                close.append((distance, -documents, term))
+        alternatives += [term for _, _, term in sorted(close)[:TYPO_CANDIDATES]]
+
+        if len(alternatives) > 0:
+            corrected.append(alternatives)
+
+    return corrected
+
+# Create function which searches movie titles, genres and years and returns (title, genre, year, movie_ID) rows
+# Results must match every word, in any order, with each word matching the start of a catalog word
+# When nothing matches, each word may also match the closest catalog words, so small typos are forgiven, and
+# failing that any one word may match
+# Rows are ranked by bm25 with the title weighted highest, and at most limit rows are returned
+def search_movies(db, text, limit = SEARCH_LIMIT):
+    tokens = search_tokens(text)
+    if len(tokens) == 0:
+        return []
+
+    records = db.fetchall(SEARCH_QUERY, (fts_query(tokens), limit))
+    if len(records) > 0:
+        return records
+
+    tokens = correct_tokens(db, tokens)
+    if len(tokens) == 0:
+        return []
+
+    records = db.fetchall(SEARCH_QUERY, (fts_query(tokens), limit))
+    if len(records) > 0 or len(tokens) == 1:
+        return records
+
+    return db.fetchall(SEARCH_QUERY, (fts_query(tokens, operator = "OR"), limit))
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+""" This script serves the recommender service as a local HTTP/JSON API, so
+that the recommender can be used by more than one client at a time and put
+under load, e.g.
+
+    python recommender_server.py --port 8000
+    curl -X POST localhost:8000/users -d '{"username": "alice"}'
+    curl "localhost:8000/users/alice/recommendations?genre=Comedy"
+
+The server runs on asyncio and hands every request to the service on a thread
+pool, so slow database reads or scoring never hold up other connections. The
+worker threads borrow sessions from the database's pool and share one model
+cache, so the network is loaded once however many requests use it.
+Recommendation requests which arrive within BATCH_WINDOW_SECONDS of each other
+are scored together in one pass of the network.
+
+    GET    /users/{username}                              user ID and whether the user is trained
+    POST   /users                                         create a user from {"username": ...}
+    PATCH  /users/{username}                              rename a user to {"username": ...}
+    DELETE /users/{username}
+    GET    /users/{username}/history
+    POST   /users/{username}/history                      add {"movie_ID": ...}
+    DELETE /users/{username}/history/{movie_ID}
+    POST   /users/{username}/history/finish               add the history to the training set
+    POST   /users/{username}/train                        fold in, or retrain fully with {"full_retrain": true}
+    GET    /users/{username}/recommendations              ?genre=...&ranking=sample are optional
+    GET    /users/{username}/bucket-list
+    POST   /users/{username}/bucket-list                  add {"movie_ID": ...}
+    DELETE /users/{username}/bucket-list/{movie_ID}
+    POST   /users/{username}/bucket-list/{movie_ID}/seen  move the movie to the history
+    GET    /movies?search=...
+    GET    /stats                                         request, batching and model cache counters
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import re
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from os import chdir
+from os.path import abspath, dirname, isfile, join
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# The training scripts are found next to this script wherever it is run from
+sys.path.append(join(dirname(abspath(__file__)), "architecture and training"))
+from recommender_service import RecommenderService, ServiceError, open_interactions
+from model_cache import ModelCache
+from data_access import Database
+from schema import DATABASE_PATH, migrate
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+
+# Number of threads, and pooled database sessions, which carry out requests
+SERVICE_WORKERS = 8
+
+# Seconds the first recommendation request of a batch waits for others to join it, and the most a batch holds
+BATCH_WINDOW_SECONDS = 0.005
+MAX_BATCH_SIZE = 64
+
+# Largest request body accepted
+MAX_BODY_BYTES = 65536
+
+# Names of the columns of the movie rows the service returns
+MOVIE_FIELDS = ("title", "genre", "year", "movie_ID")
+RECOMMENDATION_FIELDS = ("title", "genre", "year", "movie_ID", "IMDb_ID")
+
+# Collects full catalog recommendation requests and scores each batch with one call to recommend_many
+# Requests wait at most window seconds, or less once max_batch_size have arrived, and a batch is scored on the
+# executor while the next one gathers
+class RecommendBatcher:
+    def __init__(self, service, executor, window = BATCH_WINDOW_SECONDS, max_batch_size = MAX_BATCH_SIZE):
+        self.service = service
+        self.executor = executor
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self.flush_handle = None
+
+        # Counters which can be inspected to see how much batching is happening
+        self.batches = 0
+        self.batched_requests = 0
+
+    # Create function which returns the recommendations for one (username, genre) request once its batch is scored
+    async def recommend(self, username, genre):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(((username, genre), future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self.flush)
+
+        return await future
+
+    # Create function which starts scoring every pending request
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        batch, self.pending = self.pending, []
+        if len(batch) == 0:
+            return
+
+        self.batches += 1
+        self.batched_requests += len(batch)
+        scoring = asyncio.get_running_loop().run_in_executor(self.executor, self.service.recommend_many,
+                                                             [request for request, _ in batch])
+        scoring.add_done_callback(lambda scoring: self._deliver(batch, scoring))
+
+    # Create function which gives each request of a scored batch its own result or error
+    # A request whose client has gone away has a cancelled future and is skipped
+    def _deliver(self, batch, scoring):
+        error = scoring.exception()
+        results = [None] * len(batch) if error is not None else scoring.result()
+
+        for (_, future), result in zip(batch, results):
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif isinstance(result, ServiceError):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+# HTTP/1.1 server with keep-alive connections, routing each request to one of the handlers below
+# A handler is given the URL parameters, the query string and the JSON body, and returns (status, JSON payload)
+class RecommenderServer:
+    def __init__(self, service, workers = SERVICE_WORKERS, batch_window = BATCH_WINDOW_SECONDS,
+                 max_batch_size = MAX_BATCH_SIZE):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "service")
+        self.batcher = RecommendBatcher(service, self.executor, window = batch_window,
+                                        max_batch_size = max_batch_size)
+        self.requests_served = 0
+
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in (
+                       ("GET", "/users/(?P<username>[^/]+)", self.get_user),
+                       ("POST", "/users", self.create_user),
+                       ("PATCH", "/users/(?P<username>[^/]+)", self.rename_user),
+                       ("DELETE", "/users/(?P<username>[^/]+)", self.delete_user),
+                       ("GET", "/users/(?P<username>[^/]+)/history", self.get_history),
+                       ("POST", "/users/(?P<username>[^/]+)/history", self.add_to_history),
+                       ("DELETE", "/users/(?P<username>[^/]+)/history/(?P<movie_ID>[^/]+)", self.remove_from_history),
+                       ("POST", "/users/(?P<username>[^/]+)/history/finish", self.finish_history),
+                       ("POST", "/users/(?P<username>[^/]+)/train", self.train),
+                       ("GET", "/users/(?P<username>[^/]+)/recommendations", self.recommend),
+                       ("GET", "/users/(?P<username>[^/]+)/bucket-list", self.get_bucket_list),
+                       ("POST", "/users/(?P<username>[^/]+)/bucket-list", self.add_to_bucket_list),
+                       ("DELETE", "/users/(?P<username>[^/]+)/bucket-list/(?P<movie_ID>[^/]+)",
+                        self.remove_from_bucket_list),
+                       ("POST", "/users/(?P<username>[^/]+)/bucket-list/(?P<movie_ID>[^/]+)/seen",
+                        self.move_to_history),
+                       ("GET", "/movies", self.search),
+                       ("GET", "/stats", self.stats))]
+
+    # Create function which runs a blocking service call on the thread pool
+    async def call(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                functools.partial(function, *args, **kwargs))
+
+    async def get_user(self, params, query, body):
+        user_ID, trained = await self.call(self.service.login, params["username"])
+        return HTTPStatus.OK, {"username": params["username"], "user_ID": user_ID, "trained": trained == 1}
+
+    async def create_user(self, params, query, body):
+        user_ID = await self.call(self.service.create_user, str(body.get("username", "")))
+        return HTTPStatus.CREATED, {"username": body["username"], "user_ID": user_ID, "trained": False}
+
+    async def rename_user(self, params, query, body):
+        await self.call(self.service.rename_user, params["username"], str(body.get("username", "")))
+        return HTTPStatus.OK, {"username": body["username"]}
+
+    async def delete_user(self, params, query, body):
+        await self.call(self.service.delete_user, params["username"])
+        return HTTPStatus.OK, {}
+
+    async def get_history(self, params, query, body):
+        records = await self.call(self.service.history, params["username"])
+        return HTTPStatus.OK, {"movies": [dict(zip(MOVIE_FIELDS, record)) for record in records]}
+
+    async def add_to_history(self, params, query, body):
+        await self.call(self.service.add_to_history, params["username"], body.get("movie_ID"))
+        return HTTPStatus.CREATED, {"movie_ID": body["movie_ID"]}
+
+    async def remove_from_history(self, params, query, body):
+        await self.call(self.service.remove_from_history, params["username"], params["movie_ID"])
+        return HTTPStatus.OK, {}
+
+    async def finish_history(self, params, query, body):
+        await self.call(self.service.finish_history, params["username"])
+        return HTTPStatus.OK, {}
+
+    # Training takes minutes, so it holds one of the worker threads until it finishes
+    async def train(self, params, query, body):
+        saved = await self.call(self.service.train, params["username"], bool(body.get("full_retrain", False)))
+        return HTTPStatus.OK, {"trained": saved}
+
+    # Full catalog requests are batched, while a random sample is ranked on its own
+    async def recommend(self, params, query, body):
+        genre = query.get("genre", [None])[0]
+        if query.get("ranking", ["full"])[0] == "sample":
+            records = await self.call(self.service.recommend, params["username"], genre, full_catalog = False)
+        else:
+            records = await self.batcher.recommend(params["username"], genre)
+
+        return HTTPStatus.OK, {"movies": [dict(zip(RECOMMENDATION_FIELDS, record)) for record in records]}
+
+    async def get_bucket_list(self, params, query, body):
+        records = await self.call(self.service.bucket_list, params["username"])
+        return HTTPStatus.OK, {"movies": [dict(zip(MOVIE_FIELDS, record)) for record in records]}
+
+    async def add_to_bucket_list(self, params, query, body):
+        await self.call(self.service.add_to_bucket_list, params["username"], body.get("movie_ID"))
+        return HTTPStatus.CREATED, {"movie_ID": body["movie_ID"]}
+
+    async def remove_from_bucket_list(self, params, query, body):
+        await self.call(self.service.remove_from_bucket_list, params["username"], params["movie_ID"])
+        return HTTPStatus.OK, {}
+
+    async def move_to_history(self, params, query, body):
+        await self.call(self.service.move_to_history, params["username"], params["movie_ID"])
+        return HTTPStatus.OK, {}
+
+    async def search(self, params, query, body):
+        records = await self.call(self.service.search, query.get("search", [""])[0])
+        return HTTPStatus.OK, {"movies": [dict(zip(MOVIE_FIELDS, record)) for record in records]}
+
+    async def stats(self, params, query, body):
+        return HTTPStatus.OK, {"requests": self.requests_served,
+                               "recommend_batches": self.batcher.batches,
+                               "batched_requests": self.batcher.batched_requests,
+                               "model_cache": self.service.model_cache.stats()}
+
+    # Create function which finds the handler for a request and returns its (status, payload)
+    # A request the service refuses is answered with its ServiceError as {"error": title, "message": message}, and
+    # any other failure, such as a missing model, with a 500 in the same form
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method == method:
+                break
+        else:
+            if allowed:
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Method Not Allowed", "message": method}
+            return HTTPStatus.NOT_FOUND, {"error": "Not Found", "message": url.path}
+
+        try:
+            body = json.loads(body) if len(body) > 0 else {}
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "Invalid JSON", "message": "The request body is not JSON!"}
+        if not isinstance(body, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "Invalid JSON", "message": "The request body must be an object!"}
+
+        params = {name: unquote(value) for name, value in match.groupdict().items()}
+        try:
+            return await handler(params, parse_qs(url.query), body)
+        except ServiceError as error:
+            return HTTPStatus(error.status), {"error": error.title, "message": error.message}
+        except Exception as error:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": type(error).__name__, "message": str(error)}
+
+    # Create function which serves every request sent on one connection until the client closes it
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if len(request_line) == 0:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request Too Large",
+                                                                            "message": "The request body is too large!"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    status, payload = await self.dispatch(method, target, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                self.requests_served += 1
+                response = json.dumps(payload).encode("utf-8")
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status.value, status.phrase, len(response),
+                                                             "keep-alive" if keep_alive else "close")
+                             .encode("latin-1") + response)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Create function which serves connections on host and port until the task is cancelled
+    # started, if given, is called with the listening asyncio server, e.g. to read the port it was given
+    async def serve(self, host = SERVER_HOST, port = SERVER_PORT, started = None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if started is not None:
+            started(server)
+
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+if __name__ == "__main__":
+    # Set working directory to folder which contains this script, as the application does
+    chdir(dirname(abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description = "Serve the movie recommender as a local HTTP/JSON API")
+    parser.add_argument("--host", default = SERVER_HOST)
+    parser.add_argument("--port", type = int, default = SERVER_PORT)
+    parser.add_argument("--workers", type = int, default = SERVICE_WORKERS,
+                        help = "threads and database sessions carrying out requests")
+    args = parser.parse_args()
+
+    if not isfile(DATABASE_PATH):
+        parser.error("{} does not exist yet, build it with bootstrap.py or by starting application.py".format(
+                     DATABASE_PATH))
+    migrate()
+
+    database = Database(pool_size = args.workers)
+    service = RecommenderService(database, ModelCache(), open_interactions(DATABASE_PATH))
+    server = RecommenderServer(service, workers = args.workers)
+
+    print("Serving on http://{}:{}".format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        database.close()
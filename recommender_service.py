@@ -0,0 +1,663 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds everything the recommender does, without any user
+interface: creating users, editing their histories and bucket lists, training
+NeuMF and recommending movies. The Tk application and the HTTP server in
+recommender_server.py are both clients of a RecommenderService. Every method
+borrows a pooled database session, so the service can be called from any
+thread, and the writes which must happen together run in one transaction.
+Requests which cannot be carried out raise ServiceError with the title and
+message shown to the user.
+
+recommend_many recommends movies for several users with one scoring pass of
+the network, which the server uses to serve requests arriving together."""
+
+import threading
+
+import numpy as np
+
+from os.path import isfile, join
+
+from NeuMF_inference import write_user_embeddings
+from model_cache import MODEL_PATH
+from id_mapping import IDMapping
+from interaction_store import InteractionStore, export_database
+from negative_sampling import sample_unseen, append_user_samples
+from bootstrap import INTERACTIONS_FOLDER, TRAIN_SET_MAX_USER_ID
+from movie_search import search_movies
+
+# Number of movies a history needs before it can be added to the training set
+MIN_HISTORY_SIZE = 20
+
+# Number of epochs for a full retrain which starts from the previous network rather than random weights
+WARM_START_EPOCHS = 2
+
+# When True only positive samples are stored in train_set and negatives are drawn afresh for every batch
+# When False negatives are written to train_set alongside the positives, as in the prepared datasets
+SAMPLE_NEGATIVES_ON_THE_FLY = True
+
+# Number of negative samples per positive sample
+NEGATIVE_RATIO = 4
+
+# Number of movies recommended to a user
+RECOMMEND_TOP_K = 10
+
+# Error raised for a request which cannot be carried out, e.g. an unknown username or a movie already in a list
+# title and message are shown to the user, and status is the HTTP status the server answers with
+class ServiceError(Exception):
+    def __init__(self, title, message, status = 400):
+        Exception.__init__(self, message)
+        self.title = title
+        self.message = message
+        self.status = status
+
+# Error raised when a user cannot be folded into the existing network, so only a full retrain can train them
+# It is left to the caller to start the full retrain, since that takes minutes rather than seconds
+class FullRetrainNeeded(ServiceError):
+    def __init__(self, message):
+        ServiceError.__init__(self, "Full Retrain Needed", message, status = 409)
+
+# Return the indices of the k highest scores in descending order of score
+# np.argpartition finds the top k in linear time so only those k values need a full sort
+def top_k_indices(scores, k):
+    k = min(k, scores.shape[0])
+    if k == 0:
+        return np.array([], dtype = np.int64)
+
+    top_k = np.argpartition(-scores, k - 1)[0:k]
+
+    return top_k[np.argsort(-scores[top_k], kind = "stable")]
+
+# Create function which opens the interaction store of the dataset's users, exporting it from the database if there
+# is none yet
+# bootstrap.py saves the store when it builds the database, so it only has to be exported for a database built
+# before the store existed
+# The dataset's rows never change, while rows of users created in the application stay in the database
+def open_interactions(database_path, folder = INTERACTIONS_FOLDER):
+    if not isfile(join(folder, "indptr.npy")):
+        export_database(database_path, folder, max_user_ID = TRAIN_SET_MAX_USER_ID)
+
+    return InteractionStore.open(folder)
+
+# interactions is the interaction store of the dataset's users, or None until it has been opened, in which case the
+# rows it would give are read from train_set instead
+class RecommenderService:
+    def __init__(self, database, model_cache, interactions = None, model_path = MODEL_PATH):
+        self.database = database
+        self.model_cache = model_cache
+        self.interactions = interactions
+        self.model_path = model_path
+
+        # Training rewrites the model file, so only one run may happen at a time
+        self._training_lock = threading.Lock()
+
+    # Create function which returns the (user_ID, trained) of a username
+    def _user(self, db, username):
+        record = db.fetchone("SELECT username, user_ID, trained FROM user_info WHERE username = ?", (username,))
+        if record is None:
+            raise ServiceError("Invalid Username", "That username does not exist!", status = 404)
+
+        return record[1], record[2]
+
+    # Create function which turns a movie ID given as text or a number into an int
+    def _movie_ID(self, movie_ID):
+        if movie_ID is None or movie_ID == "":
+            raise ServiceError("Invalid Movie ID", "You did not enter a movie ID!")
+
+        try:
+            return int(movie_ID)
+        except (TypeError, ValueError):
+            raise ServiceError("Invalid Movie ID", "A movie ID must be a whole number!")
+
+    # Create function which returns the title of a movie, checking that it exists in movie_info
+    def _movie_title(self, db, movie_ID):
+        record = db.fetchone("SELECT title FROM movie_info WHERE movie_ID = ?", (movie_ID,))
+        if record is None:
+            raise ServiceError("Invalid Movie ID", "That movie ID does not exist in our records!", status = 404)
+
+        return record[0]
+
+    # Create function which returns (user_ID, trained) for a username
+    def login(self, username):
+        if username == "":
+            raise ServiceError("Invalid Username", "You did not enter a username!")
+
+        with self.database.worker() as db:
+            return self._user(db, username)
+
+    # Create function which creates a user and returns their user ID
+    # The name is checked and the highest user ID read in the same transaction as the insert, so two users can
+    # share neither
+    def create_user(self, username):
+        if username == "":
+            raise ServiceError("Invalid Username", "You cannot enter an empty username!")
+
+        with self.database.worker() as session, session.transaction() as db:
+            if db.fetchone("SELECT * FROM user_info WHERE username = ?", (username,)) is not None:
+                raise ServiceError("Invalid Username", "That username is already taken!", status = 409)
+
+            max_user_ID = db.fetchone("SELECT MAX(user_ID) FROM user_info")[0]
+            user_ID = TRAIN_SET_MAX_USER_ID + 1 if max_user_ID is None else max_user_ID + 1
+
+            db.execute("INSERT INTO user_info VALUES (:username, :user_ID, :trained)",
+                       {
+                       "username": username,
+                       "user_ID": user_ID,
+                       "trained": 0
+                       })
+
+        return user_ID
+
+    # Create function which renames a user in every table together so a failure cannot leave the tables disagreeing
+    def rename_user(self, username, new_username):
+        if username == "" or new_username == "":
+            raise ServiceError("Invalid Username", "You must enter both the username and the new username!")
+
+        with self.database.worker() as session, session.transaction() as db:
+            self._user(db, username)
+            if db.fetchone("SELECT * FROM user_info WHERE username = ?", (new_username,)) is not None:
+                raise ServiceError("Invalid New Username", "The new username already exists!", status = 409)
+
+            db.execute("""UPDATE user_info SET username = ?
+                          WHERE username = ?""", (new_username, username))
+
+            db.execute("""UPDATE user_history SET username = ?
+                          WHERE username = ?""", (new_username, username))
+
+            db.execute("""UPDATE user_bucket_list SET username = ?
+                          WHERE username = ?""", (new_username, username))
+
+    # Create function which deletes a user along with their history, bucket list and training samples
+    def delete_user(self, username):
+        if username == "":
+            raise ServiceError("Invalid Username", "You must enter a username!")
+
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, _ = self._user(db, username)
+
+            db.execute("DELETE FROM user_info WHERE username = ?", (username,))
+            db.execute("DELETE FROM user_history WHERE username = ?", (username,))
+            db.execute("DELETE FROM user_bucket_list WHERE username = ?", (username,))
+            db.execute("DELETE FROM train_set WHERE user_ID = ?", (user_ID,))
+
+    # Create function which returns the (title, genre, year, movie_ID) rows of a user's history sorted by title
+    def history(self, username):
+        with self.database.worker() as db:
+            self._user(db, username)
+            return db.fetchall("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
+                               INNER JOIN user_history ON movie_info.movie_ID = user_history.movie_ID
+                               WHERE user_history.username = ? ORDER BY title""", (username,))
+
+    # Create function which returns the number of movies in a user's history
+    def history_size(self, username):
+        with self.database.worker() as db:
+            return db.fetchone("SELECT COUNT(*) FROM user_history WHERE username = ?", (username,))[0]
+
+    # Create function which checks that a movie is, or is not, in a user's history and returns the user's ID and
+    # the movie's title
+    def _check_history(self, db, username, movie_ID, in_history):
+        user_ID, _ = self._user(db, username)
+        found = db.fetchone("SELECT * FROM user_history WHERE username = ? AND movie_ID = ?",
+                            (username, movie_ID)) is not None
+        if found and not in_history:
+            raise ServiceError("Invalid Movie ID", "That movie is already in your history!", status = 409)
+        if in_history and not found:
+            raise ServiceError("Invalid Movie ID", "That movie is not in your history!", status = 404)
+
+        return user_ID, self._movie_title(db, movie_ID)
+
+    # Create function which adds a movie to a user's history
+    # confirm, if given, is called with the movie's title once the request has been checked, and nothing is written
+    # unless it returns True
+    # Returns whether the movie was added
+    def add_to_history(self, username, movie_ID, confirm = None):
+        movie_ID = self._movie_ID(movie_ID)
+        with self.database.worker() as db:
+            _, movie_title = self._check_history(db, username, movie_ID, in_history = False)
+
+        if confirm is not None and not confirm(movie_title):
+            return False
+
+        # The request is checked again, as another client may have changed the history while the user confirmed it
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, _ = self._check_history(db, username, movie_ID, in_history = False)
+
+            db.execute("INSERT OR IGNORE INTO user_history VALUES (:username, :user_ID, :movie_ID)",
+                       {
+                          "username": username,
+                          "user_ID": user_ID,
+                          "movie_ID": movie_ID
+                       })
+
+        return True
+
+    # Create function which removes a movie from a user's history and training samples
+    # confirm works as in add_to_history, and the function returns whether the movie was removed
+    def remove_from_history(self, username, movie_ID, confirm = None):
+        movie_ID = self._movie_ID(movie_ID)
+        with self.database.worker() as db:
+            _, movie_title = self._check_history(db, username, movie_ID, in_history = True)
+
+        if confirm is not None and not confirm(movie_title):
+            return False
+
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, _ = self._check_history(db, username, movie_ID, in_history = True)
+
+            db.execute("DELETE FROM user_history WHERE user_ID = ? AND movie_ID = ?", (user_ID, movie_ID))
+            db.execute("DELETE FROM train_set WHERE user_ID = ? AND movie_ID = ?", (user_ID, movie_ID))
+
+        return True
+
+    # Create function which adds a user's history to the training set once it holds at least MIN_HISTORY_SIZE movies
+    # Only movies not already in the training set are added, and the user must then be trained again
+    def finish_history(self, username):
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, _ = self._user(db, username)
+            history_IDs = np.array([movie[0] for movie in db.fetchall(
+                                    "SELECT movie_ID FROM user_history WHERE username = ?", (username,))],
+                                   dtype = np.int64)
+
+            if history_IDs.shape[0] < MIN_HISTORY_SIZE:
+                raise ServiceError("Invalid History Size",
+                                   "You must add at least {} movies to your history!".format(MIN_HISTORY_SIZE))
+
+            # Append new positive samples, and negative samples unless they are drawn during training
+            train_set_movie_IDs = np.array([movie[0] for movie in db.fetchall(
+                                            "SELECT movie_ID FROM train_set WHERE user_ID = ?", (user_ID,))],
+                                           dtype = np.int64)
+            movie_IDs = np.setdiff1d(history_IDs, train_set_movie_IDs)
+
+            # Negatives must not repeat any movie already stored for the user, as (user_ID, movie_ID) is a key
+            append_user_samples(db, user_ID, movie_IDs, np.union1d(history_IDs, train_set_movie_IDs),
+                                ratio = 0 if SAMPLE_NEGATIVES_ON_THE_FLY else NEGATIVE_RATIO,
+                                rng = np.random.default_rng())
+
+            db.execute("UPDATE user_info SET trained = 0 WHERE username = ?", (username,))
+
+    # Create function which returns the (title, genre, year, movie_ID) rows of a user's bucket list sorted by title
+    def bucket_list(self, username):
+        with self.database.worker() as db:
+            self._user(db, username)
+            return db.fetchall("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
+                               INNER JOIN user_bucket_list ON movie_info.movie_ID = user_bucket_list.movie_ID
+                               WHERE user_bucket_list.username = ? ORDER BY title""", (username,))
+
+    # Create function which checks that a movie is, or is not, in a user's bucket list and returns the user's ID
+    # and the movie's title
+    def _check_bucket_list(self, db, username, movie_ID, in_bucket_list):
+        user_ID, trained = self._user(db, username)
+        found = db.fetchone("SELECT username, movie_ID FROM user_bucket_list WHERE username = ? AND movie_ID = ?",
+                            (username, movie_ID)) is not None
+        if found and not in_bucket_list:
+            raise ServiceError("Invalid Movie ID", "That movie is already in your bucket list!", status = 409)
+        if in_bucket_list and not found:
+            raise ServiceError("Invalid Movie ID", "That movie ID is not in your bucket list!", status = 404)
+
+        return user_ID, self._movie_title(db, movie_ID)
+
+    # Create function which saves a recommended movie to a user's bucket list, which needs a trained network
+    # confirm works as in add_to_history, and the function returns whether the movie was added
+    def add_to_bucket_list(self, username, movie_ID, confirm = None):
+        movie_ID = self._movie_ID(movie_ID)
+        with self.database.worker() as db:
+            if self._user(db, username)[1] == 0:
+                raise ServiceError("Training Error", "You have not trained the NeuMF network on your history yet!",
+                                   status = 409)
+            _, movie_title = self._check_bucket_list(db, username, movie_ID, in_bucket_list = False)
+
+        if confirm is not None and not confirm(movie_title):
+            return False
+
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, _ = self._check_bucket_list(db, username, movie_ID, in_bucket_list = False)
+
+            db.execute("INSERT OR IGNORE INTO user_bucket_list VALUES (:username, :user_ID, :movie_ID)",
+                       {
+                          "username": username,
+                          "user_ID": user_ID,
+                          "movie_ID": movie_ID
+                       })
+
+        return True
+
+    # Create function which removes a movie from a user's bucket list and returns its title
+    def remove_from_bucket_list(self, username, movie_ID):
+        movie_ID = self._movie_ID(movie_ID)
+        with self.database.worker() as session, session.transaction() as db:
+            _, movie_title = self._check_bucket_list(db, username, movie_ID, in_bucket_list = True)
+
+            db.execute("DELETE FROM user_bucket_list WHERE username = ? AND movie_ID = ?", (username, movie_ID))
+
+        return movie_title
+
+    # Create function which moves a movie from a user's bucket list to their history in one transaction and returns
+    # its title
+    # The movie may already be in the history, in which case it is only removed from the bucket list
+    def move_to_history(self, username, movie_ID):
+        movie_ID = self._movie_ID(movie_ID)
+        with self.database.worker() as session, session.transaction() as db:
+            user_ID, movie_title = self._check_bucket_list(db, username, movie_ID, in_bucket_list = True)
+
+            db.execute("DELETE FROM user_bucket_list WHERE username = ? AND movie_ID = ?", (username, movie_ID))
+
+            db.execute("INSERT OR IGNORE INTO user_history VALUES (:username, :user_ID, :movie_ID)",
+                       {
+                          "username": username,
+                          "user_ID": user_ID,
+                          "movie_ID": movie_ID
+                       })
+
+            db.execute("UPDATE user_info SET trained = 0 WHERE username = ?", (username,))
+
+        return movie_title
+
+    # Create function which checks that a user can be trained, i.e. their latest history is in the training set
+    # and has not been trained on yet
+    def check_training(self, username):
+        with self.database.worker() as db:
+            user_ID, trained = self._user(db, username)
+            if trained == 1:
+                raise ServiceError("Training Error",
+                                   "The NeuMF network has already been trained with your current history. " +
+                                   "To enable training, add more movies to your history and then click 'Finish'.",
+                                   status = 409)
+
+            if len(db.fetchall("SELECT * FROM train_set WHERE user_ID = ?", (user_ID,))) == 0:
+                raise ServiceError("Training Error",
+                                   "Your history has not been added to the training set. Return to 'Edit " +
+                                   "History' and click 'Finish'.", status = 409)
+
+        return user_ID
+
+    # Create function which trains NeuMF on a user's history
+    # By default the user is folded into the existing network, which only fits that user's embedding vectors
+    # A full retrain fits every weight again on the whole training set, reporting progress through progress_queue
+    # and stopping at the end of a batch once cancel_event is set
+    # Returns False if training was cancelled, in which case the previous model and encodings are kept
+    # Raises FullRetrainNeeded if the user cannot be folded in, without training anything
+    def train(self, username, full_retrain = False, progress_queue = None, cancel_event = None):
+        user_ID = self.check_training(username)
+
+        if not self._training_lock.acquire(blocking = False):
+            raise ServiceError("Training Error", "The NeuMF network is already training!", status = 409)
+
+        try:
+            if full_retrain:
+                if not self._full_retrain(progress_queue, cancel_event):
+                    return False
+            else:
+                self._fold_in(user_ID)
+
+            # The network and encodings have been rewritten, so the cached copies must be reloaded
+            self.model_cache.invalidate()
+            with self.database.worker() as db:
+                db.execute("UPDATE user_info SET trained = 1 WHERE username = ?", (username,))
+
+            return True
+        finally:
+            self._training_lock.release()
+
+    # Create function which retrains NeuMF on the whole training set
+    # The NeuMF architecture and training functions import TensorFlow, so they are imported when training starts
+    def _full_retrain(self, progress_queue, cancel_event):
+        from NeuMF_architecture import NeuMF
+        from training_and_evaluation import train, NegativeSamplingSequence
+        from streaming_data import sqlite_dataset, distinct_IDs
+
+        database_path = self.database.database_path
+
+        # Give any new user IDs and movie IDs the next rows of the append-only mappings
+        # Existing IDs keep their rows, so the previous network can be used as a warm start without remapping
+        user_mapping = IDMapping.load(database_path, "user")
+        user_mapping.extend(database_path, distinct_IDs(database_path, "user_ID"))
+
+        # Without stored negatives some movies may have no rows in train_set, so the whole catalog is mapped
+        movie_mapping = IDMapping.load(database_path, "movie")
+        movie_mapping.extend(database_path,
+                             distinct_IDs(database_path, "movie_ID",
+                                          table = "movie_info" if SAMPLE_NEGATIVES_ON_THE_FLY else "train_set"))
+
+        warm_start = isfile(self.model_path)
+
+        if SAMPLE_NEGATIVES_ON_THE_FLY:
+            # Only the positives are loaded and negatives are drawn for every batch
+            # The dataset's positives are memory-mapped from the interaction store, and only the rows of users
+            # created in the application are read from the database, unless the store is not open yet
+            interactions = self.interactions
+            with self.database.worker() as db:
+                if interactions is None:
+                    store_users, store_movies = np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+                    app_rows = db.fetchall("SELECT user_ID, movie_ID FROM train_set WHERE interaction = 1")
+                else:
+                    store_users, store_movies, _ = interactions.where_label(1)
+                    app_rows = db.fetchall("SELECT user_ID, movie_ID FROM train_set WHERE user_ID > ? " +
+                                           "AND interaction = 1", (TRAIN_SET_MAX_USER_ID,))
+            app_rows = np.array(app_rows, dtype = np.int64).reshape(-1, 2)
+
+            train_dataset = NegativeSamplingSequence(np.concatenate([user_mapping.encode(store_users),
+                                                                     user_mapping.encode(app_rows[:, 0])]),
+                                                     np.concatenate([movie_mapping.encode(store_movies),
+                                                                     movie_mapping.encode(app_rows[:, 1])]),
+                                                     num_users = len(user_mapping), num_items = len(movie_mapping),
+                                                     batch_size = 8192, ratio = NEGATIVE_RATIO)
+            steps_per_epoch = None
+        else:
+            # Stream train_set from the database in encoded, shuffled batches so memory use stays flat
+            train_dataset, steps_per_epoch = sqlite_dataset(database_path, user_mapping.lookup, movie_mapping.lookup,
+                                                            batch_size = 8192)
+
+        # A cancelled run leaves the previous network in place, and the mappings only gained rows it does not use
+        return train(model = NeuMF(num_users = len(user_mapping), num_items = len(movie_mapping),
+                                   gmf_embedding_dim = 16, mlp_embedding_dim = 16),
+                     x_train = train_dataset, y_train = None, steps_per_epoch = steps_per_epoch,
+                     batch_size = 8192, epochs = WARM_START_EPOCHS if warm_start else 5, lr = 0.0001,
+                     save_name = "trained_NeuMF", save_model_path = "application data/encodings and saved model",
+                     warm_start_path = self.model_path if warm_start else None,
+                     progress_queue = progress_queue, cancel_event = cancel_event)
+
+    # Create function which fits only one user's embedding vectors, keeping every other weight of the existing
+    # network frozen
+    # The vectors are fitted without changing the cached network, which may be serving recommendations, and saved
+    # to the model file, after which the cache loads the new file
+    def _fold_in(self, user_ID):
+        if not isfile(self.model_path):
+            raise FullRetrainNeeded("There is no trained NeuMF network to add you to yet, so the whole network " +
+                                    "has to be trained.")
+
+        trained_NeuMF, user_mapping, movie_mapping = self.model_cache.get()
+
+        with self.database.worker() as db:
+            user_rows = np.array(db.fetchall("SELECT movie_ID, interaction FROM train_set WHERE user_ID = ?",
+                                             (user_ID,)))
+
+        # Movies without an embedding in the existing network can only be learned by a full retrain
+        user_rows = user_rows[movie_mapping.contains(user_rows[:, 0])]
+        if user_rows.shape[0] == 0:
+            raise FullRetrainNeeded("None of the movies in your history are known to the NeuMF network yet, so " +
+                                    "the whole network has to be retrained.")
+
+        movies = movie_mapping.encode(user_rows[:, 0])
+        labels = user_rows[:, 1]
+
+        # Draw negatives for this user from every movie they have not seen
+        if SAMPLE_NEGATIVES_ON_THE_FLY:
+            positives = movies[labels == 1]
+            negatives = sample_unseen(np.arange(len(movie_mapping)), positives,
+                                      positives.shape[0] * NEGATIVE_RATIO, np.random.default_rng())
+            movies = np.concatenate([positives, negatives])
+            labels = np.concatenate([np.ones(positives.shape[0]), np.zeros(negatives.shape[0])])
+
+        # An existing user keeps their row
+        user_index = int(user_mapping.encode(user_ID))
+        if user_index >= 0:
+            gmf_vector, mlp_vector = trained_NeuMF.fold_in_user(user_index, movies, labels)
+            write_user_embeddings(self.model_path, user_index, gmf_vector, mlp_vector)
+            return
+
+        # A new user takes the next row of the mapping, which is only the next row of the network if no unsaved
+        # full retrain has given out rows before it
+        full_user_mapping = IDMapping.load(self.database.database_path, "user")
+        if len(full_user_mapping) != trained_NeuMF.num_users:
+            raise FullRetrainNeeded("Users have been added since the NeuMF network was last trained, so the " +
+                                    "whole network has to be retrained to add you.")
+
+        user_index = trained_NeuMF.num_users
+        gmf_vector, mlp_vector = trained_NeuMF.fold_in_user(user_index, movies, labels)
+
+        # The mapping row is only committed once the network has been saved with the user's vectors
+        # Rows another connection added while the vectors were fitted are read first, and move the user's row
+        with full_user_mapping.extending(self.database.database_path, [user_ID]):
+            if len(full_user_mapping) != user_index:
+                raise FullRetrainNeeded("Users have been added since the NeuMF network was last trained, so the " +
+                                        "whole network has to be retrained to add you.")
+
+            write_user_embeddings(self.model_path, user_index, gmf_vector, mlp_vector)
+
+    # Create function which returns the movie IDs in movie_info, or those of one genre
+    def _catalog(self, db, genre):
+        if genre is None:
+            records = db.fetchall("SELECT movie_ID FROM movie_info")
+        else:
+            records = db.fetchall("SELECT movie_ID FROM movie_info WHERE genre LIKE ?", ("%" + genre + "%",))
+
+        return np.array([record[0] for record in records], dtype = np.int64)
+
+    # Create function which returns (title, genre, year, movie_ID, IMDb_ID) rows for a list of movie IDs
+    def _movie_records(self, db, movie_IDs):
+        return [db.fetchone("""SELECT title, genre, year, movie_ID, IMDb_ID FROM movie_info
+                            WHERE movie_ID = ?""", (int(ID),)) for ID in movie_IDs]
+
+    # Create function which returns the row of the network for a user
+    # A user who is marked as trained can still be missing from the network, e.g. when the model was replaced by a
+    # full retrain which did not include them, and encoding them as -1 would score them as the network's last user
+    def _user_index(self, user_mapping, user_ID):
+        user_index = int(user_mapping.encode(user_ID))
+        if user_index < 0:
+            raise ServiceError("Training Error", "The NeuMF network has not been trained on your history yet!",
+                               status = 409)
+
+        return user_index
+
+    # Create function which recommends RECOMMEND_TOP_K movies to a user as (title, genre, year, movie_ID, IMDb_ID)
+    # rows, optionally only movies of one genre
+    # The full catalog is ranked unless full_catalog is False, in which case a random sample of unseen movies is
+    def recommend(self, username, genre = None, full_catalog = True):
+        if not full_catalog:
+            return self._recommend_random_sample(username, genre)
+
+        result = self.recommend_many([(username, genre)])[0]
+        if isinstance(result, ServiceError):
+            raise result
+
+        return result
+
+    # Create function which recommends movies for a list of (username, genre) requests with one scoring pass
+    # Every user's candidates are scored together, and movies each user has seen are masked out before their exact
+    # top k is selected
+    # The result for each request is either its rows or the ServiceError it failed with, so one bad request does
+    # not fail the others
+    def recommend_many(self, requests):
+        trained_NeuMF, user_mapping, movie_mapping = self.model_cache.get()
+        interactions = self.interactions
+
+        results = [None] * len(requests)
+        candidates = []
+        catalogs = {}
+        with self.database.worker() as db:
+            for i, (username, genre) in enumerate(requests):
+                try:
+                    user_ID, trained = self._user(db, username)
+                    if trained == 0:
+                        raise ServiceError("Training Error",
+                                           "You have not trained the NeuMF network on your history yet!",
+                                           status = 409)
+
+                    user_index = self._user_index(user_mapping, user_ID)
+                except ServiceError as error:
+                    results[i] = error
+                    continue
+
+                # Only movies with an embedding in the trained network can be scored
+                if genre not in catalogs:
+                    catalog_movie_IDs = self._catalog(db, genre)
+                    catalog_movie_IDs = catalog_movie_IDs[movie_mapping.contains(catalog_movie_IDs)]
+                    catalogs[genre] = (catalog_movie_IDs, movie_mapping.encode(catalog_movie_IDs))
+
+                # The movies a user has seen are their positives in the interaction store, which holds the
+                # dataset's users, and their history, which holds every movie added in the application
+                # Until the store is open the positives are read from train_set instead
+                history_movie_IDs = [record[0] for record in db.fetchall(
+                                     "SELECT movie_ID FROM user_history WHERE username = ?", (username,))]
+                if interactions is None:
+                    stored_movie_IDs = np.array([record[0] for record in db.fetchall(
+                                                 "SELECT movie_ID FROM train_set WHERE user_ID = ? AND interaction = 1",
+                                                 (user_ID,))], dtype = np.int64)
+                else:
+                    stored_movie_IDs = interactions.items(user_ID, label = 1)
+                seen_movie_IDs = np.union1d(stored_movie_IDs, np.array(history_movie_IDs, dtype = np.int64))
+
+                candidates.append((i, user_index, genre, seen_movie_IDs))
+
+            if len(candidates) > 0:
+                # Score every user's candidates in one batched NumPy pass
+                users = np.concatenate([np.full(catalogs[genre][1].shape[0], user_index)
+                                        for _, user_index, genre, _ in candidates])
+                movies = np.concatenate([catalogs[genre][1] for _, _, genre, _ in candidates])
+                preds = trained_NeuMF.score(users, movies)
+
+                start = 0
+                for i, _, genre, seen_movie_IDs in candidates:
+                    catalog_movie_IDs = catalogs[genre][0]
+                    user_preds = preds[start:start + catalog_movie_IDs.shape[0]]
+                    start += catalog_movie_IDs.shape[0]
+
+                    # Remove seen movies from the ranking
+                    user_preds[np.isin(catalog_movie_IDs, seen_movie_IDs)] = -np.inf
+                    top_k = top_k_indices(user_preds, RECOMMEND_TOP_K)
+                    top_k = top_k[np.isfinite(user_preds[top_k])]
+
+                    results[i] = self._movie_records(db, catalog_movie_IDs[top_k])
+
+        return results
+
+    # Create function which ranks a random selection of unseen movies
+    # Kept so that the full catalog ranking can be compared against the original sampling approach
+    def _recommend_random_sample(self, username, genre):
+        with self.database.worker() as db:
+            user_ID, trained = self._user(db, username)
+            if trained == 0:
+                raise ServiceError("Training Error", "You have not trained the NeuMF network on your history yet!",
+                                   status = 409)
+
+            if genre is None:
+                records = db.fetchall("""SELECT movie_ID FROM movie_info
+                                      WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
+                                      ORDER BY RANDOM() LIMIT 100""", (user_ID,))
+            else:
+                records = db.fetchall("""SELECT movie_ID FROM movie_info
+                                      WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
+                                      AND genre LIKE ?
+                                      ORDER BY RANDOM() LIMIT 100""", (user_ID, "%" + genre + "%"))
+
+            movie_IDs_100 = np.array([record[0] for record in records], dtype = np.int64)
+
+            # Fetch the trained NeuMF network and ID mappings from the cache
+            trained_NeuMF, user_mapping, movie_mapping = self.model_cache.get()
+
+            # Encode user_ID and movie_IDs with the mappings used for training
+            movie_IDs_100 = movie_mapping.encode(movie_IDs_100[movie_mapping.contains(movie_IDs_100)])
+            user_ID_100 = np.full(movie_IDs_100.shape[0], self._user_index(user_mapping, user_ID))
+
+            # Make predictions for interactions with movies
+            preds = trained_NeuMF.score(user_ID_100, movie_IDs_100)
+
+            # Sort movies by confidence of interaction and then decode to get original movie IDs
+            top10_movie_IDs = movie_IDs_100[top_k_indices(preds, RECOMMEND_TOP_K)]
+
+            return self._movie_records(db, movie_mapping.decode(top10_movie_IDs))
+
+    # Create function which searches movie titles, genres and years and returns (title, genre, year, movie_ID) rows
+    def search(self, text):
+        with self.database.worker() as db:
+            return search_movies(db, text)
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds the schema of the application database. Each migration
+upgrades the database by one version, recorded in PRAGMA user_version, so an
+existing database.db is brought up to date the next time the application
+starts. Running this script checks the query plan of every query the
+application makes and fails if any of them scans a whole table that it should
+be searching through an index, or if a query in the application's source is
+missing from the list being checked."""
+
+import ast
+import sqlite3 as sql
+import tempfile
+
+from os.path import abspath, dirname, join
+
+DATABASE_PATH = "application data/database.db"
+
+# Pragmas applied to every connection
+# WAL lets the GUI read while a training thread writes, and NORMAL sync is safe with WAL
+CONNECTION_PRAGMAS = {"synchronous": "NORMAL",
+                      "cache_size": -65536,
+                      "temp_store": "MEMORY",
+                      "mmap_size": 268435456}
+
+# Create function which opens a connection to the database with the tuned pragmas
+def connect_database(database_path = DATABASE_PATH, **kwargs):
+    conn = sql.connect(database_path, **kwargs)
+    for pragma, value in CONNECTION_PRAGMAS.items():
+        conn.execute("PRAGMA {} = {}".format(pragma, value))
+
+    return conn
+
+# Create function which deletes all but one row of every group of rows sharing the same key
+# The row kept is the first in keep_order, e.g. the positive sample when both a positive and negative exist
+def _deduplicate(c, table, key_columns, keep_order = "rowid"):
+    c.execute("""DELETE FROM {table} WHERE rowid IN (
+                 SELECT rowid FROM (
+                 SELECT rowid, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {order}) AS row_number
+                 FROM {table})
+                 WHERE row_number > 1)""".format(table = table, key = ", ".join(key_columns), order = keep_order))
+
+# Migration 1: the tables made by the original create_database
+def _create_tables(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS user_info(
+                 username VARCHAR(20) PRIMARY KEY,
+                 user_ID INT,
+                 trained INT
+                 )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS user_history(
+                 username VARCHAR(20),
+                 user_ID INT,
+                 movie_ID INT
+                 )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS user_bucket_list(
+                 username VARCHAR(20),
+                 user_ID INT,
+                 movie_ID INT
+                 )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS train_set(
+                 user_ID INTEGER,
+                 movie_ID INTEGER,
+                 interaction INTEGER
+                 )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS movie_info(
+                 movie_ID INTEGER,
+                 IMDb_ID INTEGER,
+                 title TEXT,
+                 genre TEXT,
+                 year INTEGER
+                 )""")
+
+# Migration 2: keys and indexes for every lookup the application makes
+# The keys are unique indexes rather than table primary keys so that train_set keeps the rowid which
+# streaming_data reads it by, and so that a bulk load can build them after the rows have been inserted
+def _add_keys_and_indexes(c):
+    _deduplicate(c, "train_set", ["user_ID", "movie_ID"], keep_order = "interaction DESC, rowid")
+    _deduplicate(c, "user_history", ["username", "movie_ID"])
+    _deduplicate(c, "user_bucket_list", ["username", "movie_ID"])
+    _deduplicate(c, "movie_info", ["movie_ID"])
+
+    _create_keys_and_indexes(c)
+
+# Create function which builds the keys and indexes of migration 2 on tables which have no duplicate keys
+def _create_keys_and_indexes(c):
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS train_set_key ON train_set (user_ID, movie_ID)")
+
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS user_history_key ON user_history (username, movie_ID)")
+    c.execute("CREATE INDEX IF NOT EXISTS user_history_user_ID ON user_history (user_ID, movie_ID)")
+
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS user_bucket_list_key ON user_bucket_list (username, movie_ID)")
+
+    c.execute("CREATE INDEX IF NOT EXISTS user_info_user_ID ON user_info (user_ID)")
+
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS movie_info_key ON movie_info (movie_ID)")
+
+# Migration 3: full-text search over movie titles, genres and years
+# movie_search keeps its own copy of the text with movie_ID as its rowid, so it does not depend on the rowids of
+# movie_info, which VACUUM may renumber, and results need no join
+# Triggers keep it in step with every insert, update and delete on movie_info
+# movie_search_terms lists every indexed token, which is used to correct typos in a search
+def _add_movie_search(c):
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS movie_search USING fts5(
+                 title, genre, year,
+                 tokenize = "unicode61 remove_diacritics 2",
+                 prefix = "1 2 3"
+                 )""")
+
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS movie_search_terms USING fts5vocab(movie_search, "row")""")
+
+    c.execute("""CREATE TRIGGER IF NOT EXISTS movie_search_insert AFTER INSERT ON movie_info BEGIN
+                 INSERT INTO movie_search (rowid, title, genre, year)
+                 VALUES (new.movie_ID, new.title, new.genre, new.year);
+                 END""")
+
+    c.execute("""CREATE TRIGGER IF NOT EXISTS movie_search_delete AFTER DELETE ON movie_info BEGIN
+                 DELETE FROM movie_search WHERE rowid = old.movie_ID;
+                 END""")
+
+    c.execute("""CREATE TRIGGER IF NOT EXISTS movie_search_update AFTER UPDATE ON movie_info BEGIN
+                 DELETE FROM movie_search WHERE rowid = old.movie_ID;
+                 INSERT INTO movie_search (rowid, title, genre, year)
+                 VALUES (new.movie_ID, new.title, new.genre, new.year);
+                 END""")
+
+    c.execute("DELETE FROM movie_search")
+    c.execute("""INSERT INTO movie_search (rowid, title, genre, year)
+                 SELECT movie_ID, title, genre, year FROM movie_info""")
+
+# Migration 4: indexes for every column the virtual Treeview lists can be sorted by
+# Each index ends in the rowid, so a page continuing from (value, rowid) is one range of the index
+def _add_sort_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS movie_info_title ON movie_info (title)")
+    c.execute("CREATE INDEX IF NOT EXISTS movie_info_genre ON movie_info (genre)")
+    c.execute("CREATE INDEX IF NOT EXISTS movie_info_year ON movie_info (year)")
+
+# Migration 5: append-only mappings between raw IDs and the rows of the network's embedding layers
+# idx is the row of the embedding layer, and an ID keeps its row for good once it has been given one
+def _add_ID_mappings(c):
+    for table in ("user_ID_mapping", "movie_ID_mapping"):
+        c.execute("""CREATE TABLE IF NOT EXISTS {}(
+                     ID INTEGER PRIMARY KEY,
+                     idx INTEGER NOT NULL UNIQUE
+                     )""".format(table))
+
+# Migration 6: index of the negative samples stored in train_set
+# Negatives are drawn during training, so the stored ones can be deleted with bootstrap.py --remove-stored-negatives
+# and the index is then empty, which lets the check for any that are left skip the scan of train_set it would
+# otherwise need
+def _add_negatives_index(c):
+    c.execute("CREATE INDEX IF NOT EXISTS train_set_negatives ON train_set (interaction) WHERE interaction = 0")
+
+# MIGRATIONS[i] upgrades a database from version i to version i + 1
+MIGRATIONS = [_create_tables, _add_keys_and_indexes, _add_movie_search, _add_sort_indexes, _add_ID_mappings,
+              _add_negatives_index]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Create function which builds the tables of migration 1 on a new database, before a bulk load
+def create_tables(c):
+    _create_tables(c)
+
+# Create function which builds the keys and indexes of migration 2 once a bulk load has finished
+# The loader removes duplicate keys itself, so the slow SQL deduplication of migration 2 is skipped
+# Any later migrations are left for migrate()
+def index_loaded_tables(c):
+    _create_keys_and_indexes(c)
+    c.execute("PRAGMA user_version = {}".format(MIGRATIONS.index(_add_keys_and_indexes) + 1))
+
+# Create function which upgrades the database through every migration it has not had yet
+# Each migration runs in its own transaction together with the version bump, so a failed one leaves the
+# database at the previous version
+# Returns the version the database was at before upgrading
+def migrate(database_path = DATABASE_PATH):
+    conn = sql.connect(database_path, isolation_level = None)
+    c = conn.cursor()
+
+    c.execute("PRAGMA user_version")
+    start_version = c.fetchall()[0][0]
+    if start_version > SCHEMA_VERSION:
+        conn.close()
+        raise RuntimeError("database.db is at schema version {} but this version of the application only knows "
+                           "up to {}".format(start_version, SCHEMA_VERSION))
+
+    try:
+        for version in range(start_version, SCHEMA_VERSION):
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[version](c)
+                c.execute("PRAGMA user_version = {}".format(version + 1))
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+
+        # The journal mode is stored in the database file, but cannot be changed inside a transaction
+        c.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
+
+    return start_version
+
+# Every query the application makes, with example parameters
+APP_QUERIES = [
+    ("SELECT * FROM user_info WHERE username = ?", ("user",)),
+    ("SELECT username, user_ID, trained FROM user_info WHERE username = ?", ("user",)),
+    ("SELECT MAX(user_ID) FROM user_info", ()),
+    ("UPDATE user_info SET trained = 0 WHERE username = ?", ("user",)),
+    ("UPDATE user_info SET trained = 1 WHERE username = ?", ("user",)),
+    ("UPDATE user_info SET username = ? WHERE username = ?", ("new", "user")),
+    ("DELETE FROM user_info WHERE username = ?", ("user",)),
+    ("SELECT * FROM user_history WHERE username = ?", ("user",)),
+    ("SELECT movie_ID FROM user_history WHERE username = ?", ("user",)),
+    ("SELECT * FROM user_history WHERE username = ? AND movie_ID = ?", ("user", 1)),
+    ("SELECT COUNT(*) FROM user_history WHERE username = ?", ("user",)),
+    ("UPDATE user_history SET username = ? WHERE username = ?", ("new", "user")),
+    ("DELETE FROM user_history WHERE username = ?", ("user",)),
+    ("DELETE FROM user_history WHERE user_ID = ? AND movie_ID = ?", (1, 1)),
+    ("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
+        INNER JOIN user_history ON movie_info.movie_ID = user_history.movie_ID
+        WHERE user_history.username = ? ORDER BY title""", ("user",)),
+    ("SELECT username, movie_ID FROM user_bucket_list WHERE username = ? AND movie_ID = ?", ("user", 1)),
+    ("UPDATE user_bucket_list SET username = ? WHERE username = ?", ("new", "user")),
+    ("DELETE FROM user_bucket_list WHERE username = ? AND movie_ID = ?", ("user", 1)),
+    ("DELETE FROM user_bucket_list WHERE username = ?", ("user",)),
+    ("""SELECT title, genre, year, movie_info.movie_ID FROM movie_info
+        INNER JOIN user_bucket_list ON movie_info.movie_ID = user_bucket_list.movie_ID
+        WHERE user_bucket_list.username = ? ORDER BY title""", ("user",)),
+    ("SELECT * FROM train_set WHERE user_ID = ?", (1,)),
+    ("SELECT movie_ID FROM train_set WHERE user_ID = ?", (1,)),
+    ("SELECT movie_ID, interaction FROM train_set WHERE user_ID = ?", (1,)),
+    ("SELECT movie_ID FROM train_set WHERE user_ID = ? AND interaction = 1", (1,)),
+    ("SELECT user_ID, movie_ID FROM train_set WHERE user_ID > ? AND interaction = 1", (162541,)),
+    ("DELETE FROM train_set WHERE user_ID = ?", (1,)),
+    ("DELETE FROM train_set WHERE user_ID = ? AND movie_ID = ?", (1, 1)),
+    ("SELECT DISTINCT user_ID FROM train_set ORDER BY user_ID", ()),
+    ("SELECT 1 FROM train_set WHERE interaction = 0 LIMIT 1", ()),
+    ("DELETE FROM train_set WHERE interaction = 0", ()),
+    ("SELECT MIN(rowid) FROM train_set", ()),
+    ("SELECT MAX(rowid) FROM train_set", ()),
+    ("SELECT COUNT(*) FROM train_set", ()),
+    ("SELECT user_ID, movie_ID, interaction FROM train_set WHERE user_ID <= ?", (162541,)),
+    ("SELECT user_ID, movie_ID, interaction FROM train_set WHERE rowid >= ? AND rowid < ?", (1, 65537)),
+    ("SELECT * FROM movie_info WHERE movie_ID = ?", (1,)),
+    ("SELECT title FROM movie_info WHERE movie_ID = ?", (1,)),
+    ("SELECT IMDb_ID, genre, movie_ID FROM movie_info WHERE movie_ID = ?", (1,)),
+    ("SELECT title, genre, year, movie_ID, IMDb_ID FROM movie_info WHERE movie_ID = ?", (1,)),
+    ("SELECT title, genre, year, movie_ID FROM movie_info WHERE movie_ID = ?", (1,)),
+    ("SELECT DISTINCT movie_ID FROM movie_info ORDER BY movie_ID", ()),
+    ("""SELECT movie_ID FROM movie_info
+        WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
+        ORDER BY RANDOM() LIMIT 100""", (1,)),
+    ("""SELECT title, genre, year, rowid FROM movie_search
+        WHERE movie_search MATCH ?
+        ORDER BY bm25(movie_search, 10.0, 2.0, 1.0) LIMIT ?""", ('"star"* AND "wars"*', 100)),
+    ("SELECT 1 FROM movie_search_terms WHERE term >= ? AND term < ? LIMIT 1", ("star", "star\U0010ffff")),
+    ("SELECT COUNT(*) FROM user_info", ()),
+    ("SELECT COUNT(*) FROM movie_info", ()),
+    ("SELECT ID FROM user_ID_mapping ORDER BY idx", ()),
+    ("SELECT ID FROM movie_ID_mapping WHERE idx >= ? ORDER BY idx", (0,)),
+    ("""SELECT username, user_ID, username, rowid FROM user_info WHERE (username, rowid) > (?, ?)
+        ORDER BY username ASC, rowid ASC LIMIT ?""", ("user", 1, 100)),
+    ("""SELECT username, user_ID, user_ID, rowid FROM user_info WHERE (user_ID, rowid) < (?, ?)
+        ORDER BY user_ID DESC, rowid DESC LIMIT ?""", (1, 1, 100)),
+    ("""SELECT title, genre, year, movie_ID, title, rowid FROM movie_info
+        ORDER BY title ASC, rowid ASC LIMIT ?""", (100,)),
+    ("""SELECT title, genre, year, movie_ID, title, rowid FROM movie_info WHERE (title, rowid) > (?, ?)
+        ORDER BY title ASC, rowid ASC LIMIT ?""", ("title", 1, 100)),
+    ("""SELECT title, genre, year, movie_ID, title, rowid FROM movie_info WHERE title IS NULL AND rowid > ?
+        ORDER BY title ASC, rowid ASC LIMIT ?""", (1, 100)),
+    ("""SELECT title, genre, year, movie_ID, title, rowid FROM movie_info WHERE title IS NOT NULL
+        ORDER BY title ASC, rowid ASC LIMIT ?""", (100,)),
+    ("""SELECT title, genre, year, movie_ID, genre, rowid FROM movie_info WHERE (genre, rowid) < (?, ?)
+        ORDER BY genre DESC, rowid DESC LIMIT ?""", ("genre", 1, 100)),
+    ("""SELECT title, genre, year, movie_ID, year, rowid FROM movie_info WHERE year IS NULL
+        ORDER BY year DESC, rowid DESC LIMIT ?""", (100,)),
+    ("""SELECT title, genre, year, movie_ID, movie_ID, rowid FROM movie_info WHERE (movie_ID, rowid) > (?, ?)
+        ORDER BY movie_ID ASC, rowid ASC LIMIT ?""", (1, 1, 100)),
+    ("""SELECT year, rowid FROM movie_info ORDER BY year DESC, rowid DESC LIMIT 1 OFFSET ?""", (99,)),
+    ("""SELECT term, doc FROM movie_search_terms WHERE term >= ? AND term < ?
+        AND length(term) BETWEEN ? AND ?""", ("s", "s\U0010ffff", 3, 5)),
+]
+
+# Queries which read a whole table on purpose, such as listing every user or sampling the whole catalog
+FULL_SCAN_QUERIES = [
+    ("SELECT movie_ID FROM movie_info", ()),
+    ("SELECT movie_ID FROM movie_info WHERE genre LIKE ?", ("%Drama%",)),
+    ("SELECT DISTINCT movie_ID FROM train_set ORDER BY movie_ID", ()),
+    ("SELECT title, genre, year, movie_ID FROM movie_info", ()),
+    ("SELECT user_ID, movie_ID, interaction FROM train_set", ()),
+    ("SELECT user_ID, movie_ID FROM train_set WHERE interaction = 1", ()),
+    ("""SELECT movie_ID FROM movie_info
+        WHERE movie_ID NOT IN (SELECT movie_ID FROM train_set WHERE user_ID = ?)
+        AND genre LIKE ?
+        ORDER BY RANDOM() LIMIT 100""", (1, "%Drama%")),
+]
+
+# Modules which query the application database, whose queries must all be listed above
+# Queries built with format(), e.g. to choose a table or sort column, cannot be found this way, so an example of
+# each is listed by hand
+QUERY_MODULES = ["application.py", "recommender_service.py", "id_mapping.py", "model_cache.py", "search_index.py",
+                 "movie_search.py", "virtual_treeview.py", "bootstrap.py",
+                 "architecture and training/interaction_store.py", "architecture and training/negative_sampling.py",
+                 "architecture and training/streaming_data.py"]
+
+# Create function which returns the string, or the strings joined with +, that a syntax tree node is made of
+def _constant_string(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _constant_string(node.left), _constant_string(node.right)
+        if left is not None and right is not None:
+            return left + right
+
+    return None
+
+# Create function which returns (module, line, query) for every query in modules that is not in queries
+# Queries are the constant strings passed to execute, executemany, fetchone or fetchall, and only those which can
+# read a table are checked, since an INSERT of VALUES or a transaction statement has no query plan to check
+def unlisted_queries(modules = QUERY_MODULES, queries = APP_QUERIES + FULL_SCAN_QUERIES):
+    listed = {" ".join(query.split()) for query, _ in queries}
+    folder = dirname(abspath(__file__))
+
+    unlisted = []
+    for module in modules:
+        with open(join(folder, module)) as f:
+            tree = ast.parse(f.read())
+
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and len(node.args) > 0
+                    and node.func.attr in ("execute", "executemany", "fetchone", "fetchall")):
+                continue
+
+            query = _constant_string(node.args[0])
+            if query is None:
+                continue
+
+            query = " ".join(query.split())
+            if query.split()[0].upper() in ("SELECT", "UPDATE", "DELETE") and query not in listed:
+                unlisted.append((module, node.lineno, query))
+
+    return unlisted
+
+# Create function which returns the query plan of every application query and the queries which scan a table
+# A scan through a covering index reads only the index, so it is not counted as a full table scan
+# Neither is a virtual table step, as a full-text table plans its own search and reports it as a scan, nor a scan
+# through an index in a query with a LIMIT, which walks the index in order and stops once it has enough rows
+def check_query_plans(database_path, queries = APP_QUERIES):
+    conn = connect_database(database_path)
+    c = conn.cursor()
+
+    plans = {}
+    full_scans = []
+    for query, params in queries:
+        c.execute("EXPLAIN QUERY PLAN " + query, params)
+        plan = [record[-1] for record in c.fetchall()]
+        plans[query] = plan
+
+        if any(step.startswith("SCAN") and "USING COVERING INDEX" not in step and "VIRTUAL TABLE" not in step
+               and not ("USING INDEX" in step and "LIMIT" in query) for step in plan):
+            full_scans.append(query)
+
+    conn.close()
+    return plans, full_scans
+
+if __name__ == "__main__":
+    # Check the plans against a freshly migrated database so the result does not depend on local data
+    database_path = join(tempfile.mkdtemp(), "database.db")
+    migrate(database_path)
+
+    plans, full_scans = check_query_plans(database_path)
+    for query, plan in plans.items():
+        print(" ".join(query.split()))
+        for step in plan:
+            print("    " + step)
+
+    if len(full_scans) > 0:
+        raise SystemExit("These queries scan a whole table:\n" +
+                         "\n".join(" ".join(query.split()) for query in full_scans))
+
+    unlisted = unlisted_queries()
+    if len(unlisted) > 0:
+        raise SystemExit("These queries are missing from APP_QUERIES or FULL_SCAN_QUERIES:\n" +
+                         "\n".join("{}:{}: {}".format(*query) for query in unlisted))
+
+    print("{} queries checked, none of them scan a whole table".format(len(plans)))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds the in-memory title index used for search-as-you-type.
+Every distinct word of every title is kept in one sorted array, so the words
+starting with a typed prefix are one contiguous range of it found by binary search.
+The titles containing those words are read from a postings array laid out in
+the same word order, and the titles matching every typed word are combined in
+a boolean mask over all titles. Titles are numbered best first, shortest title
+and then alphabetically, so the first set entries of the mask are the best
+results and nothing needs sorting per keystroke."""
+
+import numpy as np
+
+from movie_search import SEARCH_LIMIT, search_tokens
+
+# Upper bound of every string which starts with a given prefix
+PREFIX_END = "\U0010ffff"
+
+# Prefix and token index over movie titles
+# records holds (title, genre, year, movie_ID) rows in the order titles are ranked
+# words is the sorted array of distinct title words, and postings[offsets[i]:offsets[i + 1]] are the records
+# containing words[i]
+class TitleIndex:
+    def __init__(self, records, words, offsets, postings):
+        self.records = records
+        self.words = words
+        self.offsets = offsets
+        self.postings = postings
+
+    # Create function which builds the index from (title, genre, year, movie_ID) rows
+    @classmethod
+    def from_records(cls, records):
+        records = sorted(records, key = lambda record: (len(record[0]), record[0].lower(), record[3]))
+
+        # Pair every word of every title with the number of its record, then group the pairs by word
+        all_words = []
+        numbers = []
+        for number, record in enumerate(records):
+            title_words = set(search_tokens(record[0]))
+            all_words += title_words
+            numbers += [number] * len(title_words)
+
+        words, word_numbers = np.unique(np.array(all_words, dtype = str), return_inverse = True)
+        numbers = np.array(numbers, dtype = np.int32)
+        order = np.lexsort((numbers, word_numbers))
+        postings = numbers[order]
+        offsets = np.searchsorted(word_numbers[order], np.arange(words.shape[0] + 1))
+
+        return cls(records, words, offsets, postings)
+
+    # Create function which builds the index from the movie_info table
+    @classmethod
+    def from_database(cls, db):
+        return cls.from_records(db.fetchall("SELECT title, genre, year, movie_ID FROM movie_info"))
+
+    def __len__(self):
+        return len(self.records)
+
+    # Create function which returns a boolean mask of the records with a title word starting with prefix
+    def prefix_mask(self, prefix):
+        first, last = np.searchsorted(self.words, [prefix, prefix + PREFIX_END])
+
+        mask = np.zeros(len(self.records), dtype = bool)
+        mask[self.postings[self.offsets[first]:self.offsets[last]]] = True
+
+        return mask
+
+    # Create function which returns the best limit (title, genre, year, movie_ID) rows whose title has a word
+    # starting with each word of text, in any order
+    def search(self, text, limit = SEARCH_LIMIT):
+        tokens = search_tokens(text)
+        if len(tokens) == 0:
+            return []
+
+        # Longer words match fewer titles, so they are applied first and the loop can stop once nothing is left
+        mask = None
+        for token in sorted(set(tokens), key = len, reverse = True):
+            token_mask = self.prefix_mask(token)
+            mask = token_mask if mask is None else mask & token_mask
+            if not mask.any():
+                return []
+
+        return [self.records[number] for number in np.flatnonzero(mask)[:limit]]
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3 as sql
+import sys
+
+import h5py
+import numpy as np
+import pytest
+
+from os.path import abspath, dirname, join
+from types import SimpleNamespace
+
+# The modules are scripts rather than a package, so make both of their folders importable
+REPO_FOLDER = dirname(dirname(abspath(__file__)))
+for folder in (REPO_FOLDER, join(REPO_FOLDER, "architecture and training")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+# Sizes of the small NeuMF networks the tests save
+EMBED_DIM = 4
+MLP_UNITS = (6, 3)
+BN_EPSILON = 0.001
+
+# Create function which returns a layer of a functional keras model config
+def _layer(name, class_name, inbound = (), **config):
+    inbound_nodes = [[[inbound_name, 0, 0, {}] for inbound_name in inbound]] if len(inbound) > 0 else []
+
+    return {"name": name, "class_name": class_name, "config": dict(config, name = name),
+            "inbound_nodes": inbound_nodes}
+
+# Create function which writes a .h5 file laid out like a model built by NeuMF_architecture.NeuMF
+# Returns the raw weights, including unfolded BatchNormalization layers, for the reference forward pass
+def save_NeuMF(model_path, num_users, num_items, seed = 0):
+    rng = np.random.default_rng(seed)
+    weights = {}
+
+    layers = [_layer("user", "InputLayer"), _layer("item", "InputLayer")]
+    for name, inbound, rows in (("user_gmf", "user", num_users), ("item_gmf", "item", num_items),
+                                ("user_mlp", "user", num_users), ("item_mlp", "item", num_items)):
+        layers.append(_layer(name, "Embedding", [inbound], input_dim = rows, output_dim = EMBED_DIM))
+        layers.append(_layer(name + "_flat", "Flatten", [name]))
+        weights[name] = {"embeddings": rng.normal(size = (rows, EMBED_DIM))}
+
+    layers.append(_layer("gmf", "Dot", ["user_gmf_flat", "item_gmf_flat"], axes = 1))
+    layers.append(_layer("mlp_concat", "Concatenate", ["user_mlp_flat", "item_mlp_flat"]))
+
+    previous, inputs = "mlp_concat", 2 * EMBED_DIM
+    for i, units in enumerate(MLP_UNITS):
+        dense, bn = "dense_{}".format(i), "bn_{}".format(i)
+        layers.append(_layer(dense, "Dense", [previous], units = units, activation = "relu"))
+        layers.append(_layer(bn, "BatchNormalization", [dense], epsilon = BN_EPSILON))
+        weights[dense] = {"kernel": rng.normal(size = (inputs, units)), "bias": rng.normal(size = units)}
+        weights[bn] = {"gamma": rng.normal(size = units), "beta": rng.normal(size = units),
+                       "moving_mean": rng.normal(size = units), "moving_variance": rng.uniform(0.5, 2, size = units)}
+        previous, inputs = bn, units
+
+    layers.append(_layer("paths_concat", "Concatenate", ["gmf", previous]))
+    layers.append(_layer("output", "Dense", ["paths_concat"], units = 1, activation = "sigmoid"))
+    weights["output"] = {"kernel": rng.normal(size = (1 + inputs, 1)), "bias": rng.normal(size = 1)}
+
+    model_config = {"class_name": "Functional",
+                    "config": {"layers": layers,
+                               "input_layers": [["user", 0, 0], ["item", 0, 0]],
+                               "output_layers": [["output", 0, 0]]}}
+
+    with h5py.File(model_path, "w") as f:
+        f.attrs["model_config"] = json.dumps(model_config).encode("utf-8")
+        model_weights = f.create_group("model_weights")
+        for name, layer_weights in weights.items():
+            group = model_weights.create_group(name)
+            weight_names = ["{}/{}:0".format(name, key) for key in layer_weights]
+            group.attrs["weight_names"] = [weight_name.encode("utf-8") for weight_name in weight_names]
+            for weight_name, value in zip(weight_names, layer_weights.values()):
+                group.create_dataset(weight_name, data = value.astype(np.float32))
+
+    return weights
+
+# Size of the catalog and the number of the dataset's users in the small recommender below
+NUM_MOVIES = 30
+NUM_DATASET_USERS = 5
+
+# Create fixture which builds a small recommender: a migrated database, a saved NeuMF network, its ID mappings and
+# an interaction store, served by a RecommenderService
+# dana is one of the dataset's users and alice was created and trained in the application, while bob is marked as
+# trained but has no row in the network and carol has not trained yet
+@pytest.fixture
+def recommender(tmp_path, monkeypatch):
+    from bootstrap import TRAIN_SET_MAX_USER_ID
+    from data_access import Database
+    from id_mapping import IDMapping
+    from interaction_store import InteractionStore
+    from model_cache import ModelCache
+    from recommender_service import RecommenderService
+    from schema import migrate
+
+    # Run from an empty folder so the ID mappings are not seeded from the application's legacy encodings
+    monkeypatch.chdir(tmp_path)
+    database_path = str(tmp_path / "database.db")
+    model_path = str(tmp_path / "trained_NeuMF.h5")
+    migrate(database_path)
+
+    rng = np.random.default_rng(0)
+    movie_IDs = np.arange(1, NUM_MOVIES + 1) * 10
+    user_IDs = {"dana": 3, "alice": TRAIN_SET_MAX_USER_ID + 1, "bob": TRAIN_SET_MAX_USER_ID + 2,
+                "carol": TRAIN_SET_MAX_USER_ID + 3}
+
+    dataset_rows = [(user_ID, int(movie_ID), 1) for user_ID in range(1, NUM_DATASET_USERS + 1)
+                    for movie_ID in rng.choice(movie_IDs, size = 8, replace = False)]
+    alice_history = [int(movie_ID) for movie_ID in rng.choice(movie_IDs, size = 5, replace = False)]
+
+    conn = sql.connect(database_path)
+    conn.executemany("INSERT INTO movie_info (movie_ID, IMDb_ID, title, genre, year) VALUES (?, ?, ?, ?, ?)",
+                     [(int(movie_ID), int(movie_ID) + 1000, "Movie {}".format(movie_ID),
+                       "Comedy" if i % 2 == 0 else "Drama", 2000 + i) for i, movie_ID in enumerate(movie_IDs)])
+    conn.executemany("INSERT INTO train_set (user_ID, movie_ID, interaction) VALUES (?, ?, ?)",
+                     dataset_rows + [(user_IDs["alice"], movie_ID, 1) for movie_ID in alice_history])
+    conn.executemany("INSERT INTO user_history (username, user_ID, movie_ID) VALUES (?, ?, ?)",
+                     [("alice", user_IDs["alice"], movie_ID) for movie_ID in alice_history])
+    conn.executemany("INSERT INTO user_info (username, user_ID, trained) VALUES (?, ?, ?)",
+                     [(username, user_ID, 0 if username == "carol" else 1) for username, user_ID in user_IDs.items()])
+    conn.commit()
+    conn.close()
+
+    # The network has a row for each of the dataset's users and alice, but not for bob or carol
+    IDMapping.load(database_path, "user").extend(database_path,
+                                                 list(range(1, NUM_DATASET_USERS + 1)) + [user_IDs["alice"]])
+    IDMapping.load(database_path, "movie").extend(database_path, movie_IDs)
+    save_NeuMF(model_path, NUM_DATASET_USERS + 1, NUM_MOVIES)
+
+    dataset_rows = np.array(dataset_rows, dtype = np.int64)
+    interactions = InteractionStore.from_arrays(dataset_rows[:, 0], dataset_rows[:, 1], dataset_rows[:, 2])
+
+    database = Database(database_path)
+    service = RecommenderService(database, ModelCache(model_path, database_path), interactions,
+                                 model_path = model_path)
+
+    seen = {"dana": set(dataset_rows[dataset_rows[:, 0] == user_IDs["dana"], 1].tolist()),
+            "alice": set(alice_history)}
+
+    yield SimpleNamespace(service = service, database_path = database_path, model_path = model_path,
+                          movie_IDs = movie_IDs, user_IDs = user_IDs, seen = seen)
+
+    database.close()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from os import walk
+from os.path import join
+
+from conftest import BN_EPSILON, EMBED_DIM, MLP_UNITS, REPO_FOLDER, save_NeuMF
+from NeuMF_inference import PARITY_TOLERANCE, NeuMFInference, parity_check, write_user_embeddings
+
+SAVED_MODELS_FOLDER = join(REPO_FOLDER, "model data", "saved models")
+
+NUM_USERS = 7
+NUM_ITEMS = 11
+
+# Create function which runs the network layer by layer, applying BatchNormalization explicitly
+def _reference_scores(weights, users, items):
+    gmf = np.sum(weights["user_gmf"]["embeddings"][users] * weights["item_gmf"]["embeddings"][items], axis = 1)
+
+    hidden = np.concatenate([weights["user_mlp"]["embeddings"][users], weights["item_mlp"]["embeddings"][items]],
+                            axis = 1)
+    for i in range(len(MLP_UNITS)):
+        dense, bn = weights["dense_{}".format(i)], weights["bn_{}".format(i)]
+        hidden = np.maximum(hidden @ dense["kernel"] + dense["bias"], 0)
+        hidden = (bn["gamma"] * (hidden - bn["moving_mean"]) / np.sqrt(bn["moving_variance"] + BN_EPSILON) +
+                  bn["beta"])
+
+    logits = np.concatenate([gmf[:, np.newaxis], hidden], axis = 1) @ weights["output"]["kernel"][:, 0]
+    logits = logits + weights["output"]["bias"][0]
+
+    return 1 / (1 + np.exp(-logits))
+
+def test_folded_batch_norm_matches_explicit_forward_pass(tmp_path):
+    model_path = str(tmp_path / "model.h5")
+    weights = save_NeuMF(model_path, NUM_USERS, NUM_ITEMS)
+
+    users, items = np.meshgrid(np.arange(NUM_USERS), np.arange(NUM_ITEMS), indexing = "ij")
+    users, items = users.reshape(-1), items.reshape(-1)
+
+    engine = NeuMFInference.from_h5(model_path)
+
+    np.testing.assert_allclose(engine.score(users, items), _reference_scores(weights, users, items),
+                               rtol = 1e-4, atol = 1e-5)
+
+def test_fold_in_leaves_the_model_unchanged(tmp_path):
+    model_path = str(tmp_path / "model.h5")
+    save_NeuMF(model_path, NUM_USERS, NUM_ITEMS)
+    engine = NeuMFInference.from_h5(model_path)
+    user_gmf, user_mlp = engine.user_gmf.copy(), engine.user_mlp.copy()
+
+    gmf_vector, mlp_vector = engine.fold_in_user(NUM_USERS, items = [0, 1, 2, 3], labels = [1, 1, 0, 0])
+
+    assert engine.num_users == NUM_USERS
+    np.testing.assert_array_equal(engine.user_gmf, user_gmf)
+    np.testing.assert_array_equal(engine.user_mlp, user_mlp)
+    assert gmf_vector.shape == (EMBED_DIM,) and mlp_vector.shape == (EMBED_DIM,)
+
+def test_write_user_embeddings_adds_a_user(tmp_path):
+    model_path = str(tmp_path / "model.h5")
+    save_NeuMF(model_path, NUM_USERS, NUM_ITEMS)
+    engine = NeuMFInference.from_h5(model_path)
+
+    gmf_vector, mlp_vector = engine.fold_in_user(NUM_USERS, items = [0, 1, 2, 3], labels = [1, 1, 0, 0])
+    write_user_embeddings(model_path, NUM_USERS, gmf_vector, mlp_vector)
+
+    updated = NeuMFInference.from_h5(model_path)
+    assert updated.num_users == NUM_USERS + 1
+    np.testing.assert_allclose(updated.user_gmf[NUM_USERS], gmf_vector, rtol = 1e-6)
+    np.testing.assert_allclose(updated.user_mlp[NUM_USERS], mlp_vector, rtol = 1e-6)
+    np.testing.assert_array_equal(updated.user_gmf[:NUM_USERS], engine.user_gmf)
+
+# Create function which returns the path of every model saved by the sweep
+def _saved_models():
+    return [join(folder, file) for folder, _, files in sorted(walk(SAVED_MODELS_FOLDER))
+            for file in sorted(files) if file.endswith(".h5")]
+
+def test_there_are_saved_models():
+    assert len(_saved_models()) > 0
+
+@pytest.mark.parametrize("model_path", _saved_models(), ids = lambda path: path[len(SAVED_MODELS_FOLDER) + 1:])
+def test_saved_model_matches_keras(model_path):
+    pytest.importorskip("tensorflow")
+
+    assert parity_check(model_path) <= PARITY_TOLERANCE
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from id_mapping import IDMapping
+from schema import migrate
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch):
+    # Run from an empty folder so load() does not seed the mapping from the application's legacy encodings
+    monkeypatch.chdir(tmp_path)
+    database_path = str(tmp_path / "database.db")
+    migrate(database_path)
+
+    return database_path
+
+def test_encode_and_decode():
+    mapping = IDMapping([30, 10, 20], "user")
+
+    np.testing.assert_array_equal(mapping.encode([10, 20, 30]), [1, 2, 0])
+    np.testing.assert_array_equal(mapping.decode([1, 2, 0]), [10, 20, 30])
+    np.testing.assert_array_equal(mapping.encode([-1, 0, 15, 31, 1000]), [-1, -1, -1, -1, -1])
+    np.testing.assert_array_equal(mapping.contains([10, 15, 1000]), [True, False, False])
+
+def test_extend_only_appends(database_path):
+    mapping = IDMapping.load(database_path, "user")
+    assert len(mapping) == 0
+
+    assert mapping.extend(database_path, [50, 5, 20]) == 3
+    np.testing.assert_array_equal(mapping.encode([5, 20, 50]), [0, 1, 2])
+
+    # Known IDs and duplicates keep their index, and new IDs take the next ones in ascending order of ID
+    assert mapping.extend(database_path, [100, 1, 20, 1]) == 2
+    np.testing.assert_array_equal(mapping.encode([5, 20, 50, 1, 100]), [0, 1, 2, 3, 4])
+
+    reloaded = IDMapping.load(database_path, "user")
+    np.testing.assert_array_equal(reloaded.IDs, mapping.IDs)
+
+def test_extend_picks_up_rows_added_elsewhere(database_path):
+    first = IDMapping.load(database_path, "movie")
+    second = IDMapping.load(database_path, "movie")
+
+    first.extend(database_path, [7, 8])
+    second.extend(database_path, [9])
+
+    np.testing.assert_array_equal(second.encode([7, 8, 9]), [0, 1, 2])
+    np.testing.assert_array_equal(IDMapping.load(database_path, "movie").IDs, [7, 8, 9])
+
+def test_extending_rolls_back_on_error(database_path):
+    mapping = IDMapping.load(database_path, "user")
+    mapping.extend(database_path, [1, 2])
+
+    with pytest.raises(RuntimeError):
+        with mapping.extending(database_path, [3]) as num_added:
+            assert num_added == 1
+            raise RuntimeError("saving the network failed")
+
+    assert len(mapping) == 2
+    assert mapping.encode([3])[0] == -1
+    np.testing.assert_array_equal(IDMapping.load(database_path, "user").IDs, [1, 2])
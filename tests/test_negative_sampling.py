@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from negative_sampling import SeenItems, sample_negatives
+
+NUM_USERS = 40
+NUM_ITEMS = 200
+
+# Create function which returns pairs where a few users have seen enough items to be stored as rows of bits
+def _pairs(seed = 0):
+    rng = np.random.default_rng(seed)
+    counts = np.where(np.arange(NUM_USERS) % 10 == 0, 120, rng.integers(0, 6, NUM_USERS))
+    users = np.repeat(np.arange(NUM_USERS), counts)
+    items = rng.integers(0, NUM_ITEMS, users.shape[0])
+
+    return users, items
+
+def test_contains_matches_the_seen_pairs():
+    users, items = _pairs()
+    seen = SeenItems.from_pairs(users, items, NUM_USERS, NUM_ITEMS)
+    assert 0 < seen.bits.shape[0] < NUM_USERS
+
+    pairs = set(zip(users.tolist(), items.tolist()))
+    all_users, all_items = np.meshgrid(np.arange(NUM_USERS), np.arange(NUM_ITEMS), indexing = "ij")
+    expected = [(user, item) in pairs for user, item in zip(all_users.reshape(-1).tolist(),
+                                                            all_items.reshape(-1).tolist())]
+
+    np.testing.assert_array_equal(seen.contains(all_users.reshape(-1), all_items.reshape(-1)), expected)
+
+def test_sample_negatives_draws_unseen_items():
+    users, items = _pairs()
+    seen = SeenItems.from_pairs(users, items, NUM_USERS, NUM_ITEMS)
+
+    neg_users, neg_items = sample_negatives(users, 4, seen, np.random.default_rng(1))
+
+    np.testing.assert_array_equal(neg_users, np.repeat(users, 4))
+    assert not seen.contains(neg_users, neg_items).any()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+from http import HTTPStatus
+
+from recommender_server import RecommenderServer
+
+# Create function which sends a GET request on an open connection and returns the status and JSON payload
+async def _get(reader, writer, target):
+    writer.write("GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(target).encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+def test_concurrent_requests_share_one_batch(recommender, monkeypatch):
+    service = recommender.service
+    expected = {target: [record[3] for record in service.recommend(username, genre)]
+                for target, username, genre in (("/users/alice/recommendations", "alice", None),
+                                                ("/users/alice/recommendations?genre=Comedy", "alice", "Comedy"),
+                                                ("/users/dana/recommendations", "dana", None))}
+
+    batches = []
+    recommend_many = service.recommend_many
+    def recording_recommend_many(requests):
+        batches.append(list(requests))
+        return recommend_many(requests)
+    monkeypatch.setattr(service, "recommend_many", recording_recommend_many)
+
+    server = RecommenderServer(service, workers = 2, batch_window = 0.05)
+    async def send_together():
+        return await asyncio.gather(*[server.dispatch("GET", target, b"") for target in expected])
+    try:
+        responses = asyncio.run(send_together())
+    finally:
+        server.close()
+
+    assert len(batches) == 1
+    assert sorted(batches[0], key = str) == sorted([("alice", None), ("alice", "Comedy"), ("dana", None)], key = str)
+    for target, (status, payload) in zip(expected, responses):
+        assert status == HTTPStatus.OK
+        assert [movie["movie_ID"] for movie in payload["movies"]] == expected[target]
+    assert server.batcher.batches == 1 and server.batcher.batched_requests == 3
+
+def test_refused_requests_over_http(recommender):
+    server = RecommenderServer(recommender.service, workers = 2)
+
+    async def request_each():
+        listening = asyncio.get_running_loop().create_future()
+        serving = asyncio.create_task(server.serve("127.0.0.1", 0, started = listening.set_result))
+        port = (await listening).sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = [await _get(reader, writer, "/users/{}/recommendations".format(username))
+                     for username in ("nobody", "bob", "carol")]
+        writer.close()
+
+        serving.cancel()
+        return responses
+
+    try:
+        nobody, bob, carol = asyncio.run(request_each())
+    finally:
+        server.close()
+
+    assert nobody == (HTTPStatus.NOT_FOUND, {"error": "Invalid Username", "message": "That username does not exist!"})
+
+    # bob is marked as trained but has no row in the network
+    assert bob == (HTTPStatus.CONFLICT, {"error": "Training Error",
+                                         "message": "The NeuMF network has not been trained on your history yet!"})
+    assert carol[0] == HTTPStatus.CONFLICT
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from conftest import NUM_MOVIES
+from recommender_service import RECOMMEND_TOP_K, ServiceError
+
+# Create function which ranks every unseen movie of a genre for a user by scoring them one user at a time
+def _expected_movie_IDs(recommender, username, genre = None):
+    engine, user_mapping, movie_mapping = recommender.service.model_cache.get()
+
+    catalog = [movie_ID for i, movie_ID in enumerate(recommender.movie_IDs.tolist())
+               if genre is None or (genre == "Comedy") == (i % 2 == 0)]
+    catalog = np.array([movie_ID for movie_ID in catalog if movie_ID not in recommender.seen[username]])
+
+    user_index = int(user_mapping.encode(recommender.user_IDs[username]))
+    scores = engine.score(np.full(catalog.shape[0], user_index), movie_mapping.encode(catalog))
+
+    return catalog[np.argsort(-scores, kind = "stable")[0:RECOMMEND_TOP_K]].tolist()
+
+REQUESTS = [("dana", None), ("alice", "Comedy"), ("alice", None)]
+
+def test_recommend_many_ranks_each_users_unseen_movies(recommender):
+    results = recommender.service.recommend_many(REQUESTS)
+
+    assert NUM_MOVIES - max(len(seen) for seen in recommender.seen.values()) > RECOMMEND_TOP_K
+    for (username, genre), records in zip(REQUESTS, results):
+        assert [record[3] for record in records] == _expected_movie_IDs(recommender, username, genre)
+        assert all(record[1] == genre for record in records if genre is not None)
+
+def test_recommend_many_reads_seen_movies_from_the_database_until_the_store_is_open(recommender):
+    with_store = recommender.service.recommend_many(REQUESTS)
+
+    recommender.service.interactions = None
+
+    assert recommender.service.recommend_many(REQUESTS) == with_store
+
+def test_recommend_many_gives_each_failed_request_its_own_error(recommender):
+    nobody, carol, bob, alice = recommender.service.recommend_many([("nobody", None), ("carol", None),
+                                                                    ("bob", None), ("alice", None)])
+
+    assert isinstance(nobody, ServiceError) and nobody.status == 404
+    assert isinstance(carol, ServiceError) and carol.status == 409
+
+    # bob is marked as trained but has no row in the network, so encoding him must not score another user's row
+    assert isinstance(bob, ServiceError) and bob.status == 409
+    assert bob.message == "The NeuMF network has not been trained on your history yet!"
+
+    assert [record[3] for record in alice] == _expected_movie_IDs(recommender, "alice")
+
+def test_recommend_raises_the_error_of_its_request(recommender):
+    with pytest.raises(ServiceError) as error:
+        recommender.service.recommend("bob")
+
+    assert error.value.status == 409
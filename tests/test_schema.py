@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3 as sql
+
+from schema import SCHEMA_VERSION, check_query_plans, migrate, unlisted_queries
+
+TABLES = {"user_info", "user_history", "user_bucket_list", "train_set", "movie_info", "movie_search",
+          "user_ID_mapping", "movie_ID_mapping"}
+
+def test_migrate_empty_database(tmp_path):
+    database_path = str(tmp_path / "database.db")
+
+    assert migrate(database_path) == 0
+
+    conn = sql.connect(database_path)
+    c = conn.cursor()
+    c.execute("PRAGMA user_version")
+    version = c.fetchall()[0][0]
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {record[0] for record in c.fetchall()}
+    c.execute("PRAGMA journal_mode")
+    journal_mode = c.fetchall()[0][0]
+    conn.close()
+
+    assert version == SCHEMA_VERSION
+    assert TABLES <= tables
+    assert journal_mode == "wal"
+
+    # A database which is already up to date is left as it is
+    assert migrate(database_path) == SCHEMA_VERSION
+
+def test_app_queries_use_indexes(tmp_path):
+    database_path = str(tmp_path / "database.db")
+    migrate(database_path)
+
+    _, full_scans = check_query_plans(database_path)
+
+    assert full_scans == []
+    assert unlisted_queries() == []
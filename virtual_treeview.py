@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+""" This script holds a Treeview which can list a whole table without
+loading it. Only as many Treeview rows exist as are visible, and scrolling
+refills them from a source of rows. TableSource reads a SQLite table a page at
+a time with keyset pagination, continuing each page from the sort value and
+rowid of the last row of the one before, so every page is read from the sort
+index directly however far down the table it is. Only a few pages are kept in memory, and
+sorting by a column is done in the query. RecordsSource serves rows which are
+already in memory, such as search results, in the same way."""
+
+import tkinter as tk
+from tkinter import ttk
+
+from collections import OrderedDict
+
+# Number of rows fetched by each query
+PAGE_SIZE = 100
+
+# Number of pages kept in memory, the least recently used being dropped first
+MAX_PAGES = 8
+
+# Number of rows the Treeview shows, which is also the number of rows it holds
+VISIBLE_ROWS = 10
+
+# Rows of a SQLite table sorted by one of its columns, with rowid breaking ties
+# Each sort column needs an index for pages to be read as index ranges, and every index ends in the rowid
+class TableSource:
+    def __init__(self, db, table, columns, sort_column = None, page_size = PAGE_SIZE, max_pages = MAX_PAGES):
+        self.db = db
+        self.table = table
+        self.columns = columns
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.num_rows = db.fetchone("SELECT COUNT(*) FROM {}".format(table))[0]
+        self.sort(sort_column if sort_column is not None else columns[0])
+
+    def __len__(self):
+        return self.num_rows
+
+    # Create function which sorts the rows by column and forgets every page read in the previous order
+    def sort(self, column, descending = False):
+        self.sort_column = column
+        self.descending = descending
+        self.pages = OrderedDict()
+
+        # Sort value and rowid of the last row before each page, where they are known
+        self.anchors = {0: None}
+
+    # Create function which returns the rows from start up to stop, reading any pages which are not in memory
+    def rows(self, start, stop):
+        stop = min(stop, self.num_rows)
+        if start >= stop:
+            return []
+
+        first_page = start // self.page_size
+        last_page = (stop - 1) // self.page_size
+        rows = []
+        for page in range(first_page, last_page + 1):
+            rows += self._page(page)
+
+        offset = first_page * self.page_size
+        return [row[:-2] for row in rows[start - offset:stop - offset]]
+
+    # Create function which returns one page of rows, each followed by its sort value and rowid
+    # The rows after the anchor can fall into two ranges of the sort index, the NULLs and the values, which are
+    # read in order until the page is full
+    def _page(self, page):
+        if page in self.pages:
+            self.pages.move_to_end(page)
+            return self.pages[page]
+
+        direction = "DESC" if self.descending else "ASC"
+        rows = []
+        for where, params in self._after(self._anchor(page)):
+            rows += self.db.fetchall("""SELECT {columns}, {sort}, rowid FROM {table} {where}
+                                     ORDER BY {sort} {direction}, rowid {direction} LIMIT ?""".format(
+                                     columns = ", ".join(self.columns), sort = self.sort_column, table = self.table,
+                                     where = where, direction = direction), params + (self.page_size - len(rows),))
+            if len(rows) == self.page_size:
+                break
+
+        self.pages[page] = rows
+        if len(rows) > 0:
+            self.anchors[page + 1] = rows[-1][-2:]
+        if len(self.pages) > self.max_pages:
+            self.pages.popitem(last = False)
+
+        return rows
+
+    # Create function which returns the sort value and rowid of the row just before a page
+    # Scrolling only ever moves to the page next to one already read, whose last row is known
+    # Dragging the scrollbar can jump anywhere, and then the row is found by skipping through the sort index
+    def _anchor(self, page):
+        if page not in self.anchors:
+            direction = "DESC" if self.descending else "ASC"
+            self.anchors[page] = self.db.fetchone("""SELECT {sort}, rowid FROM {table}
+                                                  ORDER BY {sort} {direction}, rowid {direction}
+                                                  LIMIT 1 OFFSET ?""".format(sort = self.sort_column,
+                                                  table = self.table, direction = direction),
+                                                  (page * self.page_size - 1,))
+
+        return self.anchors[page]
+
+    # Create function which returns the (WHERE clause, parameters) of each index range holding rows sorted after
+    # anchor, in the order they are read
+    # NULL sorts before every value in SQLite and cannot be compared, so the NULLs are a range of their own
+    def _after(self, anchor):
+        if anchor is None:
+            return [("", ())]
+
+        value, rowid = anchor
+        sort = self.sort_column
+        if not self.descending and value is None:
+            return [("WHERE {} IS NULL AND rowid > ?".format(sort), (rowid,)),
+                    ("WHERE {} IS NOT NULL".format(sort), ())]
+        if not self.descending:
+            return [("WHERE ({}, rowid) > (?, ?)".format(sort), (value, rowid))]
+        if value is None:
+            return [("WHERE {} IS NULL AND rowid < ?".format(sort), (rowid,))]
+
+        return [("WHERE ({}, rowid) < (?, ?)".format(sort), (value, rowid)),
+                ("WHERE {} IS NULL".format(sort), ())]
+
+# Rows which are already in memory, with the same interface as TableSource
+class RecordsSource:
+    def __init__(self, records, columns):
+        self.records = list(records)
+        self.columns = columns
+        self.sort_column = None
+        self.descending = False
+
+    def __len__(self):
+        return len(self.records)
+
+    # Create function which sorts the rows by column, with missing values first as in SQLite
+    def sort(self, column, descending = False):
+        self.sort_column = column
+        self.descending = descending
+
+        i = self.columns.index(column)
+        self.records.sort(key = lambda record: (record[i] is not None, record[i] if record[i] is not None else 0),
+                          reverse = descending)
+
+    def rows(self, start, stop):
+        return self.records[start:stop]
+
+# Treeview showing the rows of a source, of which only the visible rows are ever inserted
+# columns holds (heading, width, anchor) for each column of the source, and clicking a heading sorts by it
+class VirtualTreeview(tk.Frame):
+    def __init__(self, parent, source, columns, height = VISIBLE_ROWS, **kwargs):
+        tk.Frame.__init__(self, parent, **kwargs)
+        self.source = source
+        self.headings = [heading for heading, _, _ in columns]
+        self.height = height
+        self.first = 0
+
+        # Create a scrollbar which moves through the source rather than through the Treeview's own rows
+        self.scrollbar = tk.Scrollbar(self, command = self.yview)
+        self.scrollbar.pack(side = tk.RIGHT, fill = tk.Y)
+
+        self.tree = ttk.Treeview(self, columns = self.headings, show = "headings", height = height)
+        self.tree.pack()
+
+        for i, (heading, width, anchor) in enumerate(columns):
+            self.tree.column(heading, anchor = anchor, width = width)
+            self.tree.heading(heading, text = heading, anchor = tk.CENTER,
+                              command = lambda i = i: self.sort_by(i))
+
+        # Create the only rows the Treeview will hold, which are refilled as it scrolls
+        for i in range(height):
+            self.tree.insert(parent = "", index = "end", iid = i, text = "", values = ())
+
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self.mouse_wheel)
+
+        self.render()
+
+    # Create function which shows the rows of a new source from the top
+    def set_source(self, source):
+        self.source = source
+        self.first = 0
+        self.render()
+
+    # Create function which sorts by the column with index i, reversing the order if it is already sorted by it
+    def sort_by(self, i):
+        column = self.source.columns[i]
+        descending = column == self.source.sort_column and not self.source.descending
+        self.source.sort(column, descending)
+
+        self.first = 0
+        self.render()
+
+    # Create function which refills the Treeview rows from the source and moves the scrollbar to match
+    # Rows past the end of the source are detached so that a short list does not show blank rows
+    # The heading of the sort column is marked with the direction of the sort
+    def render(self):
+        for heading, column in zip(self.headings, self.source.columns):
+            arrow = "" if column != self.source.sort_column else (" ▼" if self.source.descending else " ▲")
+            self.tree.heading(heading, text = heading + arrow)
+
+        rows = self.source.rows(self.first, self.first + self.height)
+        for i in range(self.height):
+            if i < len(rows):
+                self.tree.move(i, "", i)
+                self.tree.item(i, values = rows[i])
+            else:
+                self.tree.detach(i)
+
+        num_rows = len(self.source)
+        if num_rows <= self.height:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first / num_rows, (self.first + self.height) / num_rows)
+
+    # Create function which moves the visible rows to start at first, keeping them inside the source
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.source) - self.height))
+        if first != self.first:
+            self.first = first
+            self.render()
+
+    # Create function which handles the scrollbar's commands, in the form Treeview.yview takes them
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.source)))
+        elif args[0] == "scroll":
+            step = self.height if args[2] == "pages" else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    # Create function which scrolls three rows per notch of the mouse wheel
+    # Windows and macOS report the wheel through event.delta, and X11 as buttons 4 and 5
+    def mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - 3)
+        else:
+            self.scroll_to(self.first + 3)
+
+        return "break"
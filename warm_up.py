@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+""" This script loads the parts of the application which are slow to start
+but not needed to show the first page. TensorFlow, pandas and h5py are only
+used to train, recommend and build the database, so the application imports
+them where they are first used and a warm-up thread imports them in the
+background once the login page is on screen. A page which needs a module the
+warm-up has not reached yet simply imports it itself, and Python's import
+lock makes it wait for a warm-up import of the same module to finish rather
+than running it twice."""
+
+import importlib
+import threading
+
+from timeit import default_timer
+
+# Modules only needed to train, recommend or build the database, in the order the warm-up thread imports them
+# Recommending only needs h5py, so it comes before TensorFlow, which is needed to train and is slowest by far
+HEAVY_MODULES = ["h5py", "pandas", "tensorflow", "NeuMF_architecture", "streaming_data", "training_and_evaluation"]
+
+# Create function which imports a module by name and returns the seconds the import took
+# A module which was already imported takes next to no time
+def timed_import(name):
+    start = default_timer()
+    importlib.import_module(name)
+
+    return default_timer() - start
+
+# Runs a list of (name, function) steps one after another on a daemon thread, timing each of them
+# A step which fails is recorded in errors and the rest still run, since the step will fail again, and be
+# reported, when the application needs it
+class WarmUp:
+    def __init__(self, steps):
+        self.steps = steps
+        self.times = {}
+        self.errors = {}
+        self.done = threading.Event()
+        self.thread = None
+
+    # Create function which returns the steps importing each of modules
+    @staticmethod
+    def import_steps(modules = HEAVY_MODULES):
+        return [(name, lambda name = name: importlib.import_module(name)) for name in modules]
+
+    def start(self):
+        self.thread = threading.Thread(target = self._run, name = "warm-up", daemon = True)
+        self.thread.start()
+
+    def _run(self):
+        for name, step in self.steps:
+            start = default_timer()
+            try:
+                step()
+            except Exception as error:
+                self.errors[name] = error
+            self.times[name] = default_timer() - start
+
+        self.done.set()